@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+*Skymaps shared by the benchmark scripts: the bayestar test maps and a synthetic high-order map*
+
+:Author:
+    David Young
+
+:Date Created:
+    October 18, 2026
+"""
+import os
+
+# THE MULTIORDER MAPS SHIPPED WITH THE CONVERT TESTS
+testMapDirectory = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "gocart", "convert", "tests", "input")
+testMaps = ["bayestar.multiorder.fits", "bayestar.multiorder.02.fits", "bayestar.multiorder.03.fits", "bayestar.multiorder.04.fits"]
+
+
+def benchmark_skymaps(
+        log,
+        maxLevel=10):
+    """*the bayestar test maps and a synthetic map refined to ``maxLevel``, keyed by name*
+
+    **Key Arguments:**
+        - ``log`` -- logger
+        - ``maxLevel`` -- the highest order of the synthetic map. Default *10* (nside 1024)
+
+    **Return:**
+        - ``maps`` -- dictionary of `multiorder_skymap` objects
+    """
+    from gocart.commonutils import multiorder_skymap
+    maps = {}
+    for f in testMaps:
+        maps[f] = multiorder_skymap(log=log, mapPath=os.path.join(testMapDirectory, f))
+    maps[f"synthetic level-{maxLevel} map"] = synthetic_skymap(log=log, maxLevel=maxLevel)
+    return maps
+
+
+def synthetic_skymap(
+        log,
+        maxLevel=10,
+        seed=42):
+    """*a synthetic multiorder map, refined by halving the remaining region at each level from level 4 to ``maxLevel``*
+
+    **Key Arguments:**
+        - ``log`` -- logger
+        - ``maxLevel`` -- the highest order of the map. Default *10*
+        - ``seed`` -- seed of the random probability density. Default *42*
+
+    **Return:**
+        - ``skymap`` -- the `multiorder_skymap` object of the map
+    """
+    import numpy as np
+    from astropy.table import Table
+    from gocart.commonutils import multiorder_skymap
+    uniq = []
+    region = 12 * 4**4
+    for level in range(4, maxLevel + 1):
+        # PIXELS BELOW HALF THE REGION ARE REFINED INTO THE NEXT LEVEL, THE REST ARE KEPT AT THIS LEVEL
+        first = region // 2 if level < maxLevel else 0
+        uniq.append(4 * 4**level + np.arange(first, region))
+        region = 4 * first
+    uniq = np.concatenate(uniq)
+    probdensity = np.random.default_rng(seed).random(len(uniq))**8
+    level = np.floor(np.log2(uniq / 4) / 2)
+    probdensity /= (probdensity * 4 * np.pi / (12 * 4**level)).sum()
+    table = Table({"UNIQ": uniq, "PROBDENSITY": probdensity})
+    return multiorder_skymap(log=log, table=table)
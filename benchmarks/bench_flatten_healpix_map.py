@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+*Time the original (list-based upsampling) `flatten_healpix_map` against the current one on the bayestar test maps and a synthetic high-order map*
+
+:Author:
+    David Young
+
+:Date Created:
+    October 18, 2026
+
+Usage:
+    python benchmarks/bench_flatten_healpix_map.py
+"""
+import time
+from fundamentals.logs import emptyLogger
+from _skymaps import benchmark_skymaps
+
+log = emptyLogger()
+
+
+def legacy_flatten_healpix_map(skymap, nside):
+    """*the original (list-based upsampling) `flatten_healpix_map`, kept as the baseline*"""
+    from mhealpy.pixelfunc.moc import uniq2range
+    import astropy_healpix as ah
+    import astropy.units as u
+    import numpy as np
+    import pandas as pd
+
+    tableData = skymap.to_pandas()
+
+    level = ah.nside_to_level(nside)
+
+    # UPSAMPLE TABLE
+    # FIND THE HIGH-LEVEL PIXEL INDEXES FOR EACH UNIQ PIXEL
+    # MAKE A NEW DATAFRAME WITH IPIX64, UNIQ
+    # MATCH EACH NEW UNIQ AGAINST ORIGINAL FRAME UNIQ TO GENERATE DATA FOR IPIX^$ FRAME
+    mask = (tableData['NSIDE'] <= nside)
+    upTable = tableData.loc[mask].copy()
+    upTable.reset_index(inplace=True)
+    this = uniq2range(nside, upTable['UNIQ'])
+    upTable[f'IPIX{nside}'] = [list(range(i, j)) for i, j in zip(this[0], this[1])]
+    upTable[f'UNIQLIST'] = upTable.apply(lambda x: [x['UNIQ']] * len(x[f'IPIX{nside}']), axis=1)
+
+    ipixNside = np.concatenate(upTable[f'IPIX{nside}'])
+    uniqList = np.concatenate(upTable[f'UNIQLIST'])
+    # CREATE DATA FRAME FROM A DICTIONARY OF LISTS
+    myDict = {
+        f'IPIX{nside}': ipixNside,
+        f'UNIQ': uniqList
+    }
+    upTable = pd.DataFrame(myDict)
+    # MERGE DATAFRAMES
+    if "DISTMU" in upTable.columns:
+        upTable = upTable.merge(tableData, on=['UNIQ'], how='inner')[[f'IPIX{nside}', 'PROBDENSITY', 'DISTMU', 'DISTSIGMA', 'DISTNORM']]
+    else:
+        upTable = upTable.merge(tableData, on=['UNIQ'], how='inner')[[f'IPIX{nside}', 'PROBDENSITY']]
+    pixArea = ah.nside_to_pixel_area(nside).to_value(u.steradian)
+    upTable["PROB"] = upTable["PROBDENSITY"] * pixArea
+    # REMOVE COLUMN FROM DATA FRAME
+    upTable.drop(columns=['PROBDENSITY'], inplace=True)
+
+    # DOWNSAMPLE TABLE
+    mask = tableData['NSIDE'] > nside
+    downTable = tableData.loc[mask].copy()
+    downTable.reset_index(inplace=True)
+
+    # FIND THE PIXEL INDEX AT ORDER NSIDE
+    downTable[f'IPIX{nside}'] = np.floor_divide(downTable['IPIX'], np.power(4, (downTable['LEVEL'].values - level)))
+
+    # GROUP RESULTS
+    if "DISTMU" in downTable.columns:
+        downTable = downTable.groupby([f'IPIX{nside}']).agg({'PROB': 'sum', 'DISTMU': 'mean', 'DISTSIGMA': 'mean', 'DISTNORM': 'mean'})
+    else:
+        downTable = downTable.groupby([f'IPIX{nside}']).agg({'PROB': 'sum'})
+    downTable.reset_index(inplace=True)
+
+    skymap = pd.concat([downTable, upTable], ignore_index=True)
+    # SORT BY COLUMN NAME
+    skymap.sort_values([f'IPIX{nside}'],
+                       ascending=[True], inplace=True)
+
+    # SET INDEX AND SORT DATA FRAME
+    skymap.reset_index(inplace=True)
+    skymap.drop(columns=[f'IPIX{nside}', 'index'], inplace=True)
+
+    # REMOVE FILTERED ROWS FROM DATA FRAME
+    if "DISTMU" in downTable.columns:
+        mask = (skymap['DISTMU'].isnull())
+        skymap.loc[mask, 'DISTMU'] = np.inf
+
+    return skymap
+
+
+def main():
+    import pandas as pd
+    from tabulate import tabulate
+    from gocart.commonutils import flatten_healpix_map
+
+    rows = []
+    for name, skymap in benchmark_skymaps(log=log, maxLevel=10).items():
+        for nside in [64, 256, 1024]:
+            start = time.perf_counter()
+            legacy = legacy_flatten_healpix_map(skymap, nside)
+            legacyTime = time.perf_counter() - start
+            start = time.perf_counter()
+            table = flatten_healpix_map(
+                log=log,
+                mapPath=skymap,
+                nside=nside
+            )
+            newTime = time.perf_counter() - start
+            # GROUPED PROBABILITIES ARE SUMMED IN NESTED ORDER, SO MAY DIFFER FROM THE GROUPBY SUMS IN THE LAST BIT
+            pd.testing.assert_frame_equal(table, legacy, rtol=1e-12)
+            rows.append([name, nside, f"{legacyTime:.3f}", f"{newTime:.3f}", f"{legacyTime / newTime:.1f}x"])
+
+    print(tabulate(rows, headers=["map", "nside", "baseline (s)", "current (s)", "speed-up"], tablefmt='psql'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+*Time the original (pandas sort and masked sums) `generate_skymap_stats` against the current one on the bayestar test maps and a synthetic high-order map*
+
+:Author:
+    David Young
+
+:Date Created:
+    October 18, 2026
+
+Usage:
+    python benchmarks/bench_generate_skymap_stats.py
+"""
+import time
+from fundamentals.logs import emptyLogger
+from _skymaps import benchmark_skymaps
+
+log = emptyLogger()
+
+
+def legacy_generate_skymap_stats(skymap):
+    """*the original (pandas sort and masked sums) `generate_skymap_stats`, kept as the baseline*"""
+    import astropy_healpix as ah
+    import astropy.units as u
+    import numpy as np
+    from astropy.coordinates import SkyCoord
+    tableData = skymap.to_pandas()
+    tableData['AREA'] = tableData['AREA'] * (1 * u.steradian).to_value(u.deg**2)
+    tableData.sort_values(["PROBDENSITY"],
+                          ascending=[False], inplace=True)
+    tableData["CUMPROB"] = np.cumsum(tableData['PROB'])
+    extras = {}
+    for level in [0.9, 0.5, 0.1]:
+        mask = (tableData["CUMPROB"] < level)
+        extras[f"area{int(level * 100)}"] = float(f"{tableData.loc[mask, 'AREA'].sum():.3f}")
+    peak = np.argmax(skymap['PROBDENSITY'])
+    ra, dec = ah.healpix_to_lonlat(skymap['IPIX'][peak], skymap['NSIDE'][peak], order='nested')
+    galacticCoords = SkyCoord(ra, dec, frame='icrs').galactic
+    extras["central coordinate"] = {
+        "equatorial": f"{ra.deg:.6f} {dec.deg:.6f}",
+        "galactic": f"{galacticCoords.l.degree:.6f} {galacticCoords.b.degree:.6f}"
+    }
+    return extras
+
+
+def main():
+    from tabulate import tabulate
+    from gocart.commonutils import generate_skymap_stats
+
+    maps = benchmark_skymaps(log=log, maxLevel=10)
+
+    # WARM UP PANDAS AND ASTROPY SO THE FIRST MAP ISN'T PENALISED
+    legacy_generate_skymap_stats(next(iter(maps.values())))
+
+    rows = []
+    for name, skymap in maps.items():
+        start = time.perf_counter()
+        legacy = legacy_generate_skymap_stats(skymap)
+        legacyTime = time.perf_counter() - start
+        start = time.perf_counter()
+        extras = generate_skymap_stats(
+            log=log,
+            skymap=skymap,
+            distanceStats=False
+        )
+        newTime = time.perf_counter() - start
+        assert extras["central coordinate"] == legacy["central coordinate"], name
+        for k in ["area10", "area50", "area90"]:
+            assert abs(extras[k] - legacy[k]) < 0.005, (name, k, extras[k], legacy[k])
+        rows.append([name, f"{legacyTime:.4f}", f"{newTime:.4f}", f"{legacyTime / newTime:.1f}x"])
+
+    print(tabulate(rows, headers=["map", "baseline (s)", "current (s)", "speed-up"], tablefmt='psql'))
+
+
+if __name__ == '__main__':
+    main()
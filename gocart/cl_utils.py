@@ -5,17 +5,26 @@ Documentation for gocart can be found here: http://gocart.readthedocs.org
 
 Usage:
     gocart init
-    gocart [-p] echo <daysAgo> [-s <pathToSettingsFile>]
-    gocart [-p] (listen|quit|restart|status) [-s <pathToSettingsFile>]
+    gocart [-p] echo <daysAgo> [--source <pathToAlerts>] [--speed <multiple>] [-s <pathToSettingsFile>]
+    gocart [-p] (listen|quit|restart|status) [--source <pathToAlerts>] [--speed <multiple>] [-s <pathToSettingsFile>]
+    gocart backtest [<filterSetsFile>] [-s <pathToSettingsFile>]
+    gocart prob [-s <pathToSettingsFile>] [--] <alertDir> <ra> <dec> [<distance>]
 
 Options:
     init                                   setup the gocart settings file for the first time
     echo <daysAgo>                         relisten to alerts from N <daysAgo> until now and then exit
     listen                                 reconnect to kafka stream and listen from where you left off (or from now on if connectiong for the first time).
+    backtest                               report how many previously collected alerts pass the filters in the settings file (and the candidate filter sets in <filterSetsFile>)
+    <filterSetsFile>                       YAML file containing a list of filters, or a dictionary of named lists of filters
+    prob                                   report the probability density and credible level of a sky position (and 3D density at <distance> Mpc) in the skymap of an alert
+    <alertDir>                             path to the alert directory containing the multiorder skymap
+    <ra>, <dec>                            sky position in decimal degrees (use `--` before <alertDir> if <dec> is negative)
 
     -h, --help                             show this help message
     -v, --version                          show version
     -p, --plugins                          execute plugins everytime an alert is read
+    --source <pathToAlerts>                replay a directory of JSON alerts or a JSONL recording instead of the GCN kafka stream (`listen` runs in the foreground and reports throughput and latency; `echo` counts <daysAgo> back from the last alert)
+    --speed <multiple>                     replay the --source alerts at this multiple of their original cadence (1 = real time, 0 = as fast as possible) [default: 0]
     -s, --settings <pathToSettingsFile>    the settings file
     -t, --test                             test, only collect 1 map
 """
@@ -107,9 +116,63 @@ def main(arguments=None):
         home = expanduser("~")
         filepath = home + "/.config/gocart/gocart.yaml"
 
+        # PRECOMPUTE THE PIXEL GEOMETRY CACHE FOR THE ASCII MAP NSIDE(S)
+        from gocart.commonutils import pixel_geometry
+        nsides = settings["lvk"]["ascii_map"]["nside"]
+        if not isinstance(nsides, list):
+            nsides = [nsides]
+        for nside in nsides:
+            pixel_geometry(log=log, nside=nside)
+
+    if a["backtest"]:
+        from gocart.parsers import lvk_backtest
+        import yaml
+        filterSets = {}
+        if settings["lvk"].get("filters"):
+            filterSets["settings file"] = settings["lvk"]["filters"]
+        if a["filterSetsFile"]:
+            with open(a["filterSetsFile"], 'r') as stream:
+                candidates = yaml.safe_load(stream)
+            if isinstance(candidates, list):
+                candidates = {a["filterSetsFile"].split("/")[-1]: candidates}
+            filterSets.update(candidates)
+        if not filterSets:
+            print("There are no filters in the settings file and no <filterSetsFile> was given.")
+            return
+        bt = lvk_backtest(
+            log=log,
+            settings=settings
+        )
+        results = bt.run(filterSets=filterSets)
+        bt.report(results)
+        return
+
+    if a["prob"]:
+        from gocart.commonutils import multiorder_index
+        from tabulate import tabulate
+        mapPaths = sorted(glob.glob(a["alertDir"] + "/*.multiorder.fits"))
+        if not mapPaths:
+            mapPaths = sorted(p for p in glob.glob(a["alertDir"] + "/*.fits") if os.path.basename(p) != "skymap.fits")
+        if not mapPaths:
+            print(f"No multiorder skymap found in {a['alertDir']}")
+            return
+        index = multiorder_index(
+            log=log,
+            skymap=mapPaths[0]
+        )
+        distance = float(a["distance"]) if a["distance"] else None
+        results = index.query(ra=float(a["ra"]), dec=float(a["dec"]), distance=distance)
+        rows = [["skymap", os.path.basename(mapPaths[0])], ["probability density (deg^-2)", f"{results['PROBDENSITY_DEG2'][0]:.4g}"], ["credible level", f"{results['CREDIBLE_LEVEL'][0] * 100:.1f}%"]]
+        if "DISTMU" in results and results["DISTMU"][0] < float("inf"):
+            rows.append(["distance ansatz (Mpc)", f"{results['DISTMU'][0]:.1f} +/- {results['DISTSIGMA'][0]:.1f}"])
+        if "PROBDENSITY_VOL" in results:
+            rows.append([f"3D density at {distance} Mpc (Mpc^-3)", f"{results['PROBDENSITY_VOL'][0]:.4g}"])
+        print(tabulate(rows, tablefmt='psql'))
+        return
+
     topic = 'igwn.gwalert'
 
-    if len(settings['gcn-kafka']['client_id']) < 6 or len(settings['gcn-kafka']['client_secret']) < 6:
+    if not a["sourceFlag"] and (len(settings['gcn-kafka']['client_id']) < 6 or len(settings['gcn-kafka']['client_secret']) < 6):
         print("Please add your gcn-kafka client ID and secret to the gocart.yaml settings file.")
         return
 
@@ -144,6 +207,14 @@ def main(arguments=None):
             if not os.path.exists(evertDir):
                 os.makedirs(evertDir)
 
+        # VALIDATE AND COMPILE THE ALERT FILTERS ONCE AT STARTUP
+        from gocart.parsers.lvk_filters import compile_lvk_filters
+        compile_lvk_filters(log=log, filters=settings["lvk"].get("filters"))
+        # LOAD AND INDEX THE GALAXY CATALOGUE ONCE AT STARTUP SO THE FIRST ALERT DOESN'T PAY FOR IT
+        if (settings["lvk"].get("galaxies") or {}).get("crossmatch"):
+            from gocart.convert.galaxies import load_galaxy_catalogue
+            load_galaxy_catalogue(log=log, settings=settings)
+
     if a['listen'] or a["quit"] or a["status"] or a["restart"]:
 
         # ADD SOMETHING LIKE THE FOLLOWING TO THE CL USAGE:
@@ -166,72 +237,110 @@ def main(arguments=None):
                     **kwargs):
                 self.log.info('starting the ``action`` method')
 
-                from gcn_kafka import Consumer
                 from confluent_kafka import TopicPartition
-                from gocart.parsers import lvk
+                from gocart.parsers import lvk_pool
+                from gocart.commonutils import offset_committer
 
                 firstConnect = kwargs["firstConnect"]
                 pluginsFlag = kwargs["pluginsFlag"]
+                source = kwargs["source"]
 
                 from datetime import datetime, date, time
+                import time as time_module
                 now = datetime.now()
                 now = now.strftime("%Y%m%dt%H%M%S")
 
                 print(f"gocart listen started at {now}")
 
+                # ALERTS ARE PARSED IN WORKER PROCESSES (STARTED BEFORE THE CONSUMER'S THREADS EXIST) WHILE THIS THREAD KEEPS FETCHING
+                pool = lvk_pool(
+                    log=log,
+                    settings=settings,
+                    workers=settings["gcn-kafka"].get("workers", 2),
+                    plugins=pluginsFlag
+                )
+
                 config = {
                     'group.id': settings["gcn-kafka"]["group_id"],
                     'enable.auto.commit': False,
                     'auto.offset.reset': 'earliest'
                 }
 
-                consumer = Consumer(config=config, client_id=settings['gcn-kafka']['client_id'],
-                                    client_secret=settings['gcn-kafka']['client_secret'], domain='gcn.nasa.gov')
+                if source:
+                    # REPLAY LOCAL ALERT FILES THROUGH THE SAME PIPELINE (NO KAFKA CONNECTION)
+                    consumer = source
+                    firstConnect = False
+                else:
+                    from gcn_kafka import Consumer
+                    consumer = Consumer(config=config, client_id=settings['gcn-kafka']['client_id'],
+                                        client_secret=settings['gcn-kafka']['client_secret'], domain='gcn.nasa.gov')
+
+                # COMMIT THE PROCESSED OFFSETS IN BATCHES (ASYNCHRONOUSLY) RATHER THAN A BROKER ROUND TRIP PER MESSAGE
+                committer = offset_committer(
+                    log=log,
+                    consumer=consumer,
+                    batchSize=settings["gcn-kafka"].get("commit_batch_size", 100),
+                    interval=settings["gcn-kafka"].get("commit_interval", 5)
+                )
+
+                # IF FISRT TIME CONNECTING THEN SKIP THE BACKLOG BY COMMITTING THE END OF EACH PARTITION (BEFORE JOINING THE GROUP)
+                if firstConnect:
+                    count = committer.skip_to_end(topic)
+                    firstConnect = False
+                    print(f"This is your first time using the listen command. gocart will now listen for all new incoming alerts (skipping the {count} previous alerts currently in this topic). If you stop listening and restart sometime later, gocart will immediately collect all alerts missed while off-line.")
+
                 consumer.subscribe([topic])
 
                 stop = False
                 test = 0
-                more = True
-                while not stop:
-                    # IF FISRT TIME CONNECTING THEN SKIP MESSAGES
-                    if firstConnect:
-                        count = 0
-                        index = 1
-                        print("Marking previous messages as read, this can take a few minutes")
-                        while more:
-                            messages = consumer.consume(num_messages=300, timeout=5)
-                            for message in messages:
-                                count += 1
-                                consumer.commit(message)
-                            if index > 1:
-                                # Cursor up one line and clear line
-                                sys.stdout.write("\x1b[1A\x1b[2K")
-                            index += 1
-                            print(f"{count} messages read ...")
-                            if not len(messages):
-                                more = False
-
-                        firstConnect = False
-                        print(f"This is your first time using the listen command. gocart will now listen for all new incoming alerts (skipping the {count} previous alerts currently in this topic). If you stop listening and restart sometime later, gocart will immediately collect all alerts missed while off-line.")
-                    for message in consumer.consume(timeout=5):
-                        try:
-                            parser = lvk(
-                                log=log,
-                                record=message.value(),
-                                settings=settings,
-                                plugins=pluginsFlag
-                            ).parse()
-                            consumer.commit(message)
-                        except Exception as e:
-                            consumer.commit(message)
-                            log.error(f'could not parse alert! Failed with error: {e}')
+                count = 0
+                started = time_module.monotonic()
+                try:
+                    while not stop:
+                        # STOP FETCHING WHILE THE POOL IS FULL
+                        if not pool.full():
+                            for message in consumer.consume(timeout=1):
+                                # KAFKA ERROR EVENTS (E.G. A PARTITION EOF OR A BROKER ERROR) ARE NOT ALERTS
+                                if message.error():
+                                    log.warning(f'could not read a message from the `{topic}` topic: {message.error()}')
+                                    continue
+                                committer.fetched(message)
+                                pool.submit(message)
+                        # AN OFFSET IS ONLY COMMITTED ONCE ITS ALERT AND ALL EARLIER ALERTS OF THE PARTITION ARE PARSED (OR FAILED), SO AN ALERT IS NEVER SKIPPED (AT-LEAST-ONCE)
+                        for message in pool.completed(timeout=1 if pool.full() else 0):
+                            committer.processed(message)
+                            count += 1
+                        committer.commit_if_due()
+                        # A LOCAL SOURCE STOPS ONCE ALL OF ITS ALERTS HAVE BEEN PARSED
+                        if source and source.exhausted and not len(pool):
+                            stop = True
+                finally:
+                    # THE DAEMON EXITS VIA SystemExit ON SIGTERM: COMMIT WHAT HAS BEEN PROCESSED BEFORE LEAVING (ALERTS STILL BEING PARSED ARE DELIVERED AGAIN ON RESTART)
+                    for message in pool.completed():
+                        committer.processed(message)
+                    committer.flush()
+                    consumer.close()
+                    pool.close(wait=False)
+
+                if source:
+                    from gocart.parsers.local_alert_source import throughput_report
+                    print(throughput_report(count=count, seconds=time_module.monotonic() - started, latencies=pool.latencies))
 
                 self.log.info('completed the ``action`` method')
                 return None
 
-        d = myDaemon(log=log, name="gocart", firstConnect=firstConnect, pluginsFlag=a["pluginsFlag"])
+        source = False
+        if a["sourceFlag"]:
+            from gocart.parsers.local_alert_source import local_alert_source
+            source = local_alert_source(log=log, path=a["sourceFlag"], speed=a["speedFlag"])
+            print(f"Replaying {len(source)} alerts from {a['sourceFlag']}")
 
-        if a['listen']:
+        d = myDaemon(log=log, name="gocart", firstConnect=firstConnect, pluginsFlag=a["pluginsFlag"], source=source)
+
+        if a['listen'] and source:
+            # A LOCAL REPLAY RUNS IN THE FOREGROUND AND EXITS WHEN ALL ITS ALERTS ARE PARSED
+            d.action(**d.akws)
+        elif a['listen']:
             d.start()
         elif a['quit']:
             d.stop()
@@ -242,36 +351,48 @@ def main(arguments=None):
 
     if a['echo'] and a['daysAgo']:
         # GET MESSAGES OCCURRING IN LAST N DAYS
-        from gcn_kafka import Consumer
-        from confluent_kafka import TopicPartition
-        from gocart.parsers import lvk
+        from gocart.parsers import lvk_pool
+        from gocart.parsers.lvk_pool import replay_alerts
+        from gocart.parsers.local_alert_source import local_alert_source, throughput_report
         import datetime
-
-        consumer = Consumer(client_id=settings['gcn-kafka']['client_id'],
-                            client_secret=settings['gcn-kafka']['client_secret'], domain='gcn.nasa.gov')
-
-        since_utc = datetime.datetime.now() - datetime.timedelta(days=float(a['daysAgo']))
-        timestamp1 = int((since_utc).timestamp() * 1000)
-        since_utc = since_utc.strftime("%Y-%m-%d %H:%M:%S")
-        print(f"Echoing alerts since {since_utc} UTC")
-
-        start = consumer.offsets_for_times(
-            [TopicPartition(topic, 0, timestamp1)])
-
-        consumer.assign(start)
-
-        more = True
-        while more:
-            messages = consumer.consume(num_messages=1, timeout=10)
-            for message in messages:
-                parser = lvk(
-                    log=log,
-                    record=message.value(),
-                    settings=settings,
-                    plugins=a["pluginsFlag"]
-                ).parse()
-            if not len(messages):
-                more = False
+        import time
+
+        # START THE WORKER PROCESSES BEFORE THE CONSUMER'S THREADS EXIST
+        pool = lvk_pool(
+            log=log,
+            settings=settings,
+            workers=settings["gcn-kafka"].get("workers", 2),
+            plugins=a["pluginsFlag"]
+        )
+
+        if a["sourceFlag"]:
+            consumer = local_alert_source(log=log, path=a["sourceFlag"], speed=a["speedFlag"])
+            # COUNT BACK FROM THE END OF THE RECORDING RATHER THAN FROM NOW
+            until = consumer.end_time()
+        else:
+            from gcn_kafka import Consumer
+            consumer = Consumer(client_id=settings['gcn-kafka']['client_id'],
+                                client_secret=settings['gcn-kafka']['client_secret'], domain='gcn.nasa.gov')
+            until = datetime.datetime.now()
+
+        since_utc = until - datetime.timedelta(days=float(a['daysAgo']))
+        print(f"Echoing alerts since {since_utc.strftime('%Y-%m-%d %H:%M:%S')} UTC")
+
+        started = time.monotonic()
+        try:
+            count = replay_alerts(
+                log=log,
+                consumer=consumer,
+                pool=pool,
+                topic=topic,
+                since=since_utc
+            )
+            print(f"{count} alerts echoed")
+            if a["sourceFlag"]:
+                print(throughput_report(count=count, seconds=time.monotonic() - started, latencies=pool.latencies))
+        finally:
+            consumer.close()
+            pool.close(wait=False)
 
     ## FINISH LOGGING ##
     endTime = times.get_now_sql_datetime()
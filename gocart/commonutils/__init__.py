@@ -1,6 +1,10 @@
 """
 *common tools used throughout package*
 """
+from .multiorder_skymap import multiorder_skymap, read_skymap
+from .multiorder_index import multiorder_index
 from .flatten_healpix_map import flatten_healpix_map
 from .generate_skymap_stats import generate_skymap_stats
+from .pixel_geometry import pixel_geometry
+from .offset_committer import offset_committer
 from .getpackagepath import getpackagepath
@@ -19,16 +19,20 @@ os.environ['TERM'] = 'vt100'
 def flatten_healpix_map(
         log,
         mapPath,
-        nside=64):
-    """flatten a multiorder healpix map to a specific nside*
+        nside=64,
+        asArray=False,
+        float32=False):
+    """flatten a multiorder healpix map to a specific nside (or to a pyramid of nsides)*
 
     **Key Arguments:**
         - ``log`` -- logger
-        - ``mapPath`` -- path to the multiorder map
-        - ``nside`` -- the nside index to flatten the map to. Default *64* (~0.9 deg2 pixels)
+        - ``mapPath`` -- path to the multiorder map (or an astropy table or `multiorder_skymap` object of the map)
+        - ``nside`` -- the nside index to flatten the map to, or a list of nsides. Default *64* (~0.9 deg2 pixels)
+        - ``asArray`` -- return a compact numpy structured array (PROB and, if present, DISTMU, DISTSIGMA, DISTNORM fields) instead of a pandas dataframe. Default *False*
+        - ``float32`` -- store the probability and distance values as float32 rather than float64. Default *False*
 
     **Return:**
-        - ``skymap`` -- the astropy table of the map
+        - ``skymap`` -- the pandas dataframe of the flattened map (one row per pixel, the index is the nested pixel index), or the structured array if ``asArray`` is True (element *i* is nested pixel *i*). If a list of nsides is given, a dictionary of maps keyed by nside.
 
     ```eval_rst
     .. todo::
@@ -45,88 +49,143 @@ def flatten_healpix_map(
         nside=64
     )
     ```
+
+    To flatten the map to several resolutions in a single pass:
+
+    ```python
+    pyramid = flatten_healpix_map(
+        log=log,
+        mapPath=pathToOutputDir + "/bayestar.multiorder.fits",
+        nside=[64, 256, 1024]
+    )
+    overview = pyramid[64]
+    ```
+
+    To flatten a high-resolution map with a small memory footprint, return a float32 structured array. Each field is then a nested-ordered healpix map that can be passed straight to healpy-style code (with `nest=True`):
+
+    ```python
+    flatMap = flatten_healpix_map(
+        log=log,
+        mapPath=pathToOutputDir + "/bayestar.multiorder.fits",
+        nside=1024,
+        asArray=True,
+        float32=True
+    )
+    prob = flatMap["PROB"]
+    ```
     """
     log.debug('starting the ``flatten_healpix_map`` function')
 
-    from mhealpy.pixelfunc.moc import uniq2range
-    import tempfile
-    from astropy.io import fits
-    from astropy.table import Table
     import astropy_healpix as ah
     import astropy.units as u
     import numpy as np
     import pandas as pd
-    from tabulate import tabulate
-
-    # OPEN MAP TO DATAFRAME
-    skymap = Table.read(mapPath)
-    tableData = skymap.to_pandas()
-    # FIND LEVEL AND NSIDE PIXEL INDEX FOR EACH MULTI-RES PIXEL
-    tableData['LEVEL'], tableData['IPIX'] = ah.uniq_to_level_ipix(tableData['UNIQ'])
-    tableData['NSIDE'] = ah.level_to_nside(tableData['LEVEL'])
-    # DETERMINE THE PIXEL AREA AND PROB OF EACH PIXEL
-    tableData['AREA'] = ah.nside_to_pixel_area(tableData['NSIDE']).to_value(u.steradian)
-    tableData['PROB'] = tableData['AREA'] * tableData["PROBDENSITY"]
-
-    level = ah.nside_to_level(nside)
+    from gocart.commonutils.multiorder_skymap import read_skymap
+
+    # OPEN MAP (LEVEL, IPIX, NSIDE, AREA AND PROB ALREADY COMPUTED)
+    skymap = read_skymap(log=log, skymap=mapPath)
+
+    # SORT THE PIXELS INTO NESTED ORDER ONCE - EVERY REQUESTED NSIDE IS THEN FLATTENED FROM THE SAME SORTED ARRAYS, WHERE
+    # THE PIXELS SHARING A PARENT AT ANY LEVEL ARE CONTIGUOUS AND THE OUTPUT PIXELS COME OUT ALREADY IN ORDER
+    order = skymap.nested_order()
+    columns = {c: skymap[c][order] for c in ["LEVEL", "IPIX", "PROBDENSITY", "PROB"]}
+    distColumns = []
+    if skymap.hasDistance:
+        distColumns = ['DISTMU', 'DISTSIGMA', 'DISTNORM']
+        for c in distColumns:
+            columns[c] = skymap[c][order]
+
+    if isinstance(nside, (list, tuple)):
+        # EACH LEVEL IS REDUCED FROM THE SHARED SORTED ARRAYS RATHER THAN FROM THE PREVIOUS LEVEL'S RESULTS: RE-ADDING PARTIAL
+        # SUMS WOULD CHANGE THE SUMMATION ORDER, SO A PYRAMID LEVEL WOULD NO LONGER MATCH A SINGLE-NSIDE FLATTEN BIT FOR BIT
+        pyramid = {}
+        for n in nside:
+            pyramid[n] = _flatten_nested(columns=columns, nside=n, distColumns=distColumns, asArray=asArray, float32=float32)
+        log.debug('completed the ``flatten_healpix_map`` function')
+        return pyramid
+
+    flatMap = _flatten_nested(columns=columns, nside=nside, distColumns=distColumns, asArray=asArray, float32=float32)
 
-    # UPSAMPLE TABLE
-    # FIND THE HIGH-LEVEL PIXEL INDEXES FOR EACH UNIQ PIXEL
-    # MAKE A NEW DATAFRAME WITH IPIX64, UNIQ
-    # MATCH EACH NEW UNIQ AGAINST ORIGINAL FRAME UNIQ TO GENERATE DATA FOR IPIX^$ FRAME
-    mask = (tableData['NSIDE'] <= nside)
-    upTable = tableData.loc[mask].copy()
-    upTable.reset_index(inplace=True)
-    this = uniq2range(nside, upTable['UNIQ'])
-    upTable[f'IPIX{nside}'] = [list(range(i, j)) for i, j in zip(this[0], this[1])]
-    upTable[f'UNIQLIST'] = upTable.apply(lambda x: [x['UNIQ']] * len(x[f'IPIX{nside}']), axis=1)
-
-    ipixNside = np.concatenate(upTable[f'IPIX{nside}'])
-    uniqList = np.concatenate(upTable[f'UNIQLIST'])
-    # CREATE DATA FRAME FROM A DICTIONARY OF LISTS
-    myDict = {
-        f'IPIX{nside}': ipixNside,
-        f'UNIQ': uniqList
-    }
-    upTable = pd.DataFrame(myDict)
-    # MERGE DATAFRAMES
-    if "DISTMU" in upTable.columns:
-        upTable = upTable.merge(tableData, on=['UNIQ'], how='inner')[[f'IPIX{nside}', 'PROBDENSITY', 'DISTMU', 'DISTSIGMA', 'DISTNORM']]
-    else:
-        upTable = upTable.merge(tableData, on=['UNIQ'], how='inner')[[f'IPIX{nside}', 'PROBDENSITY']]
-    pixArea = ah.nside_to_pixel_area(nside).to_value(u.steradian)
-    upTable["PROB"] = upTable["PROBDENSITY"] * pixArea
-    # REMOVE COLUMN FROM DATA FRAME
-    upTable.drop(columns=['PROBDENSITY'], inplace=True)
+    log.debug('completed the ``flatten_healpix_map`` function')
+    return flatMap
 
-    # DOWNSAMPLE TABLE
-    mask = tableData['NSIDE'] > nside
-    downTable = tableData.loc[mask].copy()
-    downTable.reset_index(inplace=True)
 
-    # FIND THE PIXEL INDEX AT ORDER NSIDE
-    downTable[f'IPIX{nside}'] = np.floor_divide(downTable['IPIX'], np.power(4, (downTable['LEVEL'].values - level)))
+def _flatten_nested(
+        columns,
+        nside,
+        distColumns,
+        asArray=False,
+        float32=False):
+    """*flatten the nested-ordered multiorder pixel arrays to a single nside*
 
-    # GROUP RESULTS
-    if "DISTMU" in downTable.columns:
-        downTable = downTable.groupby([f'IPIX{nside}']).agg({'PROB': 'sum', 'DISTMU': 'mean', 'DISTSIGMA': 'mean', 'DISTNORM': 'mean'})
-    else:
-        downTable = downTable.groupby([f'IPIX{nside}']).agg({'PROB': 'sum'})
-    downTable.reset_index(inplace=True)
+    **Key Arguments:**
+        - ``columns`` -- dictionary of the LEVEL, IPIX, PROBDENSITY, PROB (and distance) arrays sorted into nested order
+        - ``nside`` -- the nside to flatten to
+        - ``distColumns`` -- the distance columns to average (empty if the map has no distances)
+        - ``asArray`` -- return a numpy structured array instead of a pandas dataframe. Default *False*
+        - ``float32`` -- store the values as float32. Default *False*
 
-    skymap = pd.concat([downTable, upTable], ignore_index=True)
-    # SORT BY COLUMN NAME
-    skymap.sort_values([f'IPIX{nside}'],
-                       ascending=[True], inplace=True)
+    **Return:**
+        - ``skymap`` -- pandas dataframe (or structured array) of the flattened map
+    """
+    import astropy_healpix as ah
+    import astropy.units as u
+    import numpy as np
+    import pandas as pd
 
-    # SET INDEX AND SORT DATA FRAME
-    skymap.reset_index(inplace=True)
-    skymap.drop(columns=[f'IPIX{nside}', 'index'], inplace=True)
+    level = ah.nside_to_level(nside)
+    LEVEL = columns["LEVEL"]
+
+    # DOWNSAMPLE: PIXELS FINER THAN THE REQUESTED NSIDE ARE GROUPED BY THEIR PARENT PIXEL. IN NESTED ORDER EACH GROUP IS A
+    # CONTIGUOUS RUN, SO PROB IS SUMMED AND THE DISTANCES AVERAGED WITH `reduceat` (NO GROUPBY)
+    down = np.flatnonzero(LEVEL > level)
+    parent = columns["IPIX"][down] >> (2 * (LEVEL[down] - level))
+    groupStart = np.flatnonzero(np.r_[True, parent[1:] != parent[:-1]]) if len(down) else down
+    downValues = {}
+    if len(down):
+        downValues["PROB"] = np.add.reduceat(columns["PROB"][down], groupStart)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            for c in distColumns:
+                values = columns[c][down]
+                valid = ~np.isnan(values)
+                downValues[c] = np.add.reduceat(np.where(valid, values, 0.), groupStart) / np.add.reduceat(valid, groupStart)
+
+    # UPSAMPLE: EACH PIXEL AT OR BELOW THE REQUESTED NSIDE COVERS 4^(level - LEVEL) CONSECUTIVE NESTED PIXELS
+    up = LEVEL <= level
+
+    # EACH SORTED PIXEL EMITS 4^(level - LEVEL) ROWS IF UPSAMPLED, OR ONE ROW IF IT STARTS A DOWNSAMPLED GROUP
+    emit = np.zeros(len(LEVEL), dtype=np.int64)
+    emit[up] = np.power(4, level - LEVEL[up]).astype(np.int64)
+    emit[down[groupStart]] = 1
+    indexType = np.int32 if len(LEVEL) < 2**31 else np.int64
+    rowIndex = np.repeat(np.arange(len(LEVEL), dtype=indexType), emit)
+    isUp = up[rowIndex]
+
+    # FILL THE OUTPUT COLUMNS IN PLACE (FIELDS OF A SINGLE STRUCTURED ARRAY IF REQUESTED) - NO INTERMEDIATE FLOAT64 COPIES
+    dtype = np.float32 if float32 else np.float64
+    names = ["PROB"] + distColumns
+    if asArray:
+        skymap = np.empty(len(rowIndex), dtype=[(c, dtype) for c in names])
+        myDict = {c: skymap[c] for c in names}
+    else:
+        myDict = {c: np.empty(len(rowIndex), dtype=dtype) for c in names}
 
-    # REMOVE FILTERED ROWS FROM DATA FRAME
-    if "DISTMU" in downTable.columns:
-        mask = (skymap['DISTMU'].isnull())
-        skymap.loc[mask, 'DISTMU'] = np.inf
+    pixArea = ah.nside_to_pixel_area(nside).to_value(u.steradian)
+    myDict["PROB"][isUp] = columns["PROBDENSITY"][rowIndex[isUp]] * pixArea
+    if len(down):
+        myDict["PROB"][~isUp] = downValues["PROB"]
+
+    for c in distColumns:
+        # UPSAMPLED PIXELS CARRY NO DISTANCE INFORMATION
+        values = myDict[c]
+        values[isUp] = np.nan
+        if len(down):
+            values[~isUp] = downValues[c]
+        if c == 'DISTMU':
+            values[np.isnan(values)] = np.inf
+
+    if not asArray:
+        # CREATE DATA FRAME FROM A DICTIONARY OF ARRAYS
+        skymap = pd.DataFrame(myDict)
 
-    log.debug('completed the ``flatten_healpix_map`` function')
     return skymap
@@ -18,69 +18,56 @@ os.environ['TERM'] = 'vt100'
 
 def generate_skymap_stats(
         skymap,
-        log):
+        log,
+        credibleLevels=[10, 50, 90],
+        returnCredibleLevels=False,
+        distanceStats=True):
     """*Generate some extra stats for a given Healpix map*
 
     **Key Arguments:**
-        - ``skymap`` -- either a path to a healpix map FITS file or a skymap in astropy table format
+        - ``skymap`` -- a path to a healpix map FITS file, a skymap in astropy table format or a `multiorder_skymap` object
         - ``log`` -- logger
+        - ``credibleLevels`` -- the credible levels (percent) to report the sky area of (as `area<level>` in deg2). Default *[10, 50, 90]*
+        - ``returnCredibleLevels`` -- also return the credible level of every pixel of the map. Default *False*
+        - ``distanceStats`` -- also report the credible comoving volumes (as `vol<level>` in Mpc^3) and the distance posterior along the central coordinate (maps with distance information only). Default *True*
 
     **Return:**
         - ``extras`` -- a diction of value added map stats
+        - ``pixelCredibleLevels`` -- numpy array of the credible level (0-1) of each map pixel (only if ``returnCredibleLevels`` is True)
 
     ```python
     from gocart.commonutils import generate_skymap_stats
     extras = generate_skymap_stats(
         log=log,
         skymap="path/to/bayestar.multiorder.fits",
+        credibleLevels=[10, 50, 90, 95]
     )
     ```
     """
     log.debug('starting the ``generate_skymap_stats`` function')
 
-    from astropy.table import Table
+    from gocart.commonutils.multiorder_skymap import read_skymap
     import astropy_healpix as ah
     import astropy.units as u
     import numpy as np
-    if isinstance(skymap, str):
-        skymap = Table.read(skymap)
-
-    tableData = skymap.to_pandas()
-
-    # FIND LEVEL AND NSIDE PIXEL INDEX FOR EACH MULTI-RES PIXEL
-    tableData['LEVEL'], tableData['IPIX'] = ah.uniq_to_level_ipix(tableData['UNIQ'])
-    tableData['NSIDE'] = ah.level_to_nside(tableData['LEVEL'])
-    # DETERMINE THE PIXEL AREA AND PROB OF EACH PIXEL
-    tableData['AREA'] = ah.nside_to_pixel_area(tableData['NSIDE']).to_value(u.steradian)
-    tableData['PROB'] = tableData['AREA'] * tableData["PROBDENSITY"]
-    tableData['AREA'] = ah.nside_to_pixel_area(tableData['NSIDE']).to_value(u.deg**2)
-
-    # SORT BY PROB, CALCULATE CUMULATIVE PROB AND RESORT BY INDEX
-    tableData.sort_values(["PROBDENSITY"],
-                          ascending=[False], inplace=True)
-    tableData["CUMPROB"] = np.cumsum(tableData['PROB'])
-
-    # FILTER DATA FRAME
-    # FIRST CREATE THE MASK
-    mask = (tableData["CUMPROB"] < 0.9)
-    area90 = tableData.loc[mask, 'AREA'].sum()
-    mask = (tableData["CUMPROB"] < 0.5)
-    area50 = tableData.loc[mask, 'AREA'].sum()
-    mask = (tableData["CUMPROB"] < 0.1)
-    area10 = tableData.loc[mask, 'AREA'].sum()
-    mask = (tableData["CUMPROB"] < 0.99999999999999)
-    area100 = tableData['AREA'].sum()
-
-    area90 = float(f'{area90:.3f}')
-    area50 = float(f'{area50:.3f}')
-    area10 = float(f'{area10:.3f}')
-
-    extras = {"area90": area90, "area50": area50, "area10": area10}
-
-    level, ipix = ah.uniq_to_level_ipix(
-        skymap[np.argmax(skymap['PROBDENSITY'])]['UNIQ']
-    )
-    ra, dec = ah.healpix_to_lonlat(ipix, ah.level_to_nside(level),
+
+    # ONLY PARSES THE MAP IF WE HAVEN'T BEEN HANDED A DECODED SKYMAP
+    skymap = read_skymap(log=log, skymap=skymap)
+
+    # ONE SORT BY PROBDENSITY (CACHED ON THE SKYMAP), THEN THE CUMULATIVE AREA IS READ OFF AT EACH LEVEL. THE AREA OF A
+    # CREDIBLE LEVEL IS THE AREA OF ALL PIXELS WITH A CUMULATIVE PROBABILITY BELOW THAT LEVEL
+    order, cumulativeProb = skymap.density_order()
+    cumulativeArea = np.cumsum(skymap['AREA'][order]) * (1 * u.steradian).to_value(u.deg**2)
+    levels = np.asarray(credibleLevels, dtype=float)
+    counts = np.searchsorted(cumulativeProb, levels / 100., side='left')
+    areas = np.where(counts > 0, cumulativeArea[np.maximum(counts - 1, 0)], 0.)
+
+    extras = {}
+    for l, a in sorted(zip(levels, areas), reverse=True):
+        extras[f"area{l:g}"] = float(f'{a:.3f}')
+
+    peak = np.argmax(skymap['PROBDENSITY'])
+    ra, dec = ah.healpix_to_lonlat(skymap['IPIX'][peak], skymap['NSIDE'][peak],
                                    order='nested')
 
     from astropy.coordinates import SkyCoord
@@ -93,5 +80,120 @@ def generate_skymap_stats(
         "galactic": f"{glon:.6f} {glat:.6f}"
     }
 
+    if distanceStats and skymap.hasDistance:
+        volumes = _credible_volumes(skymap=skymap, levels=levels / 100.)
+        for l, v in sorted(zip(levels, volumes), reverse=True):
+            extras[f"vol{l:g}"] = float(f'{v:.6g}')
+        centralDistance = _central_distance(skymap=skymap, peak=peak)
+        if centralDistance:
+            extras["central distance"] = centralDistance
+
     log.debug('completed the ``generate_skymap_stats`` function')
+    if returnCredibleLevels:
+        return extras, skymap.credible_levels()
     return extras
+
+
+def _credible_volumes(
+        skymap,
+        levels,
+        nShells=128,
+        maxVoxels=20000000,
+        nBins=65536,
+        logDensitySpan=50.,
+        chunkVoxels=2000000):
+    """*the comoving volume (Mpc^3) of the smallest 3D credible regions containing the given probabilities*
+
+    The pixels of the 99.9% 2D credible region are split into ``nShells`` luminosity-distance shells (fewer, down to 32, for very high-resolution maps so there are no more than ``maxVoxels`` voxels) and the probability of each (pixel, shell) voxel taken from the distance ansatz (Singer et al. 2016, ApJL 829 L15). Voxels are ranked by probability per unit comoving volume (default astropy cosmology). Rather than sorting every voxel, the voxels are accumulated (in chunks of pixels, so memory stays bounded) into a fine histogram of log density and the credible volumes interpolated from its cumulative sums.
+    """
+    import astropy.units as u
+    import numpy as np
+    from astropy.cosmology import default_cosmology
+
+    mu = skymap['DISTMU']
+    sigma = skymap['DISTSIGMA']
+    norm = skymap['DISTNORM']
+    rows = np.flatnonzero((skymap.credible_levels() - skymap['PROB'] < 0.999) & (skymap['PROB'] > 0) & np.isfinite(mu) & np.isfinite(norm) & (norm > 0) & np.isfinite(sigma) & (sigma > 0))
+    if not len(rows):
+        return np.full(len(levels), np.nan)
+    mu, sigma, norm, prob, area = mu[rows], sigma[rows], norm[rows], skymap['PROB'][rows], skymap['AREA'][rows]
+
+    # THE SHELLS EXTEND TO 4 SIGMA BEYOND DISTMU FOR THE PIXELS HOLDING 99.9% OF THE PROBABILITY
+    upper = mu + 4 * sigma
+    order = np.argsort(upper)
+    cumulativeProb = np.cumsum(prob[order])
+    rMax = upper[order][min(np.searchsorted(cumulativeProb, 0.999 * cumulativeProb[-1]), len(order) - 1)]
+    nShells = int(np.clip(maxVoxels // len(rows), 32, nShells))
+    edges = np.linspace(0, rMax, nShells + 1)
+    r = 0.5 * (edges[1:] + edges[:-1])
+
+    # COMOVING VOLUME PER STERADIAN OF EACH SHELL
+    cosmology = default_cosmology.get()
+    zMax = 0.01
+    while cosmology.luminosity_distance(zMax).to_value(u.Mpc) < rMax:
+        zMax *= 2
+    zGrid = np.linspace(0, zMax, 1000)
+    dlGrid = cosmology.luminosity_distance(zGrid).to_value(u.Mpc)
+    dc = edges / (1 + np.interp(edges, dlGrid, zGrid))
+    shellVolume = np.diff(dc**3) / 3.
+
+    # LOG DENSITY = PIXEL TERM + SHELL TERM - GAUSSIAN EXPONENT. THE HISTOGRAM STARTS FROM THE DENSEST VOXEL AT THE SHELL
+    # NEAREST EACH PIXEL'S DISTMU (ANY DENSER VOXELS LAND IN BIN 0); VOXELS MORE THAN `logDensitySpan` BELOW IT ALL LAND IN THE
+    # LAST (NEGLIGIBLE PROBABILITY) BIN
+    dr = edges[1] - edges[0]
+    pixelTerm = np.log(prob * norm / (area * sigma * np.sqrt(2 * np.pi)))
+    shellTerm = np.log(r**2 * dr / shellVolume)
+    nearest = np.clip(np.rint((mu - r[0]) / dr), 0, nShells - 1).astype(np.int64)
+    hi = (pixelTerm + shellTerm[nearest] - 0.5 * ((r[nearest] - mu) / sigma)**2).max()
+    scale = nBins / logDensitySpan
+
+    # ACCUMULATE THE PROBABILITY AND VOLUME OF THE VOXELS IN EACH LOG-DENSITY BIN (BIN 0 HOLDS THE DENSEST VOXELS)
+    binProb = np.zeros(nBins)
+    binVolume = np.zeros(nBins)
+    step = max(1, chunkVoxels // nShells)
+    for i in range(0, len(rows), step):
+        c = slice(i, i + step)
+        logDensity = pixelTerm[c, None] + shellTerm[None, :] - 0.5 * ((r[None, :] - mu[c, None]) / sigma[c, None])**2
+        bins = np.clip((hi - logDensity) * scale, 0, nBins - 1).astype(np.int64).ravel()
+        voxelVolume = area[c, None] * shellVolume[None, :]
+        binProb += np.bincount(bins, weights=(np.exp(logDensity) * voxelVolume).ravel(), minlength=nBins)
+        binVolume += np.bincount(bins, weights=voxelVolume.ravel(), minlength=nBins)
+
+    # A CREDIBLE VOLUME IS THE VOLUME OF THE DENSEST VOXELS HOLDING THE REQUESTED PROBABILITY
+    filled = binProb > 0
+    cumulativeProb = np.concatenate([[0.], np.cumsum(binProb[filled])])
+    cumulativeVolume = np.concatenate([[0.], np.cumsum(binVolume[filled])])
+    volumes = np.interp(levels, cumulativeProb, cumulativeVolume)
+
+    return volumes
+
+
+def _central_distance(
+        skymap,
+        peak,
+        nSamples=2000):
+    """*the mean, standard deviation, median and 90% interval (Mpc) of the distance posterior along the direction of the given (peak) pixel, or None if the pixel has no valid distance ansatz*"""
+    import numpy as np
+
+    mu, sigma = skymap['DISTMU'][peak], skymap['DISTSIGMA'][peak]
+    if not (np.isfinite(mu) and np.isfinite(sigma) and sigma > 0):
+        return None
+
+    # p(r) IS PROPORTIONAL TO r^2 N(r; DISTMU, DISTSIGMA)
+    r = np.linspace(0, max(mu, 0) + 8 * sigma, nSamples)
+    pdf = r**2 * np.exp(-0.5 * ((r - mu) / sigma)**2)
+    cdf = np.concatenate([[0], np.cumsum(0.5 * (pdf[1:] + pdf[:-1]) * np.diff(r))])
+    if cdf[-1] <= 0:
+        return None
+    cdf /= cdf[-1]
+    weights = pdf / pdf.sum()
+    mean = (weights * r).sum()
+    std = np.sqrt((weights * (r - mean)**2).sum())
+    lower, median, upper = np.interp([0.05, 0.5, 0.95], cdf, r)
+
+    return {
+        "mean": float(f'{mean:.2f}'),
+        "std": float(f'{std:.2f}'),
+        "median": float(f'{median:.2f}'),
+        "90% interval": f"{lower:.2f} {upper:.2f}"
+    }
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+*Vectorised sky-position (and 3D) lookups against a multiorder healpix skymap*
+
+:Author:
+    David Young
+
+:Date Created:
+    October 18, 2026
+"""
+from fundamentals import tools
+from builtins import object
+import sys
+import os
+os.environ['TERM'] = 'vt100'
+
+
+class multiorder_index(object):
+    """
+    *A point-lookup index of a multiorder healpix skymap, answering vectorised probability queries for many sky positions at once*
+
+    The index is built once per skymap: the multiorder pixels are sorted by their level-29 nested pixel index (so any position is matched to its pixel with a single `searchsorted`) and the credible level of every pixel is precomputed.
+
+    **Key Arguments:**
+        - ``log`` -- logger
+        - ``skymap`` -- path to a multiorder FITS file, an astropy table or a `multiorder_skymap`
+
+    **Usage:**
+
+    ```python
+    from gocart.commonutils import multiorder_index
+    index = multiorder_index(
+        log=log,
+        skymap="/path/to/bayestar.multiorder.fits"
+    )
+    results = index.query(
+        ra=[10.1, 200.3],
+        dec=[-30.2, 45.8],
+        distance=[120., 350.]
+    )
+    print(results["CREDIBLE_LEVEL"])
+    ```
+    """
+
+    def __init__(
+            self,
+            log,
+            skymap
+    ):
+        self.log = log
+        log.debug("instansiating a new 'multiorder_index' object")
+
+        from gocart.commonutils.multiorder_skymap import read_skymap
+
+        self.skymap = read_skymap(log=log, skymap=skymap)
+        self.hasDistance = self.skymap.hasDistance
+        self.index29, self.order = self.skymap.sorted_index29()
+
+        # THE CREDIBLE LEVEL OF EACH PIXEL: THE PROBABILITY CONTAINED IN ALL PIXELS OF EQUAL OR HIGHER DENSITY
+        self.credibleLevel = self.skymap.credible_levels()
+
+        return None
+
+    def pixels(
+            self,
+            ra,
+            dec):
+        """*return the row of the multiorder pixel containing each sky position*
+
+        **Key Arguments:**
+            - ``ra`` -- right ascension(s) in degrees
+            - ``dec`` -- declination(s) in degrees
+
+        **Return:**
+            - ``rows`` -- numpy array of row indices into the skymap columns
+        """
+        self.log.debug('starting the ``pixels`` method')
+
+        import astropy_healpix as ah
+        import astropy.units as u
+        import numpy as np
+
+        ipix29 = ah.lonlat_to_healpix(np.atleast_1d(np.asarray(ra, dtype=float)) * u.deg, np.atleast_1d(np.asarray(dec, dtype=float)) * u.deg, ah.level_to_nside(29), order='nested')
+        rows = self.order[np.searchsorted(self.index29, ipix29, side='right') - 1]
+
+        self.log.debug('completed the ``pixels`` method')
+        return rows
+
+    def query(
+            self,
+            ra,
+            dec,
+            distance=None):
+        """*return the probability density, credible level (and 3D posterior density) at each sky position*
+
+        **Key Arguments:**
+            - ``ra`` -- right ascension(s) in degrees
+            - ``dec`` -- declination(s) in degrees
+            - ``distance`` -- luminosity distance(s) in Mpc. Default *None*
+
+        **Return:**
+            - ``results`` -- dictionary of numpy arrays, one element per position:
+                - `UNIQ` -- the multiorder pixel containing the position
+                - `PROBDENSITY` -- 2D probability per steradian
+                - `PROBDENSITY_DEG2` -- 2D probability per square degree
+                - `CREDIBLE_LEVEL` -- the smallest credible region containing the position (e.g. 0.9 means the position lies on the edge of the 90% credible region)
+                - `DISTMU`, `DISTSIGMA` -- the distance ansatz parameters of the pixel (if the map has distances)
+                - `PROBDENSITY_VOL` -- the 3D posterior density per Mpc^3 at the given distance (if a distance is given and the map has distances)
+        """
+        self.log.debug('starting the ``query`` method')
+
+        rows = self.pixels(ra=ra, dec=dec)
+        results = self.pixel_values(rows=rows, distance=distance)
+
+        self.log.debug('completed the ``query`` method')
+        return results
+
+    def pixel_values(
+            self,
+            rows,
+            distance=None):
+        """*return the probability density, credible level (and 3D posterior density) of the given skymap rows*
+
+        Use this in place of `query` when the pixel rows are already known (e.g. sources pre-indexed by healpix pixel).
+
+        **Key Arguments:**
+            - ``rows`` -- row indices into the skymap columns (as returned by `pixels`)
+            - ``distance`` -- luminosity distance(s) in Mpc, one per row. Default *None*
+
+        **Return:**
+            - ``results`` -- dictionary of numpy arrays, one element per row (see `query`)
+        """
+        self.log.debug('starting the ``pixel_values`` method')
+
+        import astropy.units as u
+        import numpy as np
+
+        results = {
+            "UNIQ": self.skymap['UNIQ'][rows],
+            "PROBDENSITY": self.skymap['PROBDENSITY'][rows],
+            "PROBDENSITY_DEG2": self.skymap['PROBDENSITY'][rows] / (1 * u.steradian).to_value(u.degree * u.degree),
+            "CREDIBLE_LEVEL": self.credibleLevel[rows]
+        }
+
+        if self.hasDistance:
+            results["DISTMU"] = self.skymap['DISTMU'][rows]
+            results["DISTSIGMA"] = self.skymap['DISTSIGMA'][rows]
+            if distance is not None:
+                results["PROBDENSITY_VOL"] = self._volume_density(rows=rows, distance=np.asarray(distance, dtype=float))
+        elif distance is not None:
+            self.log.warning("the skymap has no distance information, so the 3D posterior density cannot be calculated")
+
+        self.log.debug('completed the ``pixel_values`` method')
+        return results
+
+    def _volume_density(
+            self,
+            rows,
+            distance):
+        """*the 3D posterior density (per Mpc^3) at the given distances within the given pixels*
+
+        dP/dV = PROBDENSITY x DISTNORM x N(distance; DISTMU, DISTSIGMA), see Singer et al. 2016 (ApJL 829 L15)
+        """
+        import numpy as np
+
+        mu = self.skymap['DISTMU'][rows]
+        sigma = self.skymap['DISTSIGMA'][rows]
+        norm = self.skymap['DISTNORM'][rows]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            gaussian = np.exp(-0.5 * ((distance - mu) / sigma)**2) / (sigma * np.sqrt(2 * np.pi))
+            density = self.skymap['PROBDENSITY'][rows] * norm * gaussian
+        # PIXELS WITHOUT A VALID DISTANCE ANSATZ (DISTMU = INF) HAVE NO 3D DENSITY
+        density[~np.isfinite(density)] = 0.
+        return density
+
+    # use the tab-trigger below for new method
+    # xt-class-method
@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+*An in-memory, decoded multiorder healpix skymap shared by the gocart pipeline stages*
+
+:Author:
+    David Young
+
+:Date Created:
+    October 18, 2026
+"""
+from fundamentals import tools
+from builtins import object
+import sys
+import os
+os.environ['TERM'] = 'vt100'
+
+
+class multiorder_skymap(object):
+    """
+    *A multiorder healpix skymap decoded once, with the per-pixel UNIQ, LEVEL, IPIX, NSIDE, AREA and PROB columns computed up front as numpy arrays*
+
+    **Key Arguments:**
+        - ``log`` -- logger
+        - ``mapPath`` -- path to a multiorder FITS file. Default *False*
+        - ``skymapBytes`` -- the raw bytes of a multiorder FITS file (e.g. decoded from a kafka alert). Default *False*
+        - ``table`` -- an astropy table of the multiorder map. Default *False*
+
+    Only one of ``mapPath``, ``skymapBytes`` or ``table`` needs to be given.
+
+    **Usage:**
+
+    ```python
+    from gocart.commonutils import multiorder_skymap
+    skymap = multiorder_skymap(
+        log=log,
+        mapPath="/path/to/bayestar.multiorder.fits"
+    )
+    print(skymap["PROB"].sum())
+    ```
+
+    The object can then be handed to `generate_skymap_stats`, `flatten_healpix_map`, `ascii`, `healpix2cart` and `aitoff` in place of a map path so the FITS file is only ever parsed once.
+    """
+
+    def __init__(
+            self,
+            log,
+            mapPath=False,
+            skymapBytes=False,
+            table=False
+    ):
+        self.log = log
+        log.debug("instansiating a new 'multiorder_skymap' object")
+        self.mapPath = mapPath
+
+        from astropy.table import Table
+        import astropy_healpix as ah
+        import astropy.units as u
+        import numpy as np
+
+        if table is False:
+            if skymapBytes:
+                from io import BytesIO
+                table = Table.read(BytesIO(skymapBytes))
+            elif mapPath:
+                table = Table.read(mapPath)
+            else:
+                raise TypeError("one of `mapPath`, `skymapBytes` or `table` must be given")
+
+        self.meta = table.meta
+
+        # CONVERT FITS (BIG-ENDIAN) COLUMNS TO NATIVE NUMPY ARRAYS
+        self.columns = {}
+        for c in table.colnames:
+            arr = np.asarray(table[c])
+            self.columns[c] = arr.astype(arr.dtype.newbyteorder('='), copy=False)
+        self.hasDistance = "DISTMU" in self.columns
+
+        # FIND LEVEL AND NSIDE PIXEL INDEX FOR EACH MULTI-RES PIXEL
+        self.columns['LEVEL'], self.columns['IPIX'] = ah.uniq_to_level_ipix(self.columns['UNIQ'])
+        self.columns['NSIDE'] = ah.level_to_nside(self.columns['LEVEL'])
+        # DETERMINE THE PIXEL AREA AND PROB OF EACH PIXEL
+        self.columns['AREA'] = ah.nside_to_pixel_area(self.columns['NSIDE']).to_value(u.steradian)
+        self.columns['PROB'] = self.columns['AREA'] * self.columns["PROBDENSITY"]
+
+        self._nestedOrder = None
+        self._sortedIndex29 = None
+        self._densityOrder = None
+        self._cumulativeProb = None
+        self._credibleLevels = None
+
+        return None
+
+    def __getitem__(self, key):
+        return self.columns[key]
+
+    def __contains__(self, key):
+        return key in self.columns
+
+    def __len__(self):
+        return len(self.columns['UNIQ'])
+
+    def to_pandas(self):
+        """*return a new pandas dataframe of the map and its derived columns*
+
+        **Return:**
+            - ``tableData`` -- a pandas dataframe (a fresh copy the caller is free to modify)
+        """
+        self.log.debug('starting the ``to_pandas`` method')
+
+        import pandas as pd
+        tableData = pd.DataFrame(self.columns)
+
+        self.log.debug('completed the ``to_pandas`` method')
+        return tableData
+
+    def nested_order(self):
+        """*return the indices that sort the pixels into nested order (i.e. by their pixel index at the maximum healpix level of 29). Computed once and cached*
+
+        In nested order the pixels sharing a parent pixel at any coarser level are contiguous.
+
+        **Return:**
+            - ``order`` -- numpy array of row indices
+        """
+        self.log.debug('starting the ``nested_order`` method')
+
+        self.sorted_index29()
+
+        self.log.debug('completed the ``nested_order`` method')
+        return self._nestedOrder
+
+    def sorted_index29(self):
+        """*return the level-29 nested pixel index of the first level-29 pixel within each multiorder pixel, sorted ascending, along with the sorting indices. Computed once and cached*
+
+        A sky position's multiorder pixel is found with a single `searchsorted` of its level-29 pixel index against this array.
+
+        **Return:**
+            - ``index29`` -- sorted numpy array of level-29 pixel indices
+            - ``order`` -- the row indices that sort the pixels into this order
+
+        **Usage:**
+
+        ```python
+        index29, order = skymap.sorted_index29()
+        rows = order[np.searchsorted(index29, matchIpix29, side='right') - 1]
+        ```
+        """
+        self.log.debug('starting the ``sorted_index29`` method')
+
+        import numpy as np
+        if self._sortedIndex29 is None:
+            index29 = self.columns['IPIX'] << (2 * (29 - self.columns['LEVEL']))
+            self._nestedOrder = np.argsort(index29, kind='stable')
+            self._sortedIndex29 = index29[self._nestedOrder]
+
+        self.log.debug('completed the ``sorted_index29`` method')
+        return self._sortedIndex29, self._nestedOrder
+
+    def density_order(self):
+        """*return the indices that sort the pixels by descending probability density, along with the cumulative probability in that order. Computed once and cached*
+
+        **Return:**
+            - ``order`` -- numpy array of row indices, densest pixel first
+            - ``cumulativeProb`` -- the cumulative probability of the pixels in this order
+        """
+        self.log.debug('starting the ``density_order`` method')
+
+        import numpy as np
+        if self._densityOrder is None:
+            # QUICKSORT IS ~3X FASTER THAN A STABLE SORT; THE ORDER OF EQUAL-DENSITY PIXELS DOESN'T MATTER
+            self._densityOrder = np.argsort(-self.columns['PROBDENSITY'])
+            self._cumulativeProb = np.cumsum(self.columns['PROB'][self._densityOrder])
+
+        self.log.debug('completed the ``density_order`` method')
+        return self._densityOrder, self._cumulativeProb
+
+    def credible_levels(self):
+        """*return the credible level of every pixel: the probability contained in all pixels of equal or higher density. Computed once and cached*
+
+        A pixel with a credible level of 0.9 lies on the edge of the 90% credible region.
+
+        **Return:**
+            - ``credibleLevels`` -- numpy array, one element per row
+        """
+        self.log.debug('starting the ``credible_levels`` method')
+
+        import numpy as np
+        if self._credibleLevels is None:
+            order, cumulativeProb = self.density_order()
+            self._credibleLevels = np.empty(len(self))
+            self._credibleLevels[order] = cumulativeProb
+
+        self.log.debug('completed the ``credible_levels`` method')
+        return self._credibleLevels
+
+
+
+def read_skymap(
+        log,
+        skymap):
+    """*return a `multiorder_skymap` for a FITS path, astropy table or an existing `multiorder_skymap` (returned untouched)*
+
+    **Key Arguments:**
+        - ``log`` -- logger
+        - ``skymap`` -- path to a multiorder FITS file, an astropy table or a `multiorder_skymap`
+
+    **Return:**
+        - ``skymap`` -- the `multiorder_skymap` object
+
+    ```python
+    from gocart.commonutils import read_skymap
+    skymap = read_skymap(
+        log=log,
+        skymap="/path/to/bayestar.multiorder.fits"
+    )
+    ```
+    """
+    log.debug('starting the ``read_skymap`` function')
+
+    if isinstance(skymap, multiorder_skymap):
+        pass
+    elif isinstance(skymap, str):
+        skymap = multiorder_skymap(log=log, mapPath=skymap)
+    else:
+        skymap = multiorder_skymap(log=log, table=skymap)
+
+    log.debug('completed the ``read_skymap`` function')
+    return skymap
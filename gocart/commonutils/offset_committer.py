@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+*Batched kafka offset commits for the alert listener*
+
+:Author:
+    David Young
+
+:Date Created:
+    October 18, 2026
+"""
+from fundamentals import tools
+from builtins import object
+import time
+import sys
+import os
+os.environ['TERM'] = 'vt100'
+
+
+class offset_committer(object):
+    """
+    *Batch the offset commits of a kafka consumer, committing the highest processed offset of each partition asynchronously every ``batchSize`` messages or ``interval`` seconds (whichever comes first) and synchronously on `flush`*
+
+    Offsets are only ever committed for messages that have been processed, so delivery remains at-least-once: after a crash, at most the messages processed since the last commit are delivered again. If messages are processed out of order (e.g. by a pool of workers), register each one with `fetched` as it is handed off: a partition's offset then only advances past messages once they, and all earlier messages of the partition, have been processed.
+
+    **Key Arguments:**
+        - ``log`` -- logger
+        - ``consumer`` -- the kafka consumer (with `enable.auto.commit` set to False)
+        - ``batchSize`` -- commit after this many processed messages. Default *100*
+        - ``interval`` -- commit at least this often (seconds) while there are processed messages to commit. Default *5*
+
+    **Usage:**
+
+    ```python
+    from gocart.commonutils import offset_committer
+    committer = offset_committer(
+        log=log,
+        consumer=consumer,
+        batchSize=100,
+        interval=5
+    )
+    try:
+        while True:
+            for message in consumer.consume(timeout=5):
+                process(message)
+                committer.processed(message)
+            committer.commit_if_due()
+    finally:
+        committer.flush()
+    ```
+    """
+
+    def __init__(
+            self,
+            log,
+            consumer,
+            batchSize=100,
+            interval=5
+    ):
+        self.log = log
+        log.debug("instansiating a new 'offset_committer' object")
+        self.consumer = consumer
+        self.batchSize = batchSize
+        self.interval = interval
+
+        # THE NEXT OFFSET TO CONSUME (LAST PROCESSED + 1) OF EACH (TOPIC, PARTITION) NOT YET COMMITTED
+        self.pending = {}
+        # OFFSETS HANDED OFF FOR PROCESSING (IN FETCH ORDER) AND THOSE OF THEM ALREADY PROCESSED, PER (TOPIC, PARTITION)
+        self.inFlight = {}
+        self.done = {}
+        self.count = 0
+        self.lastCommit = time.monotonic()
+
+        return None
+
+    def fetched(
+            self,
+            message):
+        """*register a message handed off to be processed, so no later offset of its partition is committed until it has been processed*
+
+        **Key Arguments:**
+            - ``message`` -- the kafka message
+        """
+        from collections import deque
+        if not _has_offset(message):
+            return None
+        key = (message.topic(), message.partition())
+        if key not in self.inFlight:
+            self.inFlight[key] = deque()
+            self.done[key] = set()
+        self.inFlight[key].append(message.offset())
+        return None
+
+    def processed(
+            self,
+            message):
+        """*record a message as processed, committing the batch if it is due*
+
+        **Key Arguments:**
+            - ``message`` -- the kafka message that has been processed
+        """
+        self.log.debug('starting the ``processed`` method')
+
+        # KAFKA ERROR EVENTS HAVE NO OFFSET TO COMMIT
+        if not _has_offset(message):
+            return None
+        key = (message.topic(), message.partition())
+        inFlight = self.inFlight.get(key)
+        if inFlight:
+            # ADVANCE OVER THE CONTIGUOUS RUN OF PROCESSED OFFSETS AT THE HEAD OF THE PARTITION
+            done = self.done[key]
+            done.add(message.offset())
+            while inFlight and inFlight[0] in done:
+                offset = inFlight.popleft()
+                done.discard(offset)
+                self.pending[key] = offset + 1
+        elif message.offset() + 1 > self.pending.get(key, -1):
+            self.pending[key] = message.offset() + 1
+        self.count += 1
+        self.commit_if_due()
+
+        self.log.debug('completed the ``processed`` method')
+        return None
+
+    def commit_if_due(
+            self):
+        """*asynchronously commit the processed offsets if ``batchSize`` messages have been processed or ``interval`` seconds have passed since the last commit*
+
+        Call this after each (possibly empty) consume so processed offsets are still committed while the stream is quiet.
+        """
+        if self.pending and (self.count >= self.batchSize or time.monotonic() - self.lastCommit >= self.interval):
+            self.commit(asynchronous=True)
+        return None
+
+    def commit(
+            self,
+            asynchronous=True):
+        """*commit the processed offsets*
+
+        **Key Arguments:**
+            - ``asynchronous`` -- return without waiting for the broker to acknowledge the commit. Default *True*
+        """
+        self.log.debug('starting the ``commit`` method')
+
+        from confluent_kafka import TopicPartition
+
+        if self.pending:
+            offsets = [TopicPartition(topic, partition, offset) for (topic, partition), offset in self.pending.items()]
+            self.consumer.commit(offsets=offsets, asynchronous=asynchronous)
+            self.pending = {}
+            self.count = 0
+        self.lastCommit = time.monotonic()
+
+        self.log.debug('completed the ``commit`` method')
+        return None
+
+    def flush(
+            self):
+        """*synchronously commit any processed offsets not yet committed (call on shutdown)*"""
+        self.log.debug('starting the ``flush`` method')
+
+        try:
+            self.commit(asynchronous=False)
+        except Exception as e:
+            self.log.error(f'could not commit the processed kafka offsets: {e}')
+
+        self.log.debug('completed the ``flush`` method')
+        return None
+
+    def skip_to_end(
+            self,
+            topic,
+            timeout=10):
+        """*synchronously commit the current end (high watermark) of every partition of the topic, so the consumer group only receives messages published from now on*
+
+        Call this before the consumer subscribes to the topic. It takes a couple of broker round trips, whatever the size of the topic's backlog.
+
+        **Key Arguments:**
+            - ``topic`` -- the kafka topic
+            - ``timeout`` -- the broker request timeout (seconds). Default *10*
+
+        **Return:**
+            - ``skipped`` -- the number of messages in the topic that were skipped
+        """
+        self.log.debug('starting the ``skip_to_end`` method')
+
+        from confluent_kafka import TopicPartition
+
+        metadata = self.consumer.list_topics(topic, timeout=timeout).topics[topic]
+        if metadata.error is not None:
+            raise IOError(f"could not read the partitions of the `{topic}` topic: {metadata.error}")
+
+        offsets = []
+        skipped = 0
+        for partition in sorted(metadata.partitions):
+            low, high = self.consumer.get_watermark_offsets(TopicPartition(topic, partition), timeout=timeout, cached=False)
+            offsets.append(TopicPartition(topic, partition, high))
+            skipped += high - low
+        if offsets:
+            self.consumer.commit(offsets=offsets, asynchronous=False)
+        self.pending = {}
+        self.count = 0
+        self.lastCommit = time.monotonic()
+
+        self.log.debug('completed the ``skip_to_end`` method')
+        return skipped
+
+    # use the tab-trigger below for new method
+    # xt-class-method
+
+
+def _has_offset(
+        message):
+    """*True if the message is a record with a committable offset (not a kafka error event)*"""
+    return not message.error() and message.topic() is not None and message.offset() is not None and message.offset() >= 0
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+*Cache of the sky-coordinates of every healpix pixel at a given nside*
+
+:Author:
+    David Young
+
+:Date Created:
+    October 18, 2026
+"""
+from fundamentals import tools
+from builtins import object
+import threading
+import sys
+import os
+os.environ['TERM'] = 'vt100'
+
+# THE GEOMETRY COLUMNS CACHED TO FILE
+geometryColumns = ["RA", "DEC", "GLON", "GLAT"]
+
+# PROCESS-WIDE CACHE OF THE MEMORY-MAPPED GEOMETRY ARRAYS, KEYED BY (CACHE DIRECTORY, NSIDE)
+_geometryLock = threading.Lock()
+_geometryCache = {}
+
+
+def pixel_geometry(
+        log,
+        nside,
+        cacheDir=False):
+    """*return the RA, Dec, galactic longitude and latitude (all in degrees) of every nested healpix pixel at the given nside, plus the pixel area*
+
+    The coordinates are identical for every map at a given nside, so they are computed once (including the expensive `SkyCoord` galactic transform), saved as `.npy` files in the cache directory and memory-mapped from then on.
+
+    **Key Arguments:**
+        - ``log`` -- logger
+        - ``nside`` -- the healpix nside
+        - ``cacheDir`` -- directory to cache the geometry files in. Default *~/.config/gocart/cache*
+
+    **Return:**
+        - ``geometry`` -- dictionary of read-only numpy arrays `RA`, `DEC`, `GLON` and `GLAT` (element *i* is nested pixel *i*) and the pixel `AREA` in steradians
+
+    ```python
+    from gocart.commonutils import pixel_geometry
+    geometry = pixel_geometry(
+        log=log,
+        nside=64
+    )
+    ra = geometry["RA"]
+    ```
+    """
+    log.debug('starting the ``pixel_geometry`` function')
+
+    import astropy_healpix as ah
+    import astropy.units as u
+    import numpy as np
+
+    if not cacheDir:
+        from os.path import expanduser
+        home = expanduser("~")
+        cacheDir = home + "/.config/gocart/cache"
+    cacheDir = cacheDir + "/geometry"
+    nside = int(nside)
+
+    with _geometryLock:
+        geometry = _geometryCache.get((cacheDir, nside))
+        if geometry is None:
+            paths = {c: f"{cacheDir}/nside{nside}_{c}.npy" for c in geometryColumns}
+            if not all(os.path.exists(p) for p in paths.values()):
+                _write_pixel_geometry(log=log, nside=nside, paths=paths)
+            geometry = {c: np.load(p, mmap_mode='r') for c, p in paths.items()}
+            geometry["AREA"] = ah.nside_to_pixel_area(nside).to_value(u.steradian)
+            _geometryCache[(cacheDir, nside)] = geometry
+
+    log.debug('completed the ``pixel_geometry`` function')
+    return geometry
+
+
+def _write_pixel_geometry(
+        log,
+        nside,
+        paths):
+    """*compute the pixel geometry at the given nside and write each column to its `.npy` file*"""
+    log.debug('starting the ``_write_pixel_geometry`` function')
+
+    import astropy_healpix as ah
+    import numpy as np
+    from astropy.coordinates import SkyCoord
+
+    ra, dec = ah.healpix_to_lonlat(np.arange(12 * nside**2), nside, order='nested')
+    galacticCoords = SkyCoord(ra.deg, dec.deg, frame='icrs', unit='deg').galactic
+    columns = {
+        "RA": ra.deg,
+        "DEC": dec.deg,
+        "GLON": galacticCoords.l.degree,
+        "GLAT": galacticCoords.b.degree
+    }
+
+    # WRITE TO A TEMPORARY FILE AND MOVE INTO PLACE SO OTHER PROCESSES NEVER READ A PARTIAL FILE
+    cacheDir = os.path.dirname(paths["RA"])
+    if not os.path.exists(cacheDir):
+        os.makedirs(cacheDir, exist_ok=True)
+    for c, p in paths.items():
+        tmpPath = f"{p}.{os.getpid()}.tmp"
+        with open(tmpPath, 'wb') as f:
+            np.save(f, columns[c])
+        os.replace(tmpPath, p)
+
+    log.debug('completed the ``_write_pixel_geometry`` function')
+    return None
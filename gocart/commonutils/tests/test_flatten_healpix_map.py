@@ -56,6 +56,85 @@ class test_flatten_healpix_map(unittest.TestCase):
             nside=64
         )
 
+    def test_flatten_healpix_map_values_function(self):
+
+        import numpy as np
+        from gocart.commonutils import flatten_healpix_map
+
+        # THE FIXTURE MAP SPANS LEVELS 4-11, SO BOTH THE UPSAMPLED (LOW-RESOLUTION) AND DOWNSAMPLED (HIGH-RESOLUTION) PIXELS ARE CHECKED
+        # NSIDE: (PEAK PIXEL, PEAK PROB, PEAK DISTMU, PEAK DISTSIGMA, PEAK DISTNORM, PIXELS WITHOUT DISTANCE, MEAN FINITE DISTMU)
+        expected = {
+            64: (24943, 0.056113124677902165, 35.32506379794831, 8.319430760329663, 0.0007593766985545111, 48410, 30.794654613364745),
+            256: (399067, 0.004053224541208028, 35.74611024366499, 8.246361356003542, 0.0007430682684862994, 785664, 35.72901043644993)
+        }
+        for nside, (peak, prob, distmu, distsigma, distnorm, noDistance, meanDistmu) in expected.items():
+            table = flatten_healpix_map(
+                log=log,
+                mapPath=pathToOutputDir + "/bayestar.multiorder.fits",
+                nside=nside
+            )
+            self.assertEqual(list(table.columns), ['PROB', 'DISTMU', 'DISTSIGMA', 'DISTNORM'])
+            self.assertEqual(len(table), 12 * nside**2)
+            self.assertAlmostEqual(table["PROB"].sum(), 1., places=12)
+            self.assertEqual(int(np.argmax(table["PROB"].values)), peak)
+            np.testing.assert_allclose(table.iloc[peak].values, [prob, distmu, distsigma, distnorm], rtol=1e-12)
+            finite = np.isfinite(table["DISTMU"].values)
+            self.assertEqual(int((~finite).sum()), noDistance)
+            np.testing.assert_allclose(table["DISTMU"].values[finite].mean(), meanDistmu, rtol=1e-12)
+
+    def test_flatten_healpix_map_pyramid_function(self):
+
+        import pandas as pd
+        from gocart.commonutils import flatten_healpix_map, multiorder_skymap
+        skymap = multiorder_skymap(log=log, mapPath=pathToOutputDir + "/bayestar.multiorder.fits")
+        pyramid = flatten_healpix_map(
+            log=log,
+            mapPath=skymap,
+            nside=[64, 256, 1024]
+        )
+        self.assertEqual(list(pyramid.keys()), [64, 256, 1024])
+        for nside, table in pyramid.items():
+            self.assertEqual(len(table), 12 * nside**2)
+            self.assertAlmostEqual(table["PROB"].sum(), skymap["PROB"].sum(), places=10)
+            single = flatten_healpix_map(
+                log=log,
+                mapPath=skymap,
+                nside=nside
+            )
+            pd.testing.assert_frame_equal(table, single, check_exact=True)
+
+    def test_flatten_healpix_map_array_function(self):
+
+        import numpy as np
+        from gocart.commonutils import flatten_healpix_map, multiorder_skymap
+        skymap = multiorder_skymap(log=log, mapPath=pathToOutputDir + "/bayestar.multiorder.fits")
+        table = flatten_healpix_map(
+            log=log,
+            mapPath=skymap,
+            nside=256
+        )
+        flatMap = flatten_healpix_map(
+            log=log,
+            mapPath=skymap,
+            nside=256,
+            asArray=True
+        )
+        self.assertEqual(flatMap.dtype.names, tuple(table.columns))
+        for c in table.columns:
+            np.testing.assert_array_equal(flatMap[c], table[c].values)
+
+        flatMap32 = flatten_healpix_map(
+            log=log,
+            mapPath=skymap,
+            nside=256,
+            asArray=True,
+            float32=True
+        )
+        self.assertEqual(flatMap32.nbytes * 2, flatMap.nbytes)
+        for c in table.columns:
+            self.assertEqual(flatMap32[c].dtype, np.float32)
+            np.testing.assert_allclose(flatMap32[c], table[c].values, rtol=1e-6, atol=1e-37)
+
     def test_flatten_healpix_map_function_exception(self):
 
         from gocart.commonutils import flatten_healpix_map
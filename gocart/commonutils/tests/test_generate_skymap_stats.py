@@ -56,6 +56,59 @@ class test_generate_skymap_stats(unittest.TestCase):
         )
         print(extras)
 
+        # THE CREDIBLE AREAS (DEG2) AND CENTRAL COORDINATE OF THE FIXTURE MAP
+        self.assertEqual(extras["area10"], 1.367)
+        self.assertEqual(extras["area50"], 8.898)
+        self.assertEqual(extras["area90"], 30.975)
+        self.assertEqual(extras["central coordinate"], {"equatorial": "194.304199 -17.856895", "galactic": "304.876573 44.993031"})
+
+    def test_generate_skymap_stats_levels_function(self):
+
+        import numpy as np
+        from gocart.commonutils import generate_skymap_stats, multiorder_skymap
+        skymap = multiorder_skymap(log=log, mapPath=pathToOutputDir + "/bayestar.multiorder.fits")
+        extras, pixelCredibleLevels = generate_skymap_stats(
+            log=log,
+            skymap=skymap,
+            credibleLevels=[10, 50, 90, 95, 99.9],
+            returnCredibleLevels=True
+        )
+        areas = [extras[k] for k in ["area10", "area50", "area90", "area95", "area99.9"]]
+        self.assertTrue(np.all(np.diff(areas) >= 0))
+
+        # THE AREA OF A CREDIBLE LEVEL IS THE AREA OF THE PIXELS BELOW THAT CREDIBLE LEVEL
+        self.assertEqual(len(pixelCredibleLevels), len(skymap))
+        area95 = skymap['AREA'][pixelCredibleLevels < 0.95].sum() * (180 / np.pi)**2
+        self.assertAlmostEqual(extras["area95"], area95, places=2)
+
+    def test_generate_skymap_stats_volumes_function(self):
+
+        import numpy as np
+        import astropy.units as u
+        from astropy.cosmology import default_cosmology
+        from gocart.commonutils import generate_skymap_stats, multiorder_skymap
+        skymap = multiorder_skymap(log=log, mapPath=pathToOutputDir + "/bayestar.multiorder.fits")
+        extras = generate_skymap_stats(
+            log=log,
+            skymap=skymap
+        )
+        self.assertTrue(extras["vol10"] < extras["vol50"] < extras["vol90"])
+        self.assertTrue(abs(extras["central distance"]["median"] - skymap['DISTMU'][np.argmax(skymap['PROBDENSITY'])]) < skymap['DISTSIGMA'][np.argmax(skymap['PROBDENSITY'])])
+
+        # BRUTE-FORCE: SORT EVERY (PIXEL, DISTANCE) VOXEL BY ITS COMOVING DENSITY
+        rows = np.isfinite(skymap['DISTMU'])
+        mu, sigma, norm, prob, area = [skymap[c][rows] for c in ["DISTMU", "DISTSIGMA", "DISTNORM", "PROB", "AREA"]]
+        edges = np.linspace(0, (mu + 5 * sigma).max(), 1001)
+        r = 0.5 * (edges[1:] + edges[:-1])
+        zGrid = np.linspace(0, 0.1, 1000)
+        dc = edges / (1 + np.interp(edges, default_cosmology.get().luminosity_distance(zGrid).to_value(u.Mpc), zGrid))
+        voxelVolume = area[:, None] * np.diff(dc**3)[None, :] / 3.
+        voxelProb = (prob * norm)[:, None] * r**2 * np.exp(-0.5 * ((r - mu[:, None]) / sigma[:, None])**2) / (sigma[:, None] * np.sqrt(2 * np.pi)) * (edges[1] - edges[0])
+        order = np.argsort(-(voxelProb / voxelVolume).ravel())
+        cumulativeProb = np.cumsum(voxelProb.ravel()[order])
+        vol90 = voxelVolume.ravel()[order][cumulativeProb < 0.9].sum()
+        self.assertAlmostEqual(extras["vol90"] / vol90, 1., places=2)
+
     def test_generate_skymap_stats_function_exception(self):
 
         from gocart.commonutils import generate_skymap_stats
@@ -0,0 +1,109 @@
+from __future__ import print_function
+from builtins import str
+import os
+import unittest
+import shutil
+import unittest
+import yaml
+from gocart.utKit import utKit
+from fundamentals import tools
+from os.path import expanduser
+home = expanduser("~")
+
+packageDirectory = utKit("").get_project_root()
+settingsFile = packageDirectory + "/test_settings.yaml"
+# settingsFile = home + \
+#     "/git_repos/_misc_/settings/gocart/test_settings.yaml"
+
+su = tools(
+    arguments={"settingsFile": settingsFile},
+    docString=__doc__,
+    logLevel="DEBUG",
+    options_first=False,
+    projectName=None,
+    defaultSettingsFile=False
+)
+arguments, settings, log, dbConn = su.setup()
+
+# SETUP PATHS TO COMMON DIRECTORIES FOR TEST DATA
+moduleDirectory = os.path.dirname(__file__)
+pathToInputDir = moduleDirectory + "/input/"
+pathToOutputDir = moduleDirectory + "/output/"
+
+try:
+    shutil.rmtree(pathToOutputDir)
+except:
+    pass
+# COPY INPUT TO OUTPUT DIR
+shutil.copytree(pathToInputDir, pathToOutputDir)
+
+# Recursively create missing directories
+if not os.path.exists(pathToOutputDir):
+    os.makedirs(pathToOutputDir)
+
+
+# xt-setup-unit-testing-files-and-folders
+# xt-utkit-refresh-database
+
+class test_multiorder_index(unittest.TestCase):
+
+    def test_multiorder_index_function(self):
+
+        import numpy as np
+        from gocart.commonutils import multiorder_index
+        index = multiorder_index(
+            log=log,
+            skymap=pathToOutputDir + "/bayestar.multiorder.fits"
+        )
+        skymap = index.skymap
+
+        # EACH PIXEL CENTRE IS FOUND IN ITS OWN PIXEL
+        import astropy_healpix as ah
+        rows = np.arange(0, len(skymap), 7)
+        ra = np.empty(len(rows))
+        dec = np.empty(len(rows))
+        for i, r in enumerate(rows):
+            lon, lat = ah.healpix_to_lonlat(skymap['IPIX'][r], skymap['NSIDE'][r], order='nested')
+            ra[i], dec[i] = lon.deg, lat.deg
+        results = index.query(ra=ra, dec=dec)
+        np.testing.assert_array_equal(results["UNIQ"], skymap['UNIQ'][rows])
+        np.testing.assert_array_equal(results["PROBDENSITY"], skymap['PROBDENSITY'][rows])
+
+        # CREDIBLE LEVELS RISE AS THE DENSITY FALLS
+        order = np.argsort(-results["PROBDENSITY"], kind='stable')
+        self.assertTrue((np.diff(results["CREDIBLE_LEVEL"][order]) >= 0).all())
+        self.assertAlmostEqual(index.credibleLevel.max(), skymap['PROB'].sum())
+
+        # THE 3D DENSITY INTEGRATES TO THE PIXEL PROBABILITY ALONG THE LINE OF SIGHT
+        r = skymap['PROB'].argmax()
+        lon, lat = ah.healpix_to_lonlat(skymap['IPIX'][r], skymap['NSIDE'][r], order='nested')
+        distance = np.linspace(0.01, 10 * skymap['DISTMU'][r], 20000)
+        results = index.query(ra=np.full(len(distance), lon.deg), dec=np.full(len(distance), lat.deg), distance=distance)
+        self.assertTrue((results["UNIQ"] == skymap['UNIQ'][r]).all())
+        integral = np.trapz(results["PROBDENSITY_VOL"] * distance**2, distance) * skymap['AREA'][r]
+        self.assertAlmostEqual(integral, skymap['PROB'][r], delta=skymap['PROB'][r] * 1e-3)
+
+        # A MILLION POSITIONS
+        rng = np.random.default_rng(1)
+        ra = rng.uniform(0, 360, 1000000)
+        dec = np.rad2deg(np.arcsin(rng.uniform(-1, 1, 1000000)))
+        results = index.query(ra=ra, dec=dec, distance=rng.uniform(10, 500, 1000000))
+        self.assertEqual(len(results["PROBDENSITY_VOL"]), 1000000)
+
+    def test_multiorder_index_function_exception(self):
+
+        from gocart.commonutils import multiorder_index
+        try:
+            this = multiorder_index(
+                log=log,
+                settings=settings,
+                fakeKey="break the code"
+            )
+            assert False
+        except Exception as e:
+            assert True
+            print(str(e))
+
+        # x-print-testpage-for-pessto-marshall-web-object
+
+    # x-class-to-test-named-worker-function
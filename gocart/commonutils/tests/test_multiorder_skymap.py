@@ -0,0 +1,101 @@
+from __future__ import print_function
+from builtins import str
+import os
+import unittest
+import shutil
+import unittest
+import yaml
+from gocart.utKit import utKit
+from fundamentals import tools
+from os.path import expanduser
+home = expanduser("~")
+
+packageDirectory = utKit("").get_project_root()
+settingsFile = packageDirectory + "/test_settings.yaml"
+# settingsFile = home + \
+#     "/git_repos/_misc_/settings/gocart/test_settings.yaml"
+
+su = tools(
+    arguments={"settingsFile": settingsFile},
+    docString=__doc__,
+    logLevel="DEBUG",
+    options_first=False,
+    projectName=None,
+    defaultSettingsFile=False
+)
+arguments, settings, log, dbConn = su.setup()
+
+# SETUP PATHS TO COMMON DIRECTORIES FOR TEST DATA
+moduleDirectory = os.path.dirname(__file__)
+pathToInputDir = moduleDirectory + "/input/"
+pathToOutputDir = moduleDirectory + "/output/"
+
+try:
+    shutil.rmtree(pathToOutputDir)
+except:
+    pass
+# COPY INPUT TO OUTPUT DIR
+shutil.copytree(pathToInputDir, pathToOutputDir)
+
+# Recursively create missing directories
+if not os.path.exists(pathToOutputDir):
+    os.makedirs(pathToOutputDir)
+
+
+# xt-setup-unit-testing-files-and-folders
+# xt-utkit-refresh-database
+
+class test_multiorder_skymap(unittest.TestCase):
+
+    def test_multiorder_skymap_function(self):
+
+        from gocart.commonutils import multiorder_skymap
+        skymap = multiorder_skymap(
+            log=log,
+            mapPath=pathToOutputDir + "/bayestar.multiorder.fits"
+        )
+        for c in ["UNIQ", "LEVEL", "IPIX", "NSIDE", "AREA", "PROB"]:
+            assert c in skymap
+        assert abs(skymap["PROB"].sum() - 1.) < 1e-6
+
+    def test_multiorder_skymap_from_bytes_function(self):
+
+        from gocart.commonutils import multiorder_skymap, read_skymap, generate_skymap_stats, flatten_healpix_map
+        with open(pathToOutputDir + "/bayestar.multiorder.fits", "rb") as f:
+            skymapBytes = f.read()
+        skymap = multiorder_skymap(
+            log=log,
+            skymapBytes=skymapBytes
+        )
+        assert read_skymap(log=log, skymap=skymap) is skymap
+        extras = generate_skymap_stats(
+            log=log,
+            skymap=skymap,
+        )
+        fromPath = generate_skymap_stats(
+            log=log,
+            skymap=pathToOutputDir + "/bayestar.multiorder.fits",
+        )
+        assert extras == fromPath
+        table = flatten_healpix_map(
+            log=log,
+            mapPath=skymap,
+            nside=64
+        )
+
+    def test_multiorder_skymap_function_exception(self):
+
+        from gocart.commonutils import multiorder_skymap
+        try:
+            this = multiorder_skymap(
+                log=log,
+                fakeKey="break the code"
+            )
+            assert False
+        except Exception as e:
+            assert True
+            print(str(e))
+
+        # x-print-testpage-for-pessto-marshall-web-object
+
+    # x-class-to-test-named-worker-function
@@ -0,0 +1,202 @@
+from __future__ import print_function
+from builtins import str
+import os
+import unittest
+import shutil
+import unittest
+import yaml
+from gocart.utKit import utKit
+from fundamentals import tools
+from os.path import expanduser
+home = expanduser("~")
+
+packageDirectory = utKit("").get_project_root()
+settingsFile = packageDirectory + "/test_settings.yaml"
+# settingsFile = home + \
+#     "/git_repos/_misc_/settings/gocart/test_settings.yaml"
+
+su = tools(
+    arguments={"settingsFile": settingsFile},
+    docString=__doc__,
+    logLevel="DEBUG",
+    options_first=False,
+    projectName=None,
+    defaultSettingsFile=False
+)
+arguments, settings, log, dbConn = su.setup()
+
+# SETUP PATHS TO COMMON DIRECTORIES FOR TEST DATA
+moduleDirectory = os.path.dirname(__file__)
+pathToInputDir = moduleDirectory + "/input/"
+pathToOutputDir = moduleDirectory + "/output/"
+
+try:
+    shutil.rmtree(pathToOutputDir)
+except:
+    pass
+# COPY INPUT TO OUTPUT DIR
+shutil.copytree(pathToInputDir, pathToOutputDir)
+
+# Recursively create missing directories
+if not os.path.exists(pathToOutputDir):
+    os.makedirs(pathToOutputDir)
+
+
+# xt-setup-unit-testing-files-and-folders
+# xt-utkit-refresh-database
+
+class _message(object):
+    # A MINIMAL STAND-IN FOR A KAFKA MESSAGE
+
+    def __init__(self, partition, offset, topic="igwn.gwalert", error=None):
+        self._partition = partition
+        self._offset = offset
+        self._topic = topic
+        self._error = error
+
+    def error(self):
+        return self._error
+
+    def topic(self):
+        return self._topic
+
+    def partition(self):
+        return self._partition
+
+    def offset(self):
+        return self._offset
+
+
+class _consumer(object):
+    # RECORDS THE COMMITS MADE TO IT, AND SERVES THE PARTITION WATERMARKS OF A TOPIC
+
+    def __init__(self, watermarks={}):
+        self.commits = []
+        self.watermarks = watermarks
+
+    def commit(self, offsets, asynchronous=True):
+        self.commits.append(({(o.topic, o.partition): o.offset for o in offsets}, asynchronous))
+
+    def list_topics(self, topic, timeout=None):
+        from types import SimpleNamespace
+        topicMetadata = SimpleNamespace(error=None, partitions={p: None for p in self.watermarks})
+        return SimpleNamespace(topics={topic: topicMetadata})
+
+    def get_watermark_offsets(self, partition, timeout=None, cached=False):
+        return self.watermarks[partition.partition]
+
+
+class test_offset_committer(unittest.TestCase):
+
+    def test_offset_committer_function(self):
+
+        try:
+            import confluent_kafka
+        except ImportError:
+            return
+
+        from gocart.commonutils import offset_committer
+        consumer = _consumer()
+        committer = offset_committer(
+            log=log,
+            consumer=consumer,
+            batchSize=3,
+            interval=3600
+        )
+
+        # NOTHING IS COMMITTED UNTIL A BATCH IS COMPLETE, THEN THE NEXT OFFSET OF EACH PARTITION IS COMMITTED ASYNCHRONOUSLY
+        committer.processed(_message(0, 10))
+        committer.processed(_message(1, 4))
+        self.assertEqual(consumer.commits, [])
+        committer.processed(_message(0, 11))
+        self.assertEqual(consumer.commits, [({("igwn.gwalert", 0): 12, ("igwn.gwalert", 1): 5}, True)])
+
+        # THE FLUSH ON SHUTDOWN IS SYNCHRONOUS AND ONLY COMMITS WHAT IS PENDING
+        committer.processed(_message(0, 12))
+        committer.flush()
+        self.assertEqual(consumer.commits[-1], ({("igwn.gwalert", 0): 13}, False))
+        committer.flush()
+        self.assertEqual(len(consumer.commits), 2)
+
+        # A QUIET STREAM STILL COMMITS ONCE THE INTERVAL HAS PASSED
+        committer.interval = 0
+        committer.processed(_message(1, 5))
+        committer.commit_if_due()
+        self.assertEqual(consumer.commits[-1], ({("igwn.gwalert", 1): 6}, True))
+
+    def test_offset_committer_out_of_order_function(self):
+
+        try:
+            import confluent_kafka
+        except ImportError:
+            return
+
+        from gocart.commonutils import offset_committer
+        consumer = _consumer()
+        committer = offset_committer(
+            log=log,
+            consumer=consumer,
+            batchSize=1,
+            interval=3600
+        )
+
+        # MESSAGES HANDED TO WORKERS FINISH OUT OF ORDER: THE OFFSET ONLY ADVANCES PAST A CONTIGUOUS RUN OF PROCESSED MESSAGES
+        messages = [_message(0, o) for o in range(5)]
+        for m in messages:
+            committer.fetched(m)
+        committer.processed(messages[2])
+        committer.processed(messages[1])
+        self.assertEqual(consumer.commits, [])
+        committer.processed(messages[0])
+        self.assertEqual(consumer.commits[-1], ({("igwn.gwalert", 0): 3}, True))
+        committer.processed(messages[4])
+        self.assertEqual(len(consumer.commits), 1)
+        committer.processed(messages[3])
+        self.assertEqual(consumer.commits[-1], ({("igwn.gwalert", 0): 5}, True))
+
+    def test_offset_committer_error_event_function(self):
+
+        try:
+            import confluent_kafka
+        except ImportError:
+            return
+
+        from gocart.commonutils import offset_committer
+        consumer = _consumer()
+        committer = offset_committer(
+            log=log,
+            consumer=consumer,
+            batchSize=1,
+            interval=3600
+        )
+
+        # KAFKA ERROR EVENTS AND MESSAGES WITHOUT AN OFFSET ARE NEVER REGISTERED OR COMMITTED
+        for bogus in [_message(None, None, topic=None, error="broker transport failure"), _message(0, -1001), _message(0, 7, error="partition EOF")]:
+            committer.fetched(bogus)
+            committer.processed(bogus)
+        self.assertEqual(committer.inFlight, {})
+        self.assertEqual(consumer.commits, [])
+        committer.fetched(_message(0, 7))
+        committer.processed(_message(0, 7))
+        self.assertEqual(consumer.commits, [({("igwn.gwalert", 0): 8}, True)])
+        committer.flush()
+        self.assertEqual(len(consumer.commits), 1)
+
+    def test_offset_committer_skip_to_end_function(self):
+
+        try:
+            import confluent_kafka
+        except ImportError:
+            return
+
+        from gocart.commonutils import offset_committer
+        consumer = _consumer(watermarks={0: (5, 120), 1: (0, 30)})
+        committer = offset_committer(
+            log=log,
+            consumer=consumer
+        )
+        skipped = committer.skip_to_end("igwn.gwalert")
+        self.assertEqual(skipped, 145)
+        self.assertEqual(consumer.commits, [({("igwn.gwalert", 0): 120, ("igwn.gwalert", 1): 30}, False)])
+
+    # x-class-to-test-named-worker-function
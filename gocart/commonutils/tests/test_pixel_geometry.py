@@ -0,0 +1,91 @@
+from __future__ import print_function
+from builtins import str
+import os
+import unittest
+import shutil
+import unittest
+import yaml
+from gocart.utKit import utKit
+from fundamentals import tools
+from os.path import expanduser
+home = expanduser("~")
+
+packageDirectory = utKit("").get_project_root()
+settingsFile = packageDirectory + "/test_settings.yaml"
+# settingsFile = home + \
+#     "/git_repos/_misc_/settings/gocart/test_settings.yaml"
+
+su = tools(
+    arguments={"settingsFile": settingsFile},
+    docString=__doc__,
+    logLevel="DEBUG",
+    options_first=False,
+    projectName=None,
+    defaultSettingsFile=False
+)
+arguments, settings, log, dbConn = su.setup()
+
+# SETUP PATHS TO COMMON DIRECTORIES FOR TEST DATA
+moduleDirectory = os.path.dirname(__file__)
+pathToInputDir = moduleDirectory + "/input/"
+pathToOutputDir = moduleDirectory + "/output/"
+
+try:
+    shutil.rmtree(pathToOutputDir)
+except:
+    pass
+# COPY INPUT TO OUTPUT DIR
+shutil.copytree(pathToInputDir, pathToOutputDir)
+
+# Recursively create missing directories
+if not os.path.exists(pathToOutputDir):
+    os.makedirs(pathToOutputDir)
+
+
+# xt-setup-unit-testing-files-and-folders
+# xt-utkit-refresh-database
+
+class test_pixel_geometry(unittest.TestCase):
+
+    def test_pixel_geometry_function(self):
+
+        import numpy as np
+        import astropy_healpix as ah
+        from gocart.commonutils import pixel_geometry
+        geometry = pixel_geometry(
+            log=log,
+            nside=16,
+            cacheDir=pathToOutputDir + "/cache"
+        )
+        for c in ["RA", "DEC", "GLON", "GLAT"]:
+            self.assertEqual(len(geometry[c]), 12 * 16**2)
+            self.assertTrue(os.path.exists(pathToOutputDir + f"/cache/geometry/nside16_{c}.npy"))
+        ra, dec = ah.healpix_to_lonlat(np.arange(12 * 16**2), 16, order='nested')
+        np.testing.assert_array_equal(geometry["RA"], ra.deg)
+        np.testing.assert_array_equal(geometry["DEC"], dec.deg)
+
+        # SECOND CALL IS SERVED FROM THE PROCESS CACHE
+        again = pixel_geometry(
+            log=log,
+            nside=16,
+            cacheDir=pathToOutputDir + "/cache"
+        )
+        self.assertIs(again["RA"], geometry["RA"])
+
+    def test_pixel_geometry_function_exception(self):
+
+        from gocart.commonutils import pixel_geometry
+        try:
+            this = pixel_geometry(
+                log=log,
+                settings=settings,
+                fakeKey="break the code"
+            )
+            assert False
+        except Exception as e:
+            assert True
+            print(str(e))
+
+        # x-print-testpage-for-pessto-marshall-web-object
+
+    # x-class-to-test-named-worker-function
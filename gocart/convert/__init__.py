@@ -5,3 +5,4 @@ from .aitoff import aitoff
 from .healpix2cart import healpix2cart
 from .healpix2cart import create_wcs_and_pixels
 from .ascii import ascii
+from .galaxies import galaxies
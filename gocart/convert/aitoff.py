@@ -11,10 +11,29 @@
 """
 from fundamentals import tools
 from builtins import object
+from collections import OrderedDict
+import threading
 import sys
 import os
 os.environ['TERM'] = 'vt100'
 
+# PROCESS-WIDE CACHE OF THE STATIC LON/LAT GRID USED FOR THE SUN AND MOON CONTOURS (AND ITS UNIT VECTORS)
+_skyGridLock = threading.Lock()
+_skyGridCache = {}
+
+# PROCESS-WIDE CACHE OF THE RENDERED MAP-INDEPENDENT LAYERS (GRATICULE, FRAME, GALACTIC PLANE), KEYED BY (GALACTIC PLANE, DPI, FIGURE SIZE)
+_baseLayerLock = threading.Lock()
+_baseLayerCache = {}
+
+# PROCESS-WIDE CACHE OF THE INVERSE PROJECTION OF EVERY SKY PIXEL IN THE IMAGE (RASTER RENDERER), KEYED BY IMAGE GEOMETRY
+_projectionLock = threading.Lock()
+_projectionCache = {}
+
+# PROCESS-WIDE CACHE OF THE SUN AND MOON POSITIONS, KEYED BY DATE-OBS (ONLY THE MOST RECENT DATES ARE KEPT)
+_ephemeridesLock = threading.Lock()
+_ephemeridesCache = OrderedDict()
+_ephemeridesCacheSize = 64
+
 
 class aitoff(object):
     """
@@ -22,7 +41,7 @@ class aitoff(object):
 
     **Key Arguments:**
         - ``log`` -- logger
-        - ``mapPath`` -- path to the multiorder FITS file
+        - ``mapPath`` -- path to the multiorder FITS file (or an astropy table or `multiorder_skymap` object of the map)
         - ``outputFolder`` -- path to output the results to
         - ``settings`` -- the settings dictionary
         - ``meta`` -- extra meta data to present on plots. Default: {}
@@ -79,7 +98,8 @@ class aitoff(object):
         contours=True,
         galacticPlane=True,
         sunmoon=True,
-        sunmoonContour=True
+        sunmoonContour=True,
+        renderer="matplotlib"
     ):
         """
         *convert the healpix map to an aitoff plot*
@@ -89,6 +109,7 @@ class aitoff(object):
             - ``galacticPlane`` -- plot galactic plane contours. Default *True*
             - ``sunmoon`` -- plot sun and moon. Default *True*
             - ``sunmoonContour`` -- show contours within 33 deg of sun and 20 deg from moon
+            - ``renderer`` -- `matplotlib` (contour the map resampled to a cartesian grid) or `raster` (a quick-look plot: the credible regions and sun/moon contours are painted directly into the image pixels from the native multiorder map, skipping the cartesian resampling and `contourf`). Default *matplotlib*
 
         **Return:**
             - ``plotPath`` -- path to the printed plot
@@ -101,11 +122,7 @@ class aitoff(object):
         plt.style.use(styleFile)
 
         from . import healpix2cart
-        import astropy.units as u
         import numpy as np
-        from astropy.coordinates import SkyCoord, Galactic, get_sun, get_body
-        from matplotlib.projections.geo import GeoAxes
-        from matplotlib.cm import get_cmap
         import matplotlib.patches as mpatches
         from matplotlib.lines import Line2D
         from astropy.time import Time
@@ -116,159 +133,107 @@ class aitoff(object):
         matplotlib.use('PDF')
         # plt.ion()
 
-        class ThetaFormatterShiftPi(GeoAxes.ThetaFormatter):
-            """SHIFTS LABELLING BY PI
-            SHIFTS LABELLING FROM -180,180 TO 360-0"""
-
-            def __call__(self, x, pos=None):
-                x -= np.pi
-                x = -x
-                return GeoAxes.ThetaFormatter.__call__(self, x, pos)
-
-        # CONVERT TO RECTILINEAR GRID
-        converter = healpix2cart(
-            log=self.log,
-            mapPath=self.mapPath,
-            settings=self.settings
-        )
-        wcs, mapDF, header = converter.convert()
-
-        # DROP MISSING VALUES
-        mapDF.dropna(axis='index', how='any', subset=['PROB'], inplace=True)
-
-        xsize = mapDF["PIXEL_X"].max() - mapDF["PIXEL_X"].min() + 1
-        ysize = mapDF["PIXEL_Y"].max() - mapDF["PIXEL_Y"].min() + 1
-
-        # RA RANGES FROM 0-360 ... NEED TO FLIP 360-0, AND THEN SHIFT BY 180 TO MATCH MATPLOTLIB FRAME
-        mapDF = mapDF.iloc[::-1].reset_index()
-        mapDF["RASHIFTED"] = -mapDF["RA"] + 180
-        data = mapDF["PROB"].values.reshape((ysize, xsize))
-        long = np.deg2rad(mapDF["RASHIFTED"].values).reshape((ysize, xsize))
-        lat = np.deg2rad(mapDF["DEC"].values).reshape((ysize, xsize))
+        if renderer not in ("matplotlib", "raster"):
+            raise ValueError(f"unknown aitoff renderer `{renderer}`: use `matplotlib` or `raster`")
+
+        if renderer == "raster":
+            # THE RASTER RENDERER SAMPLES THE NATIVE MULTIORDER MAP; NO CARTESIAN GRID IS NEEDED
+            from gocart.commonutils import read_skymap
+            skymap = read_skymap(log=self.log, skymap=self.mapPath)
+            header = skymap.meta
+        else:
+            # CONVERT TO RECTILINEAR GRID
+            converter = healpix2cart(
+                log=self.log,
+                mapPath=self.mapPath,
+                settings=self.settings
+            )
+            wcs, mapDF, header = converter.convert()
+
+            # DROP MISSING VALUES
+            mapDF.dropna(axis='index', how='any', subset=['PROB'], inplace=True)
+
+            xsize = mapDF["PIXEL_X"].max() - mapDF["PIXEL_X"].min() + 1
+            ysize = mapDF["PIXEL_Y"].max() - mapDF["PIXEL_Y"].min() + 1
+
+            # RA RANGES FROM 0-360 ... NEED TO FLIP 360-0, AND THEN SHIFT BY 180 TO MATCH MATPLOTLIB FRAME
+            mapDF = mapDF.iloc[::-1].reset_index()
+            mapDF["RASHIFTED"] = -mapDF["RA"] + 180
+            data = mapDF["PROB"].values.reshape((ysize, xsize))
+            long = np.deg2rad(mapDF["RASHIFTED"].values).reshape((ysize, xsize))
+            lat = np.deg2rad(mapDF["DEC"].values).reshape((ysize, xsize))
 
         # long = mapDF["RASHIFTED"].values.reshape((ysize, xsize))
         # lat = mapDF["DEC"].values.reshape((ysize, xsize))
 
-        # MATPLOTLIB IS DOING THE PROJECTION
-        cmap = get_cmap("hot_r")
-        fig = plt.figure()
-
+        # THE GRATICULE, FRAME AND GALACTIC PLANE ARE RENDERED ONCE PER PROCESS; ONLY THE MAP-DEPENDENT LAYERS ARE DRAWN HERE,
+        # ON A BARE HAMMER AXES OF IDENTICAL GEOMETRY, AND THEN COMPOSITED BETWEEN THE CACHED LAYERS
+        dpi = 300
+        base = base_layers(galacticPlane=galacticPlane, dpi=dpi)
         # AITOFF DOES NOT PLAY WELL WITH ADDING LABELS - USE HAMMER PROJECTION INSTEAD
-        ax = fig.add_subplot(111, projection='hammer', zorder=60)
-
-        # RASTERIZED MAKES THE MAP BITMAP WHILE THE LABELS REMAIN VECTORIAL
-        std = data.std()
-        mean = data.mean()
-        # image = ax.pcolormesh(long, lat, data, rasterized=False, cmap=cmap, vmin=mean, vmax=mean + 5 * std)
-
-        # GRATICULE
-        ax.set_longitude_grid(30)
-        ax.set_latitude_grid(15)
-        ax.xaxis.set_major_formatter(ThetaFormatterShiftPi(30))
-        ax.set_longitude_grid_ends(90)
-
-        if sunmoonContour:
-            t = Time(header['DATE-OBS'], scale='utc')
-
-            # FIND SUN AND PLACE ON CORRECT PLOT COORDINATE
-            sun = get_sun(t)
-            sun.ra.degree = -sun.ra.degree + 180
-            if sun.ra.degree > 180.:
-                sun.ra.degree -= 360
-            sun.ra.radian = np.deg2rad(sun.ra.degree)
-
-            # COMPUTE LONS AND LATS OF DAY/NIGHT TERMINATOR.
-            nlons = 1441
-            nlats = ((nlons - 1) / 2) + 1
-
-            # COLOR IN THE SUN
-            lons2 = np.linspace(-np.pi, np.pi, nlons)
-            lats2 = np.linspace(-np.pi / 2, np.pi / 2, int(nlats))
-            lons2, lats2 = np.meshgrid(lons2, lats2)
-            sunlight = np.ones(lons2.shape)
-            raSep = sun.ra.radian - lons2
-            raSep[raSep > np.pi] = 2 * np.pi - raSep[raSep > np.pi]
-            separation = ((raSep * np.cos((sun.dec.radian + lats2) / 2))**2 + (sun.dec.radian - lats2)**2)**0.5
-            sunlight[separation < np.radians(33)] = 0
+        fig, ax = _sky_figure(dpi=dpi)
+        ax.set_axis_off()
+
+        if sunmoon or sunmoonContour:
+            ephemerides = sun_moon_positions(dateObs=header['DATE-OBS'])
+
+        # THE RASTER RENDERER PAINTS THE SKY REGIONS STRAIGHT INTO THE IMAGE PIXELS, BENEATH THE MATPLOTLIB LAYER
+        rasterLayers = []
+        if renderer == "raster":
+            lookup = projection_lookup(ax=ax, shape=base["background"].shape)
+
+        if sunmoonContour and renderer == "raster":
+            moonblue = matplotlib.colors.colorConverter.to_rgba('#268bd2', alpha=0.2)
+            sunyellow = matplotlib.colors.colorConverter.to_rgba('#ffc202', alpha=0.15)
+            for body, radius, colour in [("moon", 20, moonblue), ("sun", 33, sunyellow)]:
+                rasterLayers.append(_fill(lookup["pixels"][_within(lookup, *ephemerides[body], radius=radius)], colour))
+        elif sunmoonContour:
+            # COLOUR IN THE SKY WITHIN 33 DEG OF THE SUN AND 20 DEG OF THE MOON
+            grid = sky_grid()
+            sunlight = np.where(_within(grid, *ephemerides["sun"], radius=33), 0., 1.)
             sunyellow = matplotlib.colors.colorConverter.to_rgba('#ffc202', alpha=0.15)
-            ax.contourf(lons2, lats2, sunlight, 1, colors=[sunyellow, (0.0, 0.0, 0.0, 0.0)], zorder=30)
-
-            # PLOT THE MOON
-            moon = get_body("moon", t)
-            moon.ra.degree = -moon.ra.degree + 180
-            if moon.ra.degree > 180.:
-                moon.ra.degree -= 360
-            moon.ra.radian = np.deg2rad(moon.ra.degree)
-
-            # COMPUTE LONS AND LATS OF DAY/NIGHT TERMINATOR.
-            nlons = 1441
-            nlats = ((nlons - 1) / 2) + 1
-
-            # COLOR IN THE SUN
-            lons2 = np.linspace(-np.pi, np.pi, nlons)
-            lats2 = np.linspace(-np.pi / 2, np.pi / 2, int(nlats))
-            lons2, lats2 = np.meshgrid(lons2, lats2)
-            moonlight = np.ones(lons2.shape)
-            raSep = moon.ra.radian - lons2
-            raSep[raSep > np.pi] = 2 * np.pi - raSep[raSep > np.pi]
-            separation = ((raSep * np.cos((moon.dec.radian + lats2) / 2))**2 + (moon.dec.radian - lats2)**2)**0.5
-            moonlight[separation < np.radians(20)] = 0
+            ax.contourf(grid["lons"], grid["lats"], sunlight, 1, colors=[sunyellow, (0.0, 0.0, 0.0, 0.0)], zorder=30)
+
+            moonlight = np.where(_within(grid, *ephemerides["moon"], radius=20), 0., 1.)
             moonblue = matplotlib.colors.colorConverter.to_rgba('#268bd2', alpha=0.2)
-            ax.contourf(lons2, lats2, moonlight, 1, colors=[moonblue, (0.0, 0.0, 0.0, 0.0)], zorder=29)
+            ax.contourf(grid["lons"], grid["lats"], moonlight, 1, colors=[moonblue, (0.0, 0.0, 0.0, 0.0)], zorder=29)
 
-        # PLOT THE SUN
+        # PLOT THE SUN AND MOON
         if sunmoon:
-            t = Time(header['DATE-OBS'], scale='utc')
-
-            # FIND SUN AND PLACE ON CORRECT PLOT COORDINATE
-            sun = get_sun(t)
-            sun.ra.degree = -sun.ra.degree + 180
-            if sun.ra.degree > 180.:
-                sun.ra.degree -= 360
-            sun.ra.radian = np.deg2rad(sun.ra.degree)
-
+            sunLon, sunLat = ephemerides["sun"]
             label = "Sun"
             if sunmoonContour:
                 label += " (within $33^o$)"
-            ax.scatter(sun.ra.radian, sun.dec.radian, color="#ffc202", alpha=0.8, s=20, marker="o", edgecolors="#cb4b16", linewidths=0.5, label=label, zorder=30)
-
-            # PLOT THE MOON
-            moon = get_body("moon", t)
-            moon.ra.degree = -moon.ra.degree + 180
-            if moon.ra.degree > 180.:
-                moon.ra.degree -= 360
-            moon.ra.radian = np.deg2rad(moon.ra.degree)
+            ax.scatter(sunLon, sunLat, color="#ffc202", alpha=0.8, s=20, marker="o", edgecolors="#cb4b16", linewidths=0.5, label=label, zorder=30)
 
+            moonLon, moonLat = ephemerides["moon"]
             label = "Moon"
             if sunmoonContour:
                 label += " (within $20^o$)"
-            ax.scatter(moon.ra.radian, moon.dec.radian, color="#268bd2", alpha=0.8, s=20, marker="o", edgecolors="#1e6ea7", linewidths=0.5, label=label, zorder=29)
+            ax.scatter(moonLon, moonLat, color="#268bd2", alpha=0.8, s=20, marker="o", edgecolors="#1e6ea7", linewidths=0.5, label=label, zorder=29)
 
         handles, labels = plt.gca().get_legend_handles_labels()
         if galacticPlane:
-            # LON:LAT is lon 0-360 at lat=0
-            lon_array = np.arange(0, 360, 0.5)
-            lat_arry = np.full_like(lon_array, 0)
-            galc = SkyCoord(l=lon_array, b=lat_arry, frame=Galactic, unit=u.deg)
+            handles.append(Line2D([0], [0], label='Galactic Plane', color=galacticPlaneColour))
 
-            # CONVERT TO EQUATORIAL COORDINATES
-            equatorial_array = galc.icrs
-            gRa = equatorial_array.ra.degree
-            gDec = equatorial_array.dec.degree
-            gx = np.remainder(gRa + 180, 360)
-            # SCALE CONVERSION TO [-180, 180] & FLIP RA
-            ind = gx > 180
-            gx[ind] -= 360
-            gx = -gx
-            planeColour = "#dc322f"
-            ax.scatter(np.radians(gx), np.radians(gDec),
-                       color=planeColour, alpha=1, s=1)
-            ax.scatter(np.radians(gx), np.radians(gDec),
-                       color=planeColour, alpha=0.1, s=1, zorder=30)
-            line = Line2D([0], [0], label='Galactic Plane', color=planeColour)
-            handles.append(line)
-
-        if contours:
+        if contours and renderer == "raster":
+            colors = ['#a2a4c6', '#cdc2d3', '#8bfdf8']
+            levels = [90.0, 50.0, 10.0]
+            # THE CREDIBLE LEVEL OF THE MULTIORDER PIXEL UNDER EACH IMAGE PIXEL, COLOURED BY THE INNERMOST REGION IT FALLS IN
+            index29, order = skymap.sorted_index29()
+            credibleLevel = skymap.credible_levels()[order[np.searchsorted(index29, lookup["index29"], side='right') - 1]]
+            region = np.searchsorted(np.array(levels[::-1]) / 100., credibleLevel)
+            inside = region < len(levels)
+            rasterLayers.insert(0, _fill(lookup["pixels"][inside], [matplotlib.colors.colorConverter.to_rgba(c) for c in colors[::-1]], region[inside]))
+            for c, l in zip(colors, levels):
+                if "EXTRA" in self.meta and f"area{int(l)}" in self.meta["EXTRA"]:
+                    area = self.meta["EXTRA"][f"area{int(l)}"]
+                    label = f"{int(l)}%: {area:.1f} deg$^2$"
+                else:
+                    label = f"{int(l)}%"
+                patch = mpatches.Patch(color=c, label=label)
+                handles.append(patch)
+        elif contours:
             mapDF.sort_values(["PROBDENSITY"],
                               ascending=[False], inplace=True)
             mapDF["CUMPROB"] = np.cumsum(mapDF['PROB'])
@@ -358,18 +323,355 @@ class aitoff(object):
                 patch = mpatches.Patch(color=self.patchesColor, label=self.patchesLabel)
                 handles.append(patch)
 
-        ax.tick_params(axis='x', labelsize=12)
-        ax.tick_params(axis='y', labelsize=12)
-        ax.grid(color='#657b83', alpha=0.4, linestyle='dotted')
         plt.legend(handles=handles, loc='upper left', scatterpoints=1, bbox_to_anchor=(1.01, 1.02), fontsize=6)
-        ax.xaxis.zorder = 40
-        ax.yaxis.zorder = 40
-
-        plt.grid(True)
 
-        plt.savefig(self.outputFolder + f"/{self.plotName}", bbox_inches='tight', dpi=300)
-
-        plt.close()
+        # COMPOSITE THE MAP LAYERS BETWEEN THE CACHED BASE LAYERS, CROP TO THE DRAWN AREA AND WRITE THE PNG
+        from PIL import Image
+        image = _flatten(base["background"], rasterLayers + [_sparse(_render(fig)), base["over"]], extent=base["extent"], pad=int(round(0.1 * dpi)))
+        plt.close(fig)
+        Image.fromarray(image).save(self.outputFolder + f"/{self.plotName}")
 
         self.log.debug('completed the ``convert`` method')
         return None
+
+
+def sky_grid(
+        nlons=1441):
+    """*return the static lon/lat grid (plot radians) the sun and moon contours are drawn on, with the unit vector of every grid point. Built once per process*
+
+    **Key Arguments:**
+        - ``nlons`` -- number of longitude grid points (the latitude grid has half as many intervals). Default *1441*
+
+    **Return:**
+        - ``grid`` -- dictionary of read-only 2D numpy arrays `lons`, `lats` and the unit vector components `x`, `y`, `z`
+    """
+    import numpy as np
+
+    with _skyGridLock:
+        grid = _skyGridCache.get(nlons)
+        if grid is None:
+            nlats = int((nlons - 1) / 2) + 1
+            lons, lats = np.meshgrid(np.linspace(-np.pi, np.pi, nlons), np.linspace(-np.pi / 2, np.pi / 2, nlats))
+            cosLat = np.cos(lats)
+            grid = {
+                "lons": lons,
+                "lats": lats,
+                "x": cosLat * np.cos(lons),
+                "y": cosLat * np.sin(lons),
+                "z": np.sin(lats)
+            }
+            for v in grid.values():
+                v.flags.writeable = False
+            _skyGridCache[nlons] = grid
+
+    return grid
+
+
+def sun_moon_positions(
+        dateObs):
+    """*return the sun and moon positions (plot radians) at the given time. Cached per time, so alerts for the same event only compute the ephemerides once*
+
+    Plot longitudes run from +pi to -pi as RA runs from 0 to 360 deg (RA increases to the left).
+
+    **Key Arguments:**
+        - ``dateObs`` -- the observation time (e.g. the `DATE-OBS` map header value)
+
+    **Return:**
+        - ``positions`` -- dictionary {"sun": (lon, lat), "moon": (lon, lat)}
+    """
+    import numpy as np
+    from astropy.coordinates import get_sun, get_body
+    from astropy.time import Time
+
+    with _ephemeridesLock:
+        positions = _ephemeridesCache.get(dateObs)
+        if positions is not None:
+            _ephemeridesCache.move_to_end(dateObs)
+            return positions
+
+    t = Time(dateObs, scale='utc')
+    positions = {}
+    for name, body in [("sun", get_sun(t)), ("moon", get_body("moon", t))]:
+        # FLIP RA AND SHIFT BY 180 TO MATCH THE MATPLOTLIB FRAME
+        lon = -body.ra.degree + 180
+        if lon > 180.:
+            lon -= 360
+        positions[name] = (np.deg2rad(lon), body.dec.radian)
+
+    with _ephemeridesLock:
+        _ephemeridesCache[dateObs] = positions
+        while len(_ephemeridesCache) > _ephemeridesCacheSize:
+            _ephemeridesCache.popitem(last=False)
+
+    return positions
+
+
+def _within(
+        grid,
+        lon,
+        lat,
+        radius):
+    """*boolean mask of the grid points within ``radius`` degrees (great-circle) of the position (plot radians)*"""
+    import numpy as np
+    cosSeparation = np.cos(lat) * np.cos(lon) * grid["x"] + np.cos(lat) * np.sin(lon) * grid["y"] + np.sin(lat) * grid["z"]
+    return cosSeparation > np.cos(np.radians(radius))
+
+
+galacticPlaneColour = "#dc322f"
+
+
+def _theta_formatter():
+    """*a longitude tick formatter labelling RA from 360 to 0 deg (left to right) in place of matplotlib's -180 to 180*"""
+    import numpy as np
+    from matplotlib.projections.geo import GeoAxes
+
+    class ThetaFormatterShiftPi(GeoAxes.ThetaFormatter):
+        """SHIFTS LABELLING BY PI
+        SHIFTS LABELLING FROM -180,180 TO 360-0"""
+
+        def __call__(self, x, pos=None):
+            x -= np.pi
+            x = -x
+            return GeoAxes.ThetaFormatter.__call__(self, x, pos)
+
+    return ThetaFormatterShiftPi(30)
+
+
+def _sky_figure(
+        dpi=300,
+        legendRoom=0.4):
+    """*return a transparent figure and its hammer-projection axes (with the graticule styling). Used for both the cached base layers and the per-map layer so their geometry is identical*
+
+    The canvas is widened to the right (the axes keep their size and position) so the legend drawn outside the axes is not clipped; the unused canvas is cropped away when the layers are flattened.
+    """
+    import matplotlib.pyplot as plt
+
+    fig = plt.figure(dpi=dpi)
+    fig.patch.set_alpha(0)
+    ax = fig.add_subplot(111, projection='hammer', zorder=60)
+    width, height = fig.get_size_inches()
+    pos = ax.get_position()
+    scale = 1. / (1. + legendRoom)
+    fig.set_size_inches(width * (1. + legendRoom), height)
+    ax.set_position([pos.x0 * scale, pos.y0, pos.width * scale, pos.height])
+    ax.set_longitude_grid(30)
+    ax.set_latitude_grid(15)
+    ax.xaxis.set_major_formatter(_theta_formatter())
+    ax.set_longitude_grid_ends(90)
+    ax.tick_params(axis='x', labelsize=12)
+    ax.tick_params(axis='y', labelsize=12)
+    ax.grid(True, color='#657b83', alpha=0.4, linestyle='dotted')
+    ax.xaxis.zorder = 40
+    ax.yaxis.zorder = 40
+    return fig, ax
+
+
+def base_layers(
+        galacticPlane=True,
+        dpi=300):
+    """*return the map-independent layers of the aitoff plot, rendered once per process and cached*
+
+    The layers are rendered with the package style at the plot resolution. The `under` layer (the sky background and the galactic plane) sits beneath the map layers, and the `over` layer (the frame, graticule, tick labels and a faint galactic plane) sits on top of them.
+
+    **Key Arguments:**
+        - ``galacticPlane`` -- include the galactic plane. Default *True*
+        - ``dpi`` -- the resolution of the plot. Default *300*
+
+    **Return:**
+        - ``layers`` -- dictionary of the `background` (the under layer flattened onto white, a read-only RGB numpy array), the `over` layer (a sparse layer, see `_sparse`) and the `extent` (first row, last row, first column, last column) of the drawn pixels
+    """
+    import matplotlib.pyplot as plt
+    import numpy as np
+    from gocart.commonutils import getpackagepath
+    plt.style.use(getpackagepath() + "/resources/package.mplstyle")
+
+    key = (galacticPlane, dpi, tuple(plt.rcParams["figure.figsize"]))
+    with _baseLayerLock:
+        layers = _baseLayerCache.get(key)
+        if layers is not None:
+            return layers
+
+        fig, ax = _sky_figure(dpi=dpi)
+
+        planes = []
+        if galacticPlane:
+            import astropy.units as u
+            from astropy.coordinates import SkyCoord, Galactic
+            # LON:LAT is lon 0-360 at lat=0
+            lon_array = np.arange(0, 360, 0.5)
+            lat_arry = np.full_like(lon_array, 0)
+            galc = SkyCoord(l=lon_array, b=lat_arry, frame=Galactic, unit=u.deg)
+
+            # CONVERT TO EQUATORIAL COORDINATES
+            equatorial_array = galc.icrs
+            gRa = equatorial_array.ra.degree
+            gDec = equatorial_array.dec.degree
+            gx = np.remainder(gRa + 180, 360)
+            # SCALE CONVERSION TO [-180, 180] & FLIP RA
+            ind = gx > 180
+            gx[ind] -= 360
+            gx = -gx
+            planes.append(ax.scatter(np.radians(gx), np.radians(gDec), color=galacticPlaneColour, alpha=1, s=1))
+            planes.append(ax.scatter(np.radians(gx), np.radians(gDec), color=galacticPlaneColour, alpha=0.1, s=1, zorder=30))
+
+        # UNDER: SKY BACKGROUND AND GALACTIC PLANE
+        ax.xaxis.set_visible(False)
+        ax.yaxis.set_visible(False)
+        for spine in ax.spines.values():
+            spine.set_visible(False)
+        if planes:
+            planes[1].set_visible(False)
+        under = _render(fig)
+
+        # OVER: FRAME, GRATICULE, TICK LABELS AND THE FAINT GALACTIC PLANE
+        ax.patch.set_visible(False)
+        ax.xaxis.set_visible(True)
+        ax.yaxis.set_visible(True)
+        for spine in ax.spines.values():
+            spine.set_visible(True)
+        if planes:
+            planes[0].set_visible(False)
+            planes[1].set_visible(True)
+        over = _render(fig)
+        plt.close(fig)
+
+        # THE UNDER LAYER IS FLATTENED ONTO WHITE ONCE; THE (MOSTLY TRANSPARENT) OVER LAYER IS KEPT AS ITS DRAWN PIXELS ONLY
+        drawn = (under[..., 3] > 0) | (over[..., 3] > 0)
+        rows = np.flatnonzero(drawn.any(axis=1))
+        cols = np.flatnonzero(drawn.any(axis=0))
+        background = np.full(under.shape[:2] + (3,), 255., dtype=np.float32)
+        background += (under[..., :3] - background) * (under[..., 3:].astype(np.float32) / 255.)
+        layers = {
+            "background": np.round(background).astype(np.uint8),
+            "over": _sparse(over),
+            "extent": (rows[0], rows[-1], cols[0], cols[-1])
+        }
+        for v in [layers["background"]] + list(layers["over"]):
+            v.flags.writeable = False
+        _baseLayerCache[key] = layers
+
+    return layers
+
+
+def projection_lookup(
+        ax,
+        shape):
+    """*return the inverse hammer projection of every image pixel that falls on the sky, for the raster renderer. Built once per image geometry*
+
+    **Key Arguments:**
+        - ``ax`` -- the hammer axes the image is rendered from (see `_sky_figure`)
+        - ``shape`` -- the shape of the rendered image
+
+    **Return:**
+        - ``lookup`` -- dictionary of read-only numpy arrays, one element per sky pixel: `pixels` (the flat index of the pixel in the image), `index29` (the level-29 nested healpix pixel at its centre) and the unit vector components `x`, `y`, `z` (plot frame, as `sky_grid`)
+    """
+    import astropy_healpix as ah
+    import astropy.units as u
+    import numpy as np
+
+    fig = ax.figure
+    height, width = shape[:2]
+    key = (fig.dpi, tuple(fig.get_size_inches()), tuple(ax.get_position().bounds), height, width)
+    with _projectionLock:
+        lookup = _projectionCache.get(key)
+        if lookup is not None:
+            return lookup
+
+        # ONLY PIXELS WITHIN THE AXES BOUNDING BOX CAN FALL ON THE SKY (IMAGE ROWS RUN TOP TO BOTTOM, DISPLAY Y BOTTOM TO TOP)
+        x0, y0, x1, y1 = ax.bbox.extents
+        cols, rows = np.meshgrid(np.arange(max(int(x0), 0), min(int(np.ceil(x1)), width)),
+                                 np.arange(max(int(height - y1), 0), min(int(np.ceil(height - y0)), height)))
+        cols, rows = cols.ravel(), rows.ravel()
+
+        # PIXEL CENTRES TO THE HAMMER PROJECTION PLANE, THEN INVERT THE PROJECTION FOR THOSE INSIDE THE SKY ELLIPSE
+        px, py = (ax.transAffine + ax.transAxes).inverted().transform(np.column_stack([cols + 0.5, height - rows - 0.5])).T
+        onSky = (px / (2 * np.sqrt(2)))**2 + (py / np.sqrt(2))**2 < 1.
+        cols, rows, px, py = cols[onSky], rows[onSky], px[onSky], py[onSky]
+        zz = np.sqrt(1 - (px / 4)**2 - (py / 2)**2)
+        lon = 2 * np.arctan2(zz * px, 2 * (2 * zz**2 - 1))
+        lat = np.arcsin(np.clip(zz * py, -1, 1))
+
+        # PLOT LONGITUDE = 180 - RA
+        ra = np.remainder(180. - np.degrees(lon), 360.)
+        cosLat = np.cos(lat)
+        lookup = {
+            "pixels": rows.astype(np.intp) * width + cols,
+            "index29": ah.lonlat_to_healpix(ra * u.deg, lat * u.rad, ah.level_to_nside(29), order='nested'),
+            "x": (cosLat * np.cos(lon)).astype(np.float32),
+            "y": (cosLat * np.sin(lon)).astype(np.float32),
+            "z": np.sin(lat).astype(np.float32)
+        }
+        for v in lookup.values():
+            v.flags.writeable = False
+        _projectionCache[key] = lookup
+
+    return lookup
+
+
+def _sparse(
+        layer):
+    """*the drawn (not fully transparent) pixels of a dense RGBA image layer as a sparse layer: a tuple of their flat indices and their RGBA values*"""
+    import numpy as np
+    pixels = np.flatnonzero(layer[..., 3])
+    return pixels, layer.reshape(-1, 4)[pixels]
+
+
+def _fill(
+        pixels,
+        colours,
+        index=None):
+    """*a sparse layer painting the flat-indexed pixels with the RGBA colour (components 0-1), or with colours[index] per pixel if a list of colours is given*"""
+    import numpy as np
+    colours = np.round(np.atleast_2d(colours) * 255).astype(np.uint8)
+    if index is None:
+        return pixels, np.broadcast_to(colours[0], (len(pixels), 4))
+    return pixels, colours[index]
+
+
+def _render(
+        fig):
+    """*render the figure with the Agg renderer and return a copy of its (straight alpha) RGBA buffer*"""
+    import numpy as np
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    canvas = FigureCanvasAgg(fig)
+    canvas.draw()
+    return np.array(canvas.buffer_rgba())
+
+
+def _flatten(
+        background,
+        layers,
+        extent=None,
+        pad=30):
+    """*composite the sparse RGBA layers (bottom layer first, see `_sparse`) onto the RGB background and crop to the drawn area plus padding (like `bbox_inches='tight'`)*
+
+    Only the drawn pixels of each layer are touched, so the cost scales with what is drawn rather than the size of the canvas.
+
+    **Key Arguments:**
+        - ``background`` -- RGB uint8 numpy array
+        - ``layers`` -- list of sparse layers
+        - ``extent`` -- (first row, last row, first column, last column) of anything drawn on the background. Default *None* (nothing)
+        - ``pad`` -- padding around the drawn area in pixels. Default *30*
+
+    **Return:**
+        - ``image`` -- RGB uint8 numpy array
+    """
+    import numpy as np
+
+    height, width = background.shape[:2]
+    image = np.array(background).reshape(-1, 3)
+    rowMin, rowMax, colMin, colMax = extent if extent else (height, -1, width, -1)
+    for pixels, rgba in layers:
+        if not len(pixels):
+            continue
+        rows, cols = np.divmod(pixels, width)
+        rowMin, rowMax = min(rowMin, rows.min()), max(rowMax, rows.max())
+        colMin, colMax = min(colMin, cols.min()), max(colMax, cols.max())
+        alpha = rgba[:, 3:].astype(np.float32) / 255.
+        current = image[pixels].astype(np.float32)
+        image[pixels] = np.round(current + (rgba[:, :3] - current) * alpha)
+
+    image = image.reshape(height, width, 3)
+    if rowMax >= 0:
+        image = image[max(rowMin - pad, 0):rowMax + pad + 1, max(colMin - pad, 0):colMax + pad + 1]
+    return np.ascontiguousarray(image)
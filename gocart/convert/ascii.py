@@ -9,7 +9,7 @@
 :Date Created:
     March 29, 2023
 """
-from gocart.commonutils import flatten_healpix_map
+from gocart.commonutils import flatten_healpix_map, pixel_geometry
 from fundamentals import tools
 from builtins import object
 import sys
@@ -23,9 +23,10 @@ class ascii(object):
 
     **Key Arguments:**
         - ``log`` -- logger
-        - ``mapPath`` -- path the the healpix map or an astropy skymap table
-        - ``nside`` -- size of healpix pixels to resolve the sky to
+        - ``mapPath`` -- path the the healpix map, an astropy skymap table or a `multiorder_skymap` object
+        - ``nside`` -- size of healpix pixels to resolve the sky to, or a list of nsides to generate one ascii map per nside
         - ``settings`` -- the settings dictionary
+        - ``float32`` -- flatten the map to float32 probabilities and distances (halves the memory needed for high-resolution maps). Default *False*
 
     **Usage:**
 
@@ -41,7 +42,22 @@ class ascii(object):
         nside=64,
         settings=settings
     )
-    asciiContent = c.convert(outputFilepath="/path/to/skymap.csv")
+    asciiContent = c.convert()
+    c.convert(outputFilepath="/path/to/skymap.csv")
+    filesWritten = c.written
+    ```
+
+    Given a list of nsides, one map is written per nside with the nside appended to the filename (`skymap_nside64.csv`, `skymap_nside256.csv` ...), or a dictionary of the ascii content keyed by nside is returned.
+
+    To also write the map as binary tables that downstream tools can read directly:
+
+    ```python
+    c.convert(
+        outputFilepath="/path/to/skymap.csv",
+        formats=["csv", "parquet", "fits", "npy"],
+        precision=8
+    )
+    filesWritten = c.written
     ```
     """
 
@@ -51,6 +67,7 @@ class ascii(object):
             mapPath,
             nside=64,
             settings=False,
+            float32=False
 
     ):
         self.log = log
@@ -58,66 +75,232 @@ class ascii(object):
         self.settings = settings
         self.mapPath = mapPath
         self.nside = nside
+        # THE FILES WRITTEN BY THE LAST `convert`
+        self.written = []
 
+        # A LIST OF NSIDES GIVES A PYRAMID OF MAPS FROM A SINGLE FLATTENING PASS. MAPS ARE KEPT AS COMPACT STRUCTURED
+        # ARRAYS (ELEMENT i IS NESTED PIXEL i) UNTIL THE CSV IS WRITTEN
         self.table = flatten_healpix_map(
             log=log,
             mapPath=self.mapPath,
-            nside=self.nside
+            nside=self.nside,
+            asArray=True,
+            float32=float32
         )
+        if isinstance(self.nside, (list, tuple)):
+            self.tables = self.table
+        else:
+            self.tables = {self.nside: self.table}
 
         return None
 
     def convert(
             self,
-            outputFilepath=False):
+            outputFilepath=False,
+            formats="csv",
+            precision=False,
+            chunkSize=100000,
+            returnContent=False):
         """
-        *Convert the healpix map to ascii format and optionally save the ascii map to file*
+        *Convert the healpix map to ascii format and optionally save the ascii map to file (and/or to binary table formats)*
+
+        The map is written to file in chunks of rows, so the full text of the CSV is never held in memory (unless ``returnContent`` is set). The paths of the files written by the last call are kept in the ``written`` attribute.
 
         **Key Arguments:**
             - ``outputFilepath`` -- optionally write content to file. Default *False*
+            - ``formats`` -- the format, or list of formats, to write to file. Any of `csv`, `parquet` (needs `pyarrow`), `fits` (binary table) and `npy` (numpy structured array). The file extension of ``outputFilepath`` is swapped to match each format. Default *csv*
+            - ``precision`` -- the number of significant figures to write floats to in the CSV. Default *False* (full precision)
+            - ``chunkSize`` -- the number of rows to format and write at a time. Default *100000*
+            - ``returnContent`` -- also return the CSV content when writing to file (holds the full text of the CSV in memory). Default *False*
 
         **Return:**
-            - ``ascii`` -- the CSV version of the healpix file (nside=64)
+            - ``ascii`` -- the CSV version of the healpix file (a dictionary of CSV content keyed by nside if a list of nsides was given) if no ``outputFilepath`` is given or ``returnContent`` is set, otherwise None
         """
         self.log.debug('starting the ``get`` method')
 
-        import astropy_healpix as ah
-        from astropy.coordinates import SkyCoord
+        import io
+
+        # CREATE HEADER FOR FILE
+        if isinstance(self.mapPath, str):
+            eventId = self.mapPath.split("/")[-3]
+        elif getattr(self.mapPath, "mapPath", False):
+            eventId = self.mapPath.mapPath.split("/")[-3]
+        else:
+            eventId = self.mapPath.meta.get("OBJECT")
+
+        if isinstance(formats, str):
+            formats = [formats]
+        writers = {
+            "csv": self._write_csv,
+            "parquet": self._write_parquet,
+            "fits": self._write_fits,
+            "npy": self._write_npy
+        }
+        for f in formats:
+            if f not in writers:
+                raise ValueError(f"Unknown ascii map format '{f}', choose from {list(writers.keys())}")
+
+        pyramid = isinstance(self.nside, (list, tuple))
+        allContent = {}
+        written = []
+        for nside, tableData in self.tables.items():
+            if not outputFilepath or returnContent:
+                with io.StringIO() as stream:
+                    self._write_csv(stream, tableData=tableData, nside=nside, eventId=eventId, precision=precision, chunkSize=chunkSize)
+                    allContent[nside] = stream.getvalue()
+            if not outputFilepath:
+                continue
+
+            root, ext = os.path.splitext(outputFilepath)
+            if pyramid:
+                root = f"{root}_nside{nside}"
+            for f in formats:
+                filepath = f"{root}.{f}"
+                if f == "csv":
+                    with open(filepath, mode='w', encoding='utf-8', newline='') as writeFile:
+                        if nside in allContent:
+                            writeFile.write(allContent[nside])
+                        else:
+                            self._write_csv(writeFile, tableData=tableData, nside=nside, eventId=eventId, precision=precision, chunkSize=chunkSize)
+                elif not writers[f](filepath, tableData=tableData, nside=nside, eventId=eventId, chunkSize=chunkSize):
+                    continue
+                written.append(filepath)
+
+        self.written = written
+
+        self.log.debug('completed the ``get`` method')
+        if not allContent:
+            return None
+        if pyramid:
+            return allContent
+        return allContent[self.nside]
+
+    def _chunks(
+            self,
+            tableData,
+            nside,
+            chunkSize):
+        """*yield the flattened map as pandas dataframes of at most `chunkSize` rows, indexed by IPIX and with the sky-coordinate columns added*"""
+        self.log.debug('starting the ``_chunks`` method')
+
+        import pandas as pd
+
+        # THE RA, DEC, GLON AND GLAT COLUMNS COME FROM THE CACHED PIXEL GEOMETRY FOR THIS NSIDE
+        geometry = pixel_geometry(log=self.log, nside=nside)
+        columns = [c for c in tableData.dtype.names if c != 'DISTNORM']
+        for start in range(0, max(len(tableData), 1), chunkSize):
+            end = min(start + chunkSize, len(tableData))
+            chunk = pd.DataFrame({c: tableData[c][start:end] for c in columns}, index=pd.RangeIndex(start, end, name='IPIX'))
+            for c in ["RA", "DEC", "GLON", "GLAT"]:
+                chunk[c] = geometry[c][start:end]
+            yield chunk
 
-        tableData = self.table
+        self.log.debug('completed the ``_chunks`` method')
 
-        # CREATE RA AND DEC COLUMNS
-        ra, dec = ah.healpix_to_lonlat(tableData.index, 64, order='nested')
-        tableData["RA"] = ra.deg
-        tableData["DEC"] = dec.deg
+    def _write_csv(
+            self,
+            stream,
+            tableData,
+            nside,
+            eventId,
+            precision=False,
+            chunkSize=100000):
+        """*write the header and the flattened map to an open text stream in chunks*"""
+        self.log.debug('starting the ``_write_csv`` method')
 
-        # ALSO GLON GLAT COLUMNS
-        galacticCoords = SkyCoord(ra.deg, dec.deg, frame='icrs', unit='deg').galactic
-        tableData["GLON"] = galacticCoords.l.degree
-        tableData["GLAT"] = galacticCoords.b.degree
+        floatFormat = f"%.{precision}g" if precision else None
+        stream.write(f"# EVENT:{eventId}\n")
+        stream.write(f"# NSIDE:{nside}\n")
+        for i, chunk in enumerate(self._chunks(tableData=tableData, nside=nside, chunkSize=chunkSize)):
+            chunk.to_csv(stream, index=True, header=(i == 0), float_format=floatFormat)
+
+        self.log.debug('completed the ``_write_csv`` method')
+        return True
+
+    def _write_parquet(
+            self,
+            filepath,
+            tableData,
+            nside,
+            eventId,
+            chunkSize=100000):
+        """*write the flattened map to a parquet file in row groups (returns False if `pyarrow` is not installed)*"""
+        self.log.debug('starting the ``_write_parquet`` method')
 
-        # DROP COLUMNS
         try:
-            tableData.drop(columns=['DISTNORM'], inplace=True)
-        except:
-            pass
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            self.log.error(f"`pyarrow` is needed to write parquet files - {filepath} has not been written")
+            return False
 
-        # CREATE HEADER FOR FILE
+        writer = None
         try:
-            header = f"# EVENT:{self.table.meta['objid']}\n"
-        except:
-            eventId = self.mapPath.split("/")[-3]
-            header = f"# EVENT:{eventId}\n"
-        header += f"# NSIDE:{self.nside}\n"
+            for chunk in self._chunks(tableData=tableData, nside=nside, chunkSize=chunkSize):
+                table = pa.Table.from_pandas(chunk.reset_index(), preserve_index=False)
+                if writer is None:
+                    schema = table.schema.with_metadata({"EVENT": str(eventId), "NSIDE": str(nside)})
+                    writer = pq.ParquetWriter(filepath, schema)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+
+        self.log.debug('completed the ``_write_parquet`` method')
+        return True
 
-        tableData.index.names = ['IPIX']
-        asciiContent = tableData.to_csv(index=True)
-        asciiContent = header + asciiContent
+    def _write_fits(
+            self,
+            filepath,
+            tableData,
+            nside,
+            eventId,
+            chunkSize=100000):
+        """*write the flattened map to a FITS binary table*"""
+        self.log.debug('starting the ``_write_fits`` method')
 
-        if outputFilepath:
-            import codecs
-            with codecs.open(outputFilepath, encoding='utf-8', mode='w') as writeFile:
-                writeFile.write(asciiContent)
+        import numpy as np
+        from astropy.table import Table
 
-        self.log.debug('completed the ``get`` method')
-        return asciiContent
+        geometry = pixel_geometry(log=self.log, nside=nside)
+        table = Table(meta={"EVENT": eventId, "NSIDE": nside})
+        table["IPIX"] = np.arange(len(tableData), dtype=np.int64)
+        for c in tableData.dtype.names:
+            if c != 'DISTNORM':
+                table[c] = tableData[c]
+        for c in ["RA", "DEC", "GLON", "GLAT"]:
+            table[c] = geometry[c]
+        table.write(filepath, format='fits', overwrite=True)
+
+        self.log.debug('completed the ``_write_fits`` method')
+        return True
+
+    def _write_npy(
+            self,
+            filepath,
+            tableData,
+            nside,
+            eventId,
+            chunkSize=100000):
+        """*write the flattened map to a `.npy` file as a numpy structured array, filled in chunks*"""
+        self.log.debug('starting the ``_write_npy`` method')
+
+        import numpy as np
+
+        geometry = pixel_geometry(log=self.log, nside=nside)
+        dtype = [("IPIX", np.int64)] + [(c, tableData.dtype[c]) for c in tableData.dtype.names if c != 'DISTNORM'] + [(c, geometry[c].dtype) for c in ["RA", "DEC", "GLON", "GLAT"]]
+        out = np.lib.format.open_memmap(filepath, mode='w+', dtype=dtype, shape=(len(tableData),))
+        for start in range(0, len(tableData), chunkSize):
+            end = min(start + chunkSize, len(tableData))
+            out["IPIX"][start:end] = np.arange(start, end)
+            for c in out.dtype.names[1:]:
+                source = geometry if c in geometry else tableData
+                out[c][start:end] = source[c][start:end]
+        out.flush()
+        del out
+
+        self.log.debug('completed the ``_write_npy`` method')
+        return True
+
+    # use the tab-trigger below for new method
+    # xt-class-method
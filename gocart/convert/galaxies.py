@@ -0,0 +1,401 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+*Cross-match a healpix skymap against a local galaxy catalogue and rank the potential host galaxies*
+
+:Author:
+    David Young
+
+:Date Created:
+    October 18, 2026
+"""
+from gocart.commonutils import multiorder_index
+from fundamentals import tools
+from builtins import object
+import threading
+import sys
+import os
+os.environ['TERM'] = 'vt100'
+
+# THE DEFAULT CATALOGUE COLUMN NAMES (id, distance AND weight ARE OPTIONAL)
+defaultColumns = {
+    "id": False,
+    "ra": "RA",
+    "dec": "DEC",
+    "distance": False,
+    "weight": False
+}
+
+# PROCESS-WIDE CACHE OF INDEXED CATALOGUES, KEYED BY (PATH, MODIFICATION TIME, SIZE, COLUMNS) - THE LISTENING DAEMON INDEXES A CATALOGUE ONCE
+_catalogueLock = threading.Lock()
+_catalogueCache = {}
+
+
+class galaxies(object):
+    """
+    *Rank the galaxies of a local catalogue by their probability of hosting the event in a healpix skymap*
+
+    Only the galaxies within the requested credible region are touched: the catalogue is pre-sorted by level-29 healpix index, so the galaxies within each multiorder pixel are a contiguous slice found with a `searchsorted`. Galaxies are scored by the 3D posterior density at their distance (or the 2D probability density if either the map or the catalogue lacks distances), multiplied by the optional catalogue weight column (e.g. stellar mass or B-band luminosity).
+
+    **Key Arguments:**
+        - ``log`` -- logger
+        - ``mapPath`` -- path to the healpix map, an astropy skymap table or a `multiorder_skymap` object
+        - ``settings`` -- the settings dictionary (the catalogue is configured in the `lvk: galaxies:` section)
+        - ``catalogue`` -- a `galaxy_catalogue` object to use in place of the catalogue given in the settings. Default *False*
+
+    **Usage:**
+
+    ```python
+    from gocart.convert import galaxies
+    c = galaxies(
+        log=log,
+        mapPath="/path/to/bayestar.multiorder.fits",
+        settings=settings
+    )
+    rankedGalaxies = c.convert(outputFilepath="/path/to/galaxies.csv")
+    ```
+    """
+
+    def __init__(
+            self,
+            log,
+            mapPath,
+            settings=False,
+            catalogue=False
+    ):
+        self.log = log
+        log.debug("instansiating a new 'galaxies' object")
+        self.settings = settings
+        self.mapPath = mapPath
+
+        galaxySettings = {}
+        if settings and "lvk" in settings:
+            galaxySettings = settings["lvk"].get("galaxies") or {}
+        self.credibleLevel = float(galaxySettings.get("credible_level", 0.9))
+        self.maxGalaxies = int(galaxySettings.get("max_galaxies", 1000))
+
+        if catalogue:
+            self.catalogue = catalogue
+        else:
+            self.catalogue = load_galaxy_catalogue(log=log, settings=settings)
+
+        return None
+
+    def convert(
+            self,
+            outputFilepath=False):
+        """
+        *rank the catalogue galaxies within the credible region of the skymap*
+
+        **Key Arguments:**
+            - ``outputFilepath`` -- path to write the ranked galaxies to as CSV. Default *False* (do not write)
+
+        **Return:**
+            - ``rankedGalaxies`` -- pandas dataframe of the top-ranked galaxies, with columns:
+                - `RANK` -- 1 for the most probable host
+                - `ID` -- the catalogue id (or the catalogue row number if no id column is given)
+                - `RA`, `DEC`, `DIST`, `WEIGHT` -- from the catalogue (`DIST` and `WEIGHT` only if given)
+                - `PROBDENSITY_DEG2` -- 2D probability per square degree at the galaxy position
+                - `CREDIBLE_LEVEL` -- the smallest credible region containing the galaxy
+                - `PROBDENSITY_VOL` -- the 3D posterior density per Mpc^3 at the galaxy (if the map and catalogue have distances)
+                - `HOST_PROB` -- the galaxy score normalised over all scored galaxies in the credible region
+        """
+        self.log.debug('starting the ``convert`` method')
+
+        import numpy as np
+        import pandas as pd
+
+        index = multiorder_index(log=self.log, skymap=self.mapPath)
+        skymap = index.skymap
+
+        # THE PIXELS NEEDED TO ENCLOSE THE CREDIBLE REGION (INCLUDING THE PIXEL THAT STRADDLES ITS EDGE)
+        rows = np.flatnonzero(index.credibleLevel - skymap['PROB'] < self.credibleLevel)
+        shift = 2 * (29 - skymap['LEVEL'][rows])
+        galaxyRows, owner = self.catalogue.select(
+            start=skymap['IPIX'][rows] << shift,
+            end=(skymap['IPIX'][rows] + 1) << shift)
+        pixelRows = rows[owner]
+
+        use3D = index.hasDistance and self.catalogue.hasDistance
+        distance = self.catalogue["DIST"][galaxyRows] if use3D else None
+        values = index.pixel_values(rows=pixelRows, distance=distance)
+
+        score = values["PROBDENSITY_VOL"] if use3D else values["PROBDENSITY"].copy()
+        if self.catalogue.hasWeight:
+            score = score * np.nan_to_num(self.catalogue["WEIGHT"][galaxyRows], nan=0.)
+        total = score.sum()
+        if total > 0:
+            score /= total
+
+        # ONLY THE TOP N GALAXIES WITH A NON-ZERO SCORE ARE KEPT (PARTITION FIRST SO ONLY N GALAXIES ARE SORTED)
+        top = np.flatnonzero(score > 0)
+        if len(top) > self.maxGalaxies:
+            top = top[np.argpartition(-score[top], self.maxGalaxies - 1)[:self.maxGalaxies]]
+        top = top[np.argsort(-score[top], kind='stable')]
+
+        topRows = galaxyRows[top]
+        rankedGalaxies = {
+            "RANK": np.arange(1, len(top) + 1),
+            "ID": self.catalogue["ID"][topRows] if self.catalogue.hasId else self.catalogue["ROW"][topRows],
+            "RA": self.catalogue["RA"][topRows],
+            "DEC": self.catalogue["DEC"][topRows]
+        }
+        if self.catalogue.hasDistance:
+            rankedGalaxies["DIST"] = self.catalogue["DIST"][topRows]
+        if self.catalogue.hasWeight:
+            rankedGalaxies["WEIGHT"] = self.catalogue["WEIGHT"][topRows]
+        rankedGalaxies["PROBDENSITY_DEG2"] = values["PROBDENSITY_DEG2"][top]
+        rankedGalaxies["CREDIBLE_LEVEL"] = values["CREDIBLE_LEVEL"][top]
+        if use3D:
+            rankedGalaxies["PROBDENSITY_VOL"] = values["PROBDENSITY_VOL"][top]
+        rankedGalaxies["HOST_PROB"] = score[top]
+        rankedGalaxies = pd.DataFrame(rankedGalaxies)
+
+        self.log.info(f"{len(galaxyRows)} catalogue galaxies lie within the {self.credibleLevel * 100:g}% credible region, writing the top {len(rankedGalaxies)}")
+
+        if outputFilepath:
+            eventId = skymap.meta.get("OBJECT", "")
+            with open(outputFilepath, 'w') as stream:
+                stream.write(f"# EVENT:{eventId}\n")
+                stream.write(f"# CATALOGUE:{os.path.basename(self.catalogue.path)}\n")
+                stream.write(f"# CREDIBLE_LEVEL:{self.credibleLevel:g}\n")
+                rankedGalaxies.to_csv(stream, index=False)
+
+        self.log.debug('completed the ``convert`` method')
+        return rankedGalaxies
+
+    # use the tab-trigger below for new method
+    # xt-class-method
+
+
+class galaxy_catalogue(object):
+    """
+    *A local galaxy catalogue (CSV, FITS or Parquet), spatially indexed by level-29 healpix pixel and memory-mapped from a cache*
+
+    The first time a catalogue is used it is read, sorted by level-29 nested healpix index and its columns written as `.npy` files to the cache directory. From then on (and in other processes) the columns are memory-mapped, so only the rows of the galaxies in a skymap's credible region are ever paged in. The cache is rebuilt if the catalogue file or the column names change.
+
+    **Key Arguments:**
+        - ``log`` -- logger
+        - ``path`` -- path to the catalogue (`.csv`, `.fits` or `.parquet`; parquet needs `pyarrow`)
+        - ``columns`` -- dictionary of the catalogue column names to use for `id`, `ra`, `dec`, `distance` (Mpc) and `weight`. Default *{"ra": "RA", "dec": "DEC"}*
+        - ``cacheDir`` -- directory to cache the indexed catalogue in. Default *~/.config/gocart/cache*
+
+    **Usage:**
+
+    ```python
+    from gocart.convert.galaxies import galaxy_catalogue
+    catalogue = galaxy_catalogue(
+        log=log,
+        path="/path/to/glade+.fits",
+        columns={"id": "GN", "ra": "RA", "dec": "Dec", "distance": "d_L"}
+    )
+    ```
+    """
+
+    def __init__(
+            self,
+            log,
+            path,
+            columns=False,
+            cacheDir=False
+    ):
+        self.log = log
+        log.debug("instansiating a new 'galaxy_catalogue' object")
+
+        import hashlib
+        import numpy as np
+
+        self.path = os.path.abspath(os.path.expanduser(path))
+        self.columns = dict(defaultColumns)
+        if columns:
+            self.columns.update(columns)
+        self.hasId = bool(self.columns["id"])
+        self.hasDistance = bool(self.columns["distance"])
+        self.hasWeight = bool(self.columns["weight"])
+
+        if not cacheDir:
+            from os.path import expanduser
+            home = expanduser("~")
+            cacheDir = home + "/.config/gocart/cache"
+        stat = os.stat(self.path)
+        catalogueId = hashlib.md5(f"{self.path}:{stat.st_mtime_ns}:{stat.st_size}:{sorted(self.columns.items())}".encode()).hexdigest()[:10]
+        self.cacheDir = f"{cacheDir}/galaxies/{os.path.basename(self.path).split('.')[0]}_{catalogueId}"
+
+        fields = ["INDEX29", "ROW", "RA", "DEC"]
+        if self.hasId:
+            fields.append("ID")
+        if self.hasDistance:
+            fields.append("DIST")
+        if self.hasWeight:
+            fields.append("WEIGHT")
+        paths = {f: f"{self.cacheDir}/{f}.npy" for f in fields}
+        if not all(os.path.exists(p) for p in paths.values()):
+            self._build(paths=paths)
+        self.arrays = {f: np.load(p, mmap_mode='r') for f, p in paths.items()}
+        self.index29 = self.arrays["INDEX29"]
+
+        return None
+
+    def __getitem__(self, key):
+        return self.arrays[key]
+
+    def __len__(self):
+        return len(self.index29)
+
+    def select(
+            self,
+            start,
+            end):
+        """*return the galaxies falling within the given ranges of level-29 nested healpix indices*
+
+        **Key Arguments:**
+            - ``start`` -- numpy array of the first level-29 index of each range
+            - ``end`` -- numpy array of the (exclusive) last level-29 index of each range
+
+        **Return:**
+            - ``rows`` -- numpy array of the galaxy rows (into the cached catalogue columns) within the ranges
+            - ``owner`` -- numpy array giving the range each galaxy falls within
+        """
+        self.log.debug('starting the ``select`` method')
+
+        import numpy as np
+
+        lo = np.searchsorted(self.index29, start, side='left')
+        hi = np.searchsorted(self.index29, end, side='left')
+        counts = hi - lo
+        owner = np.repeat(np.arange(len(counts)), counts)
+        rows = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts - lo, counts)
+
+        self.log.debug('completed the ``select`` method')
+        return rows, owner
+
+    def _read(
+            self):
+        """*read the requested columns of the catalogue file into a dictionary of numpy arrays*"""
+        self.log.debug('starting the ``_read`` method')
+
+        import numpy as np
+        import pandas as pd
+
+        wanted = {"RA": "ra", "DEC": "dec", "ID": "id", "DIST": "distance", "WEIGHT": "weight"}
+        wanted = {k: self.columns[v] for k, v in wanted.items() if self.columns[v]}
+
+        lowerPath = self.path.lower()
+        try:
+            if lowerPath.endswith((".fits", ".fit", ".fits.gz", ".fit.gz")):
+                from astropy.table import Table
+                table = Table.read(self.path)
+                data = {}
+                for k, c in wanted.items():
+                    col = table[c]
+                    if hasattr(col, "filled"):
+                        col = col.filled(np.nan if col.dtype.kind == "f" else col.fill_value)
+                    data[k] = np.asarray(col)
+            elif lowerPath.endswith((".parquet", ".pq")):
+                table = pd.read_parquet(self.path, columns=list(set(wanted.values())))
+                data = {k: table[c].values for k, c in wanted.items()}
+            else:
+                table = pd.read_csv(self.path, usecols=list(set(wanted.values())))
+                data = {k: table[c].values for k, c in wanted.items()}
+        except KeyError as e:
+            message = f"the galaxy catalogue {self.path} has no column {e}"
+            self.log.error(message)
+            raise KeyError(message)
+
+        for k in ["RA", "DEC", "DIST", "WEIGHT"]:
+            if k in data:
+                data[k] = np.asarray(data[k], dtype=np.float64)
+        if "ID" in data:
+            # FIXED-WIDTH STRINGS OR NUMBERS, SO THE COLUMN CAN BE MEMORY-MAPPED
+            data["ID"] = np.asarray(data["ID"])
+            if data["ID"].dtype.kind not in "iuf":
+                data["ID"] = data["ID"].astype(str)
+
+        self.log.debug('completed the ``_read`` method')
+        return data
+
+    def _build(
+            self,
+            paths):
+        """*read the catalogue, sort it by level-29 healpix index and write the cached columns*"""
+        self.log.debug('starting the ``_build`` method')
+
+        import astropy_healpix as ah
+        import astropy.units as u
+        import numpy as np
+
+        self.log.info(f"indexing the galaxy catalogue {self.path}")
+        data = self._read()
+        data["ROW"] = np.arange(len(data["RA"]))
+
+        # GALAXIES WITHOUT A SKY POSITION CAN NEVER BE MATCHED
+        keep = np.isfinite(data["RA"]) & np.isfinite(data["DEC"])
+        if not keep.all():
+            self.log.warning(f"{(~keep).sum()} galaxies in {self.path} have no sky position and are ignored")
+            data = {k: v[keep] for k, v in data.items()}
+
+        index29 = ah.lonlat_to_healpix(data["RA"] * u.deg, data["DEC"] * u.deg, ah.level_to_nside(29), order='nested')
+        order = np.argsort(index29, kind='stable')
+        data["INDEX29"] = index29[order]
+
+        # WRITE TO A TEMPORARY FILE AND MOVE INTO PLACE SO OTHER PROCESSES NEVER READ A PARTIAL FILE
+        if not os.path.exists(self.cacheDir):
+            os.makedirs(self.cacheDir, exist_ok=True)
+        for f, p in paths.items():
+            tmpPath = f"{p}.{os.getpid()}.tmp"
+            with open(tmpPath, 'wb') as stream:
+                np.save(stream, data[f] if f == "INDEX29" else data[f][order])
+            os.replace(tmpPath, p)
+
+        self.log.debug('completed the ``_build`` method')
+        return None
+
+    # use the tab-trigger below for new method
+    # xt-class-method
+
+
+def load_galaxy_catalogue(
+        log,
+        settings,
+        cacheDir=False):
+    """*return the indexed galaxy catalogue configured in the `lvk: galaxies:` section of the settings file*
+
+    The catalogue is indexed once per process (and memory-mapped from the on-disk cache by any other process), so a listening daemon only pays the cost on the first alert - or at startup if called from there.
+
+    **Key Arguments:**
+        - ``log`` -- logger
+        - ``settings`` -- the settings dictionary
+        - ``cacheDir`` -- directory to cache the indexed catalogue in. Default *~/.config/gocart/cache*
+
+    **Return:**
+        - ``catalogue`` -- the `galaxy_catalogue` object
+
+    ```python
+    from gocart.convert.galaxies import load_galaxy_catalogue
+    catalogue = load_galaxy_catalogue(log=log, settings=settings)
+    ```
+    """
+    log.debug('starting the ``load_galaxy_catalogue`` function')
+
+    galaxySettings = settings["lvk"].get("galaxies") or {}
+    path = galaxySettings.get("catalogue")
+    if not path:
+        message = "no galaxy catalogue is given in the `lvk: galaxies: catalogue:` setting"
+        log.error(message)
+        raise ValueError(message)
+    path = os.path.abspath(os.path.expanduser(path))
+    columns = galaxySettings.get("columns") or {}
+
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size, tuple(sorted(columns.items())), cacheDir)
+    with _catalogueLock:
+        catalogue = _catalogueCache.get(key)
+        if catalogue is None:
+            catalogue = galaxy_catalogue(log=log, path=path, columns=columns, cacheDir=cacheDir)
+            # ONLY THE LATEST VERSION OF EACH CATALOGUE IS KEPT
+            for k in [k for k in _catalogueCache if k[0] == path]:
+                del _catalogueCache[k]
+            _catalogueCache[key] = catalogue
+
+    log.debug('completed the ``load_galaxy_catalogue`` function')
+    return catalogue
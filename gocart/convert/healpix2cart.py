@@ -11,10 +11,17 @@
 """
 from fundamentals import tools
 from builtins import object
+import threading
 import sys
 import os
 os.environ['TERM'] = 'vt100'
 
+# PROCESS-WIDE CACHE OF THE CARTESIAN GRIDS (AND THEIR LEVEL-29 HEALPIX LOOKUPS), KEYED BY GRID DEFINITION
+_gridLock = threading.Lock()
+_gridCache = {}
+# BUMP WHEN THE LAYOUT OR CONTENT OF THE ON-DISK GRID CACHE FILES CHANGES, SO OLD FILES ARE NEVER REUSED
+_gridFormatVersion = 1
+
 
 class healpix2cart(object):
     """
@@ -23,7 +30,10 @@ class healpix2cart(object):
     **Key Arguments:**
         - ``log`` -- logger
         - ``settings`` -- the settings dictionary
-        - ``mapPath`` -- path the the healpix map
+        - ``mapPath`` -- path the the healpix map (or an astropy table or `multiorder_skymap` object of the map)
+        - ``pixelSizeDeg`` -- the size of the cartesian pixels in degrees. Default *1.*
+        - ``region`` -- optionally restrict the grid to a region of sky given as (raMin, raMax, decMin, decMax) in degrees. Default *False* (all-sky)
+        - ``resample`` -- how the healpix map is resampled onto the grid. `nearest` samples the map at each cartesian pixel centre; `area` integrates the probability over each cartesian pixel. Default *nearest*
 
     **Usage:**
 
@@ -41,6 +51,20 @@ class healpix2cart(object):
     wcs, mapDF, header = converter.convert()
     ```
 
+    To resample a well-localised map onto a fine grid around the event, integrating the probability within each 0.1 degree pixel:
+
+    ```python
+    converter = healpix2cart(
+        log=log,
+        mapPath=pathToOutputDir + "/bayestar.multiorder.fits",
+        pixelSizeDeg=0.1,
+        region=(180., 220., -40., -10.),
+        resample="area"
+    )
+    wcs, mapDF, header = converter.convert()
+    ```
+
+    In `area` mode, the probability of the multiorder pixels smaller than a cartesian pixel is summed into the cartesian pixel containing their centre, while cartesian pixels lying within a multiorder pixel larger than themselves take that pixel's probability density multiplied by their area. Only cartesian pixels on the boundary between map resolutions are approximated.
     """
 
     def __init__(
@@ -48,12 +72,21 @@ class healpix2cart(object):
             log,
             mapPath,
             settings=False,
+            pixelSizeDeg=1.,
+            region=False,
+            resample="nearest"
 
     ):
         self.log = log
         log.debug("instansiating a new 'healpix2cart' object")
         self.settings = settings
         self.mapPath = mapPath
+        self.pixelSizeDeg = pixelSizeDeg
+        self.region = region
+        self.resample = resample
+
+        if resample not in ["nearest", "area"]:
+            raise ValueError(f"Unknown resample mode '{resample}', choose from ['nearest', 'area']")
         # xt-self-arg-tmpx
 
         return None
@@ -81,64 +114,142 @@ class healpix2cart(object):
         """
         self.log.debug('starting the ``get`` method')
 
-        import matplotlib.pyplot as plt
-        from astropy.table import Table
+        from gocart.commonutils import read_skymap
         import astropy.units as u
         import pandas as pd
         import numpy as np
-        import astropy_healpix as ah
-        from astropy import wcs as awcs
-        import healpy as hp
-
-        wcs, mapDF = create_wcs_and_pixels(self.log)
-
-        # CONVERT HEALPIX MAP TO DATAFRAME
-        skymap = Table.read(self.mapPath)
-        tableData = skymap.to_pandas()
-
-        # FIND LEVEL AND NSIDE PIXEL INDEX FOR EACH MULTI-RES PIXEL
-        tableData['LEVEL'], tableData['IPIX'] = ah.uniq_to_level_ipix(tableData['UNIQ'])
-        tableData['NSIDE'] = ah.level_to_nside(tableData['LEVEL'])
-        # DETERMINE THE PIXEL AREA AND PROB OF EACH PIXEL
-        tableData['AREA'] = ah.nside_to_pixel_area(tableData['NSIDE']).to_value(u.steradian)
-        tableData['PROB'] = tableData['AREA'] * tableData["PROBDENSITY"]
 
-        # DETERMINE THE INDEX OF MULTI-RES PIX AT HIGHEST HEALPIX RESOLUTION
-        max_level = 29
-        max_nside = ah.level_to_nside(max_level)
-        tableData['INDEX29'] = tableData['IPIX'] * (2**(max_level - tableData['LEVEL']))**2
+        # THE GRID AND THE LEVEL-29 HEALPIX PIXEL OF EACH GRID CENTRE ARE THE SAME FOR EVERY MAP
+        wcs, gridDF, match_ipix = _cartesian_grid(self.log, pixelSizeDeg=self.pixelSizeDeg, region=self.region)
 
-        # DETERMINE THE HIGH-RES PIXEL LOCATION FOR EACH RA AND DEC
-        match_ipix = ah.lonlat_to_healpix(mapDF["ra"].values * u.deg, mapDF["dec"].values * u.deg, max_nside, order='nested')
+        # LEVEL, IPIX, NSIDE, AREA AND PROB ALREADY COMPUTED
+        skymap = read_skymap(log=self.log, skymap=self.mapPath)
 
-        # RETURNS THE INDICES THAT WOULD SORT THIS ARRAY
-        sorter = np.argsort(tableData['INDEX29'])
+        # THE SORTED INDEX OF EACH MULTI-RES PIX AT HIGHEST HEALPIX RESOLUTION (CACHED ON THE SKYMAP)
+        index29, sorter = skymap.sorted_index29()
         # FIND INDICES WHERE ELEMENTS SHOULD BE INSERTED TO MAINTAIN ORDER -- CLOSET MATCH TO THE RIGHT
-        matchedIndices = sorter[np.searchsorted(tableData['INDEX29'].values, match_ipix, side='right', sorter=sorter) - 1]
+        matchedIndices = sorter[np.searchsorted(index29, match_ipix, side='right') - 1]
 
         # MERGE TABLES
-        mapDF = pd.concat([mapDF, tableData.iloc[matchedIndices].set_index(mapDF.index)], axis=1)
+        myDict = {c.upper(): gridDF[c].values for c in gridDF.columns}
+        for c in skymap.columns:
+            if c not in ['AREA', 'UNIQ', 'LEVEL', 'IPIX', 'NSIDE', 'PROB']:
+                myDict[c.upper()] = skymap[c][matchedIndices]
+        mapDF = pd.DataFrame(myDict)
 
-        # CLEAN UP COLUMNS
-        mapDF.columns = [d.upper() for d in mapDF.columns]
-        mapDF.drop(columns=['AREA', 'UNIQ', 'LEVEL', 'IPIX', 'NSIDE', 'PROB', 'INDEX29'], inplace=True)
         # ADD PIXEL PROB
-        mapDF["PROBDENSITY_DEG2"] = mapDF["PROBDENSITY"] / (1 * u.steradian).to_value(u.degree * u.degree)
-        mapDF["PROB"] = mapDF["PROBDENSITY_DEG2"] * mapDF["PIXEL_AREA_DEG2"]
+        deg2PerSteradian = (1 * u.steradian).to_value(u.degree * u.degree)
+        if self.resample == "area":
+            mapDF["PROB"] = self._integrate_probability(skymap=skymap, wcs=wcs, gridDF=gridDF, matchedIndices=matchedIndices)
+            mapDF["PROBDENSITY"] = mapDF["PROB"] / mapDF["PIXEL_AREA_DEG2"] * deg2PerSteradian
+            mapDF["PROBDENSITY_DEG2"] = mapDF["PROBDENSITY"] / deg2PerSteradian
+            mapDF["PROB"] = mapDF.pop("PROB")
+        else:
+            mapDF["PROBDENSITY_DEG2"] = mapDF["PROBDENSITY"] / deg2PerSteradian
+            mapDF["PROB"] = mapDF["PROBDENSITY_DEG2"] * mapDF["PIXEL_AREA_DEG2"]
 
         # SANITY CHECK
         totalProb = mapDF["PROB"].sum()
         # print(totalProb)
 
         self.log.debug('completed the ``get`` method')
-        return wcs, mapDF, skymap.meta
+        return wcs.deepcopy(), mapDF, skymap.meta
+
+    def _integrate_probability(
+            self,
+            skymap,
+            wcs,
+            gridDF,
+            matchedIndices,
+            subsamples=4):
+        """*integrate the map probability over each cartesian pixel*
+
+        Multiorder pixels are split into two groups by their size relative to the cartesian pixel they fall in:
+
+        - pixels at least 16 times smaller (two healpix levels finer) than the cartesian pixel are summed into the cartesian pixel containing their centre
+        - the rest of each cartesian pixel takes the probability density of the larger pixels covering it, sampled at its centre (if the centre pixel is 4 or more times larger than the cartesian pixel) or on a `subsamples` x `subsamples` grid within the cartesian pixel
+
+        **Key Arguments:**
+            - ``skymap`` -- the `multiorder_skymap`
+            - ``wcs`` -- the grid wcs
+            - ``gridDF`` -- the grid pixel dataframe
+            - ``matchedIndices`` -- the row of the multiorder pixel containing each grid pixel centre
+            - ``subsamples`` -- number of sub-samples along each axis of the cartesian pixels needing them. Default *4*
 
+        **Return:**
+            - ``prob`` -- numpy array of the probability within each grid pixel
+        """
+        self.log.debug('starting the ``_integrate_probability`` method')
+
+        import astropy.units as u
+        import astropy_healpix as ah
+        import numpy as np
 
-def create_wcs_and_pixels(log):
-    """*create the all-sky rectilinear wcs*
+        cellArea = gridDF["pixel_area_deg2"].values / (1 * u.steradian).to_value(u.degree * u.degree)
+        xRange = int(gridDF["pixel_x"].values[-1]) + 1
+        yRange = int(gridDF["pixel_y"].values[-1]) + 1
+        area = skymap['AREA']
+
+        # FIND THE GRID PIXEL CONTAINING THE CENTRE OF EACH SMALL MULTIORDER PIXEL (ONE HEALPIX LEVEL AT A TIME)
+        rows = np.flatnonzero(area * 16 <= cellArea.max())
+        ra = np.empty(len(rows))
+        dec = np.empty(len(rows))
+        for l in np.unique(skymap['LEVEL'][rows]):
+            these = np.flatnonzero(skymap['LEVEL'][rows] == l)
+            lon, lat = ah.healpix_to_lonlat(skymap['IPIX'][rows[these]], ah.level_to_nside(l), order='nested')
+            ra[these] = lon.deg
+            dec[these] = lat.deg
+        x, y = wcs.wcs_world2pix(ra, dec, 0)
+        x = np.floor(x + 0.5).astype(np.int64)
+        y = np.floor(y + 0.5).astype(np.int64)
+        if not self.region:
+            # WRAP RA = 360 BACK ONTO THE FIRST COLUMN
+            x = x % xRange
+        inGrid = (x >= 0) & (x < xRange) & (y >= 0) & (y < yRange)
+        cell = y[inGrid] * xRange + x[inGrid]
+        rows = rows[inGrid]
+        tiny = area[rows] * 16 <= cellArea[cell]
+        cell = cell[tiny]
+        rows = rows[tiny]
+
+        # SUM THE SMALL PIXELS INTO THEIR GRID PIXELS (bincount RETURNS INTEGERS IF THERE ARE NONE, HENCE THE CAST)
+        tinyProb = np.bincount(cell, weights=skymap['PROB'][rows], minlength=len(gridDF)).astype(np.float64, copy=False)
+        tinyArea = np.bincount(cell, weights=area[rows], minlength=len(gridDF)).astype(np.float64, copy=False)
+
+        # GRID PIXELS CENTRED IN A MUCH LARGER PIXEL: THE AREA NOT COVERED BY SMALL PIXELS TAKES THAT PIXEL'S DENSITY
+        prob = tinyProb + np.clip(cellArea - tinyArea, 0, None) * skymap['PROBDENSITY'][matchedIndices]
+
+        # ALL OTHER GRID PIXELS (UNLESS ENTIRELY COVERED BY SMALL PIXELS) ARE SUB-SAMPLED
+        sub = np.flatnonzero((area[matchedIndices] < 4 * cellArea) & (cellArea > tinyArea))
+        if len(sub):
+            offsets = (np.arange(subsamples) + 0.5) / subsamples - 0.5
+            offsetX, offsetY = np.meshgrid(offsets, offsets)
+            subX = (gridDF["pixel_x"].values[sub][:, None] + offsetX.ravel()[None, :]).ravel()
+            subY = (gridDF["pixel_y"].values[sub][:, None] + offsetY.ravel()[None, :]).ravel()
+            subRa, subDec = wcs.wcs_pix2world(subX, subY, 0)
+            subIpix = ah.lonlat_to_healpix(subRa * u.deg, subDec * u.deg, ah.level_to_nside(29), order='nested')
+            index29, sorter = skymap.sorted_index29()
+            subMatched = sorter[np.searchsorted(index29, subIpix, side='right') - 1]
+            # SAMPLES LANDING IN SMALL PIXELS ARE ALREADY COUNTED
+            density = np.where(area[subMatched] * 16 > np.repeat(cellArea[sub], subsamples**2), skymap['PROBDENSITY'][subMatched], 0.)
+            prob[sub] = tinyProb[sub] + cellArea[sub] / subsamples**2 * density.reshape(len(sub), subsamples**2).sum(axis=1)
+
+        self.log.debug('completed the ``_integrate_probability`` method')
+        return prob
+
+
+def create_wcs_and_pixels(
+        log,
+        pixelSizeDeg=1.,
+        region=False):
+    """*create the all-sky (or regional) rectilinear wcs*
+
+    The grid is only computed once per process (and cached to `~/.config/gocart/cache`); a copy is returned.
 
     **Key Arguments:**
         - ``log`` -- logger
+        - ``pixelSizeDeg`` -- the pixel size in degrees. Default *1.*
+        - ``region`` -- optionally restrict the grid to (raMin, raMax, decMin, decMax) in degrees. Default *False* (all-sky)
 
     **Return:**
         - ``wcs`` -- the cartesian wcs.
@@ -153,20 +264,27 @@ def create_wcs_and_pixels(log):
     """
     log.debug('starting the ``create_wcs_and_pixels`` method')
 
+    wcs, mapDF, match_ipix = _cartesian_grid(log, pixelSizeDeg=pixelSizeDeg, region=region)
+
+    log.debug('completed the ``create_wcs_and_pixels`` method')
+    return wcs.deepcopy(), mapDF.copy()
+
+
+def _grid_wcs(
+        pixelSizeDeg=1.,
+        region=False,
+        raRange=360,
+        decRange=180):
+    """*return the cartesian wcs and the x, y pixel ranges for a grid definition*"""
     from astropy.wcs import WCS
-    import pandas as pd
     import numpy as np
-    import astropy.units as u
 
     # CREATE A NEW WCS OBJECT.
     wcs = WCS(naxis=2)
 
     # DETERMINE THE PIXEL GRID X,Y RANGES
-    pixelSizeDeg = 1.
-    raRange = 360
-    decRange = 180
-    xRange = int(raRange / pixelSizeDeg)
-    yRange = int(decRange / pixelSizeDeg)
+    xRange = int(round(raRange / pixelSizeDeg))
+    yRange = int(round(decRange / pixelSizeDeg))
 
     # SET THE PIXEL SIZE
     wcs.wcs.cdelt = np.array([pixelSizeDeg, pixelSizeDeg])
@@ -182,6 +300,109 @@ def create_wcs_and_pixels(log):
     # SET COORDINATE TYPE TO CARTESIAN
     wcs.wcs.ctype = ["RA---CAR", "DEC--CAR"]
 
+    # A REGION IS A SUB-GRID OF THE ALL-SKY GRID (SO PIXELS ARE ALIGNED) WITH ITS BOTTOM LEFT PIXEL AT 0,0
+    if region:
+        raMin, raMax, decMin, decMax = region
+        if raMin >= raMax or decMin >= decMax:
+            raise ValueError(f"The region must be given as (raMin, raMax, decMin, decMax), not {region}")
+        if raMin < 0 or raMax > raRange or decMin < -90 or decMax > 90:
+            raise ValueError(f"The region {region} must lie within 0 <= RA <= 360 and -90 <= Dec <= 90 (regions wrapping through RA = 0 are not supported)")
+        (xMin, xMax), (yMin, yMax) = wcs.wcs_world2pix([raMin, raMax], [decMin, decMax], 0)
+        x0, x1 = max(int(np.ceil(xMin)), 0), min(int(np.floor(xMax)), xRange - 1)
+        y0, y1 = max(int(np.ceil(yMin)), 0), min(int(np.floor(yMax)), yRange - 1)
+        if x1 < x0 or y1 < y0:
+            raise ValueError(f"The region {region} contains no {pixelSizeDeg} degree pixel centres")
+        wcs.wcs.crpix = [wcs.wcs.crpix[0] - x0, wcs.wcs.crpix[1] - y0]
+        xRange = x1 - x0 + 1
+        yRange = y1 - y0 + 1
+
+    return wcs, xRange, yRange
+
+
+def _cartesian_grid(
+        log,
+        pixelSizeDeg=1.,
+        region=False,
+        cacheDir=False):
+    """*return the cartesian wcs, the grid pixel dataframe and the level-29 nested healpix index of every grid pixel centre*
+
+    Memoised per process and cached on disk, as these are identical for every map. Callers must not modify the returned objects. The cache file is named by a hash of the exact grid definition and the cache format version, and is rebuilt if it can't be read or doesn't match the grid.
+    """
+    log.debug('starting the ``_cartesian_grid`` function')
+
+    import pandas as pd
+    import numpy as np
+    import hashlib
+
+    # THE EXACT GRID DEFINITION (FLOAT REPRS ROUND-TRIP, SO DEFINITIONS DIFFERING IN ANY DIGIT GET DIFFERENT KEYS)
+    key = (float(pixelSizeDeg), tuple(float(r) for r in region) if region else None)
+
+    with _gridLock:
+        if key in _gridCache:
+            log.debug('completed the ``_cartesian_grid`` function')
+            return _gridCache[key]
+
+        wcs, xRange, yRange = _grid_wcs(pixelSizeDeg=pixelSizeDeg, region=region)
+
+        if not cacheDir:
+            from os.path import expanduser
+            home = expanduser("~")
+            cacheDir = home + "/.config/gocart/cache"
+        gridId = hashlib.md5(repr((_gridFormatVersion,) + key).encode()).hexdigest()[:10]
+        cachePath = f"{cacheDir}/cartesian/grid_car_{pixelSizeDeg:g}deg_{gridId}.npy"
+
+        # ONLY THE WCS TRANSFORMED COORDINATES AND THE HEALPIX LOOKUP ARE WORTH CACHING TO DISK
+        ra = None
+        if os.path.exists(cachePath):
+            try:
+                with open(cachePath, 'rb') as f:
+                    ra = np.load(f)
+                    dec = np.load(f)
+                    match_ipix = np.load(f)
+            except Exception as e:
+                log.warning(f'could not read the cartesian grid cache {cachePath} ({e}), rebuilding it')
+                ra = None
+            if ra is not None and not (len(ra) == len(dec) == len(match_ipix) == xRange * yRange):
+                log.warning(f'the cartesian grid cache {cachePath} does not match the {xRange} x {yRange} grid, rebuilding it')
+                ra = None
+        if ra is None:
+            ra, dec, match_ipix = _compute_grid(wcs=wcs, xRange=xRange, yRange=yRange)
+            # WRITE TO A TEMPORARY FILE AND MOVE INTO PLACE SO OTHER PROCESSES NEVER READ A PARTIAL FILE
+            os.makedirs(os.path.dirname(cachePath), exist_ok=True)
+            tmpPath = f"{cachePath}.{os.getpid()}.tmp"
+            with open(tmpPath, 'wb') as f:
+                np.save(f, ra)
+                np.save(f, dec)
+                np.save(f, match_ipix)
+            os.replace(tmpPath, cachePath)
+
+        X, Y = np.meshgrid(np.arange(0, xRange, 1), np.arange(0, yRange, 1))
+        area = np.sin(np.deg2rad(np.abs(dec + 90))) * pixelSizeDeg ** 2
+        myDict = {
+            "pixel_x": X.ravel(),
+            "pixel_y": Y.ravel(),
+            "ra": ra,
+            "dec": dec,
+            "pixel_area_deg2": area
+        }
+
+        # CREATE DATA FRAME FROM A DICTIONARY OF LISTS
+        mapDF = pd.DataFrame(myDict)
+        _gridCache[key] = (wcs, mapDF, match_ipix)
+
+    log.debug('completed the ``_cartesian_grid`` function')
+    return _gridCache[key]
+
+
+def _compute_grid(
+        wcs,
+        xRange,
+        yRange):
+    """*compute the sky-coordinates and the level-29 healpix index of each grid pixel centre*"""
+    import numpy as np
+    import astropy.units as u
+    import astropy_healpix as ah
+
     # CREATE THE DATA GRID
     x = np.arange(0, xRange, 1)
     y = np.arange(0, yRange, 1)
@@ -189,20 +410,11 @@ def create_wcs_and_pixels(log):
 
     # FITS FORMAT -- BOTTOM LEFT PIXEL CENTRE IS 1,1, BUT WE ARE WORKING WITH PYTHON SO USE 0,0
     ra, dec = wcs.wcs_pix2world(X, Y, 0)
-    area = np.sin(np.deg2rad(np.abs(dec + 90))) * pixelSizeDeg ** 2
-
-    # CREATE DATA FRAME FROM A DICTIONARY OF LISTS
-    myDict = {
-        "pixel_x": X.ravel(),
-        "pixel_y": Y.ravel(),
-        "ra": ra.ravel(),
-        "dec": dec.ravel(),
-        "pixel_area_deg2": area.ravel()
-    }
-    mapDF = pd.DataFrame(myDict)
+    ra = ra.ravel()
+    dec = dec.ravel()
 
-    log.debug('completed the ``create_wcs_and_pixels`` method')
-    return wcs, mapDF
+    # DETERMINE THE HIGH-RES PIXEL LOCATION FOR EACH RA AND DEC
+    max_nside = ah.level_to_nside(29)
+    match_ipix = ah.lonlat_to_healpix(ra * u.deg, dec * u.deg, max_nside, order='nested')
 
-    # use the tab-trigger below for new method
-    # xt-class-method
+    return ra, dec, match_ipix
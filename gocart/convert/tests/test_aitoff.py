@@ -55,6 +55,86 @@ class test_aitoff(unittest.TestCase):
         )
         converter.convert()
 
+    def test_aitoff_sun_moon_function(self):
+
+        import sys
+        import numpy as np
+        import astropy.units as u
+        from astropy.coordinates import SkyCoord
+        import gocart.convert
+        aitoffModule = sys.modules["gocart.convert.aitoff"]
+        grid = aitoffModule.sky_grid()
+        self.assertIs(aitoffModule.sky_grid(), grid)
+        positions = aitoffModule.sun_moon_positions("2023-04-25T09:56:53")
+        self.assertIs(aitoffModule.sun_moon_positions("2023-04-25T09:56:53"), positions)
+
+        # THE GREAT-CIRCLE MASK AGREES WITH ASTROPY SEPARATIONS (PLOT LONGITUDE = 180 - RA)
+        lon, lat = positions["sun"]
+        within = aitoffModule._within(grid, lon, lat, radius=33)
+        step = (slice(None, None, 20), slice(None, None, 20))
+        sun = SkyCoord(180 - np.degrees(lon), np.degrees(lat), unit="deg")
+        points = SkyCoord(180 - np.degrees(grid["lons"][step]), np.degrees(grid["lats"][step]), unit="deg")
+        separation = sun.separation(points).deg
+        clear = np.abs(separation - 33) > 1e-6
+        np.testing.assert_array_equal(within[step][clear], (separation < 33)[clear])
+
+    def test_aitoff_base_layers_function(self):
+
+        import sys
+        import numpy as np
+        import gocart.convert
+        aitoffModule = sys.modules["gocart.convert.aitoff"]
+        layers = aitoffModule.base_layers()
+        self.assertIs(aitoffModule.base_layers(), layers)
+        self.assertEqual(layers["background"].shape[2], 3)
+        self.assertFalse(layers["background"].flags.writeable)
+
+        # FLATTENING COMPOSITES THE SPARSE LAYERS AND CROPS TO THE DRAWN AREA
+        dense = np.zeros((50, 60, 4), dtype=np.uint8)
+        dense[10:20, 20:30] = [0, 0, 0, 255]
+        background = np.full((50, 60, 3), 255, dtype=np.uint8)
+        image = aitoffModule._flatten(background, [aitoffModule._sparse(dense)], pad=5)
+        self.assertEqual(image.shape, (20, 20, 3))
+        self.assertEqual(image[0, 0].tolist(), [255, 255, 255])
+        self.assertEqual(image[10, 10].tolist(), [0, 0, 0])
+
+    def test_aitoff_raster_function(self):
+
+        import sys
+        import numpy as np
+        import astropy.units as u
+        import astropy_healpix as ah
+        import gocart.convert
+        from gocart.convert import aitoff
+        aitoffModule = sys.modules["gocart.convert.aitoff"]
+
+        # THE INVERSE PROJECTION LOOKUP ROUND-TRIPS THROUGH MATPLOTLIB'S FORWARD HAMMER TRANSFORM
+        base = aitoffModule.base_layers()
+        fig, ax = aitoffModule._sky_figure(dpi=300)
+        lookup = aitoffModule.projection_lookup(ax=ax, shape=base["background"].shape)
+        self.assertIs(aitoffModule.projection_lookup(ax=ax, shape=base["background"].shape), lookup)
+        height, width = base["background"].shape[:2]
+        sample = slice(None, None, 997)
+        ra, dec = ah.healpix_to_lonlat(lookup["index29"][sample], ah.level_to_nside(29), order='nested')
+        lon = np.radians(180.) - ra.to_value(u.rad)
+        lon = np.remainder(lon + np.pi, 2 * np.pi) - np.pi
+        x, y = ax.transData.transform(np.column_stack([lon, dec.to_value(u.rad)])).T
+        rows, cols = np.divmod(lookup["pixels"][sample], width)
+        np.testing.assert_allclose(x, cols + 0.5, atol=0.01)
+        np.testing.assert_allclose(y, height - rows - 0.5, atol=0.01)
+        import matplotlib.pyplot as plt
+        plt.close(fig)
+
+        c = aitoff(
+            log=log,
+            mapPath=pathToOutputDir + "/bayestar.multiorder.fits",
+            outputFolder=pathToOutputDir,
+            settings=settings,
+            plotName="skymap_raster.png"
+        )
+        c.convert(renderer="raster")
+        self.assertTrue(os.path.exists(pathToOutputDir + "/skymap_raster.png"))
+
     def test_aitoff_function_exception(self):
 
         from gocart.convert import aitoff
@@ -57,6 +57,78 @@ class test_ascii(unittest.TestCase):
         )
         asciiContent = c.convert(outputFilepath=pathToOutputDir + "skymap.csv")
 
+    def test_ascii_pyramid_function(self):
+
+        from gocart.convert import ascii
+        c = ascii(
+            log=log,
+            mapPath=pathToOutputDir + "/bayestar.multiorder.02.fits",
+            nside=[16, 64],
+            settings=settings
+        )
+        self.assertIsNone(c.convert(outputFilepath=pathToOutputDir + "skymap.csv"))
+        self.assertEqual(c.written, [pathToOutputDir + f"skymap_nside{nside}.csv" for nside in [16, 64]])
+        asciiContent = c.convert()
+        self.assertEqual(c.convert(outputFilepath=pathToOutputDir + "skymap.csv", returnContent=True), asciiContent)
+        for nside in [16, 64]:
+            self.assertTrue(os.path.exists(pathToOutputDir + f"skymap_nside{nside}.csv"))
+            self.assertIn(f"# NSIDE:{nside}\n", asciiContent[nside])
+            self.assertEqual(len(asciiContent[nside].splitlines()), 12 * nside**2 + 3)
+
+    def test_ascii_float32_function(self):
+
+        from gocart.convert import ascii
+        c = ascii(
+            log=log,
+            mapPath=pathToOutputDir + "/bayestar.multiorder.02.fits",
+            nside=64,
+            settings=settings,
+            float32=True
+        )
+        asciiContent = c.convert()
+        self.assertEqual(len(asciiContent.splitlines()), 12 * 64**2 + 3)
+
+    def test_ascii_formats_function(self):
+
+        import numpy as np
+        import pandas as pd
+        from astropy.table import Table
+        from gocart.convert import ascii
+        c = ascii(
+            log=log,
+            mapPath=pathToOutputDir + "/bayestar.multiorder.02.fits",
+            nside=64,
+            settings=settings
+        )
+        asciiContent = c.convert()
+        self.assertIsNone(c.convert(outputFilepath=pathToOutputDir + "skymap_formats.csv", formats=["csv", "fits", "npy"], chunkSize=10000))
+        self.assertEqual(c.written, [pathToOutputDir + f"skymap_formats.{f}" for f in ["csv", "fits", "npy"]])
+
+        # THE CHUNKED CSV IS IDENTICAL TO THE IN-MEMORY CONTENT
+        with open(pathToOutputDir + "skymap_formats.csv") as f:
+            self.assertEqual(f.read(), asciiContent)
+
+        csv = pd.read_csv(pathToOutputDir + "skymap_formats.csv", comment="#", float_precision="round_trip")
+        fits = Table.read(pathToOutputDir + "skymap_formats.fits")
+        npy = np.load(pathToOutputDir + "skymap_formats.npy")
+        self.assertEqual(fits.meta["NSIDE"], 64)
+        for col in csv.columns:
+            np.testing.assert_array_equal(fits[col], csv[col].values)
+            np.testing.assert_array_equal(npy[col], csv[col].values)
+
+        # REDUCED PRECISION CSV
+        asciiContent = c.convert(precision=4)
+        self.assertEqual(asciiContent.splitlines()[3].split(",")[4], "%.4g" % csv["RA"][0])
+
+        try:
+            import pyarrow
+        except ImportError:
+            return
+        self.assertIsNone(c.convert(outputFilepath=pathToOutputDir + "skymap_formats.csv", formats="parquet"))
+        self.assertEqual(c.written, [pathToOutputDir + "skymap_formats.parquet"])
+        parquet = pd.read_parquet(pathToOutputDir + "skymap_formats.parquet")
+        pd.testing.assert_frame_equal(parquet, csv, check_exact=True)
+
     def test_ascii_function_exception(self):
 
         from gocart.convert import ascii
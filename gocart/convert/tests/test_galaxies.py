@@ -0,0 +1,174 @@
+from __future__ import print_function
+from builtins import str
+import os
+import unittest
+import shutil
+import unittest
+import yaml
+from gocart.utKit import utKit
+from fundamentals import tools
+from os.path import expanduser
+home = expanduser("~")
+
+packageDirectory = utKit("").get_project_root()
+settingsFile = packageDirectory + "/test_settings.yaml"
+# settingsFile = home + \
+#     "/git_repos/_misc_/settings/gocart/test_settings.yaml"
+
+su = tools(
+    arguments={"settingsFile": settingsFile},
+    docString=__doc__,
+    logLevel="DEBUG",
+    options_first=False,
+    projectName=None,
+    defaultSettingsFile=False
+)
+arguments, settings, log, dbConn = su.setup()
+
+# SETUP PATHS TO COMMON DIRECTORIES FOR TEST DATA
+moduleDirectory = os.path.dirname(__file__)
+pathToInputDir = moduleDirectory + "/input/"
+pathToOutputDir = moduleDirectory + "/output/"
+
+try:
+    shutil.rmtree(pathToOutputDir)
+except:
+    pass
+# COPY INPUT TO OUTPUT DIR
+shutil.copytree(pathToInputDir, pathToOutputDir)
+
+# Recursively create missing directories
+if not os.path.exists(pathToOutputDir):
+    os.makedirs(pathToOutputDir)
+
+
+# xt-setup-unit-testing-files-and-folders
+# xt-utkit-refresh-database
+
+def synthetic_catalogue(
+        path,
+        nGalaxies=200000,
+        seed=1):
+    """*write a random all-sky galaxy catalogue*"""
+    import numpy as np
+    import pandas as pd
+    rng = np.random.default_rng(seed)
+    catalogue = pd.DataFrame({
+        "NAME": [f"G{i:07d}" for i in range(nGalaxies)],
+        "RA": rng.uniform(0, 360, nGalaxies),
+        "DEC": np.degrees(np.arcsin(rng.uniform(-1, 1, nGalaxies))),
+        "DIST": rng.uniform(1, 1000, nGalaxies),
+        "MASS": rng.uniform(0.1, 10, nGalaxies)
+    })
+    if path.endswith(".fits"):
+        from astropy.table import Table
+        Table.from_pandas(catalogue).write(path, overwrite=True)
+    else:
+        catalogue.to_csv(path, index=False)
+    return catalogue
+
+
+def brute_force_ranking(
+        mapPath,
+        catalogue,
+        credibleLevel,
+        weight=True):
+    """*score every galaxy in the catalogue with a direct lookup*"""
+    import numpy as np
+    from gocart.commonutils import multiorder_index
+    index = multiorder_index(log=log, skymap=mapPath)
+    values = index.query(ra=catalogue["RA"].values, dec=catalogue["DEC"].values, distance=catalogue["DIST"].values)
+    rows = index.pixels(ra=catalogue["RA"].values, dec=catalogue["DEC"].values)
+    inRegion = index.credibleLevel[rows] - index.skymap['PROB'][rows] < credibleLevel
+    score = np.where(inRegion, values["PROBDENSITY_VOL"], 0.)
+    if weight:
+        score = score * catalogue["MASS"].values
+    return score / score.sum()
+
+
+class test_galaxies(unittest.TestCase):
+
+    def test_galaxies_function(self):
+
+        import numpy as np
+        import pandas as pd
+        from gocart.convert import galaxies
+        from gocart.convert.galaxies import load_galaxy_catalogue
+        catalogue = synthetic_catalogue(pathToOutputDir + "galaxies.csv")
+        gSettings = dict(settings)
+        gSettings["lvk"] = dict(settings["lvk"])
+        gSettings["lvk"]["galaxies"] = {
+            "crossmatch": True,
+            "catalogue": pathToOutputDir + "galaxies.csv",
+            "columns": {"id": "NAME", "ra": "RA", "dec": "DEC", "distance": "DIST", "weight": "MASS"},
+            "credible_level": 0.9,
+            "max_galaxies": 50
+        }
+        c = galaxies(
+            log=log,
+            mapPath=pathToOutputDir + "/bayestar.multiorder.02.fits",
+            settings=gSettings
+        )
+        rankedGalaxies = c.convert(outputFilepath=pathToOutputDir + "galaxies_ranked.csv")
+        self.assertEqual(len(rankedGalaxies), 50)
+
+        # THE CATALOGUE IS INDEXED ONCE PER PROCESS
+        self.assertIs(load_galaxy_catalogue(log=log, settings=gSettings), c.catalogue)
+
+        # THE RANKING MATCHES A DIRECT LOOKUP OF EVERY GALAXY
+        score = brute_force_ranking(pathToOutputDir + "/bayestar.multiorder.02.fits", catalogue, 0.9)
+        expected = np.argsort(-score, kind='stable')[:50]
+        np.testing.assert_array_equal(rankedGalaxies["ID"].values, catalogue["NAME"].values[expected])
+        np.testing.assert_allclose(rankedGalaxies["HOST_PROB"].values, score[expected], rtol=1e-10)
+
+        written = pd.read_csv(pathToOutputDir + "galaxies_ranked.csv", comment="#")
+        self.assertEqual(list(written["ID"]), list(rankedGalaxies["ID"]))
+
+    def test_galaxies_fits_2d_function(self):
+
+        import numpy as np
+        from gocart.convert import galaxies
+        from gocart.convert.galaxies import galaxy_catalogue
+        catalogue = synthetic_catalogue(pathToOutputDir + "galaxies.fits", nGalaxies=50000, seed=2)
+        cat = galaxy_catalogue(
+            log=log,
+            path=pathToOutputDir + "galaxies.fits",
+            columns={"ra": "RA", "dec": "DEC"},
+            cacheDir=pathToOutputDir + "cache"
+        )
+        self.assertEqual(len(cat), 50000)
+        self.assertTrue(np.all(np.diff(cat.index29) >= 0))
+
+        # NO DISTANCES - GALAXIES ARE RANKED BY 2D PROBABILITY DENSITY ALONE
+        c = galaxies(
+            log=log,
+            mapPath=pathToOutputDir + "/bayestar.multiorder.02.fits",
+            settings=settings,
+            catalogue=cat
+        )
+        rankedGalaxies = c.convert()
+        self.assertNotIn("PROBDENSITY_VOL", rankedGalaxies.columns)
+        self.assertTrue(np.all(np.diff(rankedGalaxies["PROBDENSITY_DEG2"].values) <= 0))
+        self.assertTrue(np.all(rankedGalaxies["CREDIBLE_LEVEL"].values < 0.91))
+        np.testing.assert_array_equal(
+            rankedGalaxies[["RA", "DEC"]].values,
+            catalogue[["RA", "DEC"]].values[rankedGalaxies["ID"].values])
+
+    def test_galaxies_function_exception(self):
+
+        from gocart.convert import galaxies
+        try:
+            this = galaxies(
+                log=log,
+                settings=settings,
+                fakeKey="break the code"
+            )
+            this.get()
+            assert False
+        except Exception as e:
+            assert True
+            print(str(e))
+
+        # x-print-testpage-for-pessto-marshall-web-object
+
+    # x-class-to-test-named-worker-function
@@ -64,6 +64,101 @@ class test_healpix2cart(unittest.TestCase):
         )
         converter.convert()
 
+    def test_cartesian_grid_cache(self):
+
+        import glob
+        import numpy as np
+        import pandas as pd
+        import astropy.units as u
+        import astropy_healpix as ah
+        from gocart.convert import create_wcs_and_pixels
+        from gocart.convert.healpix2cart import _cartesian_grid, _gridCache
+        wcs, mapDF = create_wcs_and_pixels(log=log)
+        self.assertEqual(len(mapDF), 360 * 180)
+
+        # RETURNED GRIDS ARE COPIES OF THE CACHED GRID
+        mapDF["ra"] = 0.
+        wcs2, mapDF2 = create_wcs_and_pixels(log=log)
+        self.assertNotEqual(mapDF2["ra"].max(), 0.)
+
+        # THE ON-DISK CACHE GIVES THE SAME GRID AND LOOKUP AS A FRESH COMPUTATION
+        _gridCache.clear()
+        wcs3, gridDF, match_ipix = _cartesian_grid(log=log, cacheDir=pathToOutputDir + "/cache")
+        _gridCache.clear()
+        wcs3, gridDF2, match_ipix2 = _cartesian_grid(log=log, cacheDir=pathToOutputDir + "/cache")
+        cacheFiles = glob.glob(pathToOutputDir + "/cache/cartesian/grid_car_1deg_*.npy")
+        self.assertEqual(len(cacheFiles), 1)
+        pd.testing.assert_frame_equal(gridDF, gridDF2)
+        pd.testing.assert_frame_equal(gridDF, mapDF2)
+        np.testing.assert_array_equal(match_ipix, match_ipix2)
+
+        # GRIDS DIFFERING BEYOND 6 SIGNIFICANT FIGURES GET THEIR OWN CACHE FILES
+        _gridCache.clear()
+        _cartesian_grid(log=log, pixelSizeDeg=1.0000001, cacheDir=pathToOutputDir + "/cache")
+        self.assertEqual(len(glob.glob(pathToOutputDir + "/cache/cartesian/grid_car_1deg_*.npy")), 2)
+
+        # A STALE OR MISMATCHED CACHE FILE IS REBUILT, NOT REUSED
+        with open(cacheFiles[0], 'wb') as f:
+            np.save(f, np.zeros(10))
+            np.save(f, np.zeros(10))
+            np.save(f, np.zeros(10, dtype=int))
+        _gridCache.clear()
+        wcs3, gridDF3, match_ipix3 = _cartesian_grid(log=log, cacheDir=pathToOutputDir + "/cache")
+        pd.testing.assert_frame_equal(gridDF, gridDF3)
+        np.testing.assert_array_equal(match_ipix, match_ipix3)
+        with open(cacheFiles[0], 'wb') as f:
+            f.write(b"truncated")
+        _gridCache.clear()
+        wcs3, gridDF3, match_ipix3 = _cartesian_grid(log=log, cacheDir=pathToOutputDir + "/cache")
+        np.testing.assert_array_equal(match_ipix, match_ipix3)
+        _gridCache.clear()
+        wcs3, gridDF3, match_ipix3 = _cartesian_grid(log=log, cacheDir=pathToOutputDir + "/cache")
+        np.testing.assert_array_equal(match_ipix, match_ipix3)
+        np.testing.assert_array_equal(match_ipix, ah.lonlat_to_healpix(mapDF2["ra"].values * u.deg, mapDF2["dec"].values * u.deg, ah.level_to_nside(29), order='nested'))
+
+    def test_healpix2cart_area_resample_function(self):
+
+        import numpy as np
+        from gocart.convert import healpix2cart
+        from gocart.commonutils import read_skymap
+        skymap = read_skymap(log=log, skymap=pathToOutputDir + "/bayestar.multiorder.fits")
+        for pixelSizeDeg in [2., 0.5]:
+            converter = healpix2cart(
+                log=log,
+                mapPath=skymap,
+                settings=settings,
+                pixelSizeDeg=pixelSizeDeg,
+                resample="area"
+            )
+            wcs, mapDF, header = converter.convert()
+            self.assertEqual(len(mapDF), int(360 / pixelSizeDeg) * int(180 / pixelSizeDeg))
+            self.assertAlmostEqual(mapDF["PROB"].sum(), 1., delta=0.005)
+            self.assertTrue((mapDF["PROB"] >= 0).all())
+            nearest = healpix2cart(log=log, mapPath=skymap, pixelSizeDeg=pixelSizeDeg).convert()[1]
+            self.assertEqual(list(mapDF.columns), list(nearest.columns))
+
+        # A REGION AROUND THE MAP PEAK IS ALIGNED WITH THE ALL-SKY GRID
+        peak = mapDF.loc[mapDF["PROB"].idxmax()]
+        region = (peak["RA"] - 10, peak["RA"] + 10, peak["DEC"] - 10, peak["DEC"] + 10)
+        converter = healpix2cart(
+            log=log,
+            mapPath=skymap,
+            pixelSizeDeg=0.5,
+            region=region,
+            resample="area"
+        )
+        wcs, regionDF, header = converter.convert()
+        self.assertEqual(regionDF["PIXEL_X"].min(), 0)
+        self.assertEqual(len(regionDF), 41 * 41)
+        inRegion = mapDF.loc[mapDF["RA"].between(region[0], region[1]) & mapDF["DEC"].between(region[2], region[3])]
+        np.testing.assert_allclose(np.sort(regionDF["PROB"].values), np.sort(inRegion["PROB"].values))
+
+        try:
+            healpix2cart(log=log, mapPath=skymap, region=(350., 10., -10., 10.)).convert()
+            assert False
+        except ValueError as e:
+            print(str(e))
+
     def test_healpix2cart_function_exception(self):
 
         from gocart.convert import healpix2cart
@@ -2,3 +2,5 @@
 *GCN Kafka Notice Parsers*
 """
 from .lvk import lvk
+from .lvk_backtest import lvk_backtest
+from .lvk_pool import lvk_pool
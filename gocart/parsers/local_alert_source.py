@@ -0,0 +1,323 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+*Replay recorded LVK alerts from local files in place of the GCN kafka stream*
+
+:Author:
+    David Young
+
+:Date Created:
+    October 18, 2026
+"""
+from fundamentals import tools
+from builtins import object
+import time
+import sys
+import os
+os.environ['TERM'] = 'vt100'
+
+
+class local_alert_source(object):
+    """
+    *An alert source that replays a directory of JSON alerts, or a recorded JSONL file (one alert per line), in place of the GCN kafka consumer*
+
+    The source answers the parts of the kafka consumer interface used by `gocart listen` and `gocart echo` (`consume`, `commit`, `subscribe`, `assign`, `position`, `list_topics`, `offsets_for_times`, `get_watermark_offsets` and `close`), so the `lvk_pool`, `offset_committer` and `replay_alerts` run against it unchanged. The alerts form a single partition, ordered by their `time_created`, and are read from disk as they are released (a recording is never held in memory all at once).
+
+    **Key Arguments:**
+        - ``log`` -- logger
+        - ``path`` -- a directory of JSON alert files, a JSONL recording or a single JSON alert file
+        - ``speed`` -- replay at this multiple of the original cadence (1 = real time, 10 = ten times faster). Default *0* (as fast as possible)
+        - ``topic`` -- the topic the alerts are reported under. Default *igwn.gwalert*
+
+    **Usage:**
+
+    ```python
+    from gocart.parsers.local_alert_source import local_alert_source
+    source = local_alert_source(
+        log=log,
+        path="/path/to/json_alerts",
+        speed=60
+    )
+    while not source.exhausted:
+        for message in source.consume(num_messages=10, timeout=1):
+            pool.submit(message)
+    ```
+    """
+
+    def __init__(
+            self,
+            log,
+            path,
+            speed=0,
+            topic="igwn.gwalert"
+    ):
+        self.log = log
+        log.debug("instansiating a new 'local_alert_source' object")
+        self.path = path
+        self.speed = float(speed or 0)
+        self.topic = topic
+
+        # (TIMESTAMP MS, FILE, START BYTE, LENGTH) OF EACH ALERT, IN PUBLICATION ORDER
+        self.alerts = self._index(path)
+        self._position = 0
+        # THE WALL-CLOCK TIME AND ALERT TIMESTAMP THE CADENCE IS MEASURED FROM (SET BY THE FIRST CONSUME)
+        self._clock = None
+
+        return None
+
+    def __len__(self):
+        return len(self.alerts)
+
+    @property
+    def exhausted(self):
+        """*True once every alert has been consumed*"""
+        return self._position >= len(self.alerts)
+
+    def end_time(
+            self):
+        """*the datetime (UTC) of the last alert in the recording*"""
+        from datetime import datetime, timezone
+        if not self.alerts:
+            return datetime.now(timezone.utc)
+        return datetime.fromtimestamp(self.alerts[-1][0] / 1000., tz=timezone.utc)
+
+    def consume(
+            self,
+            num_messages=1,
+            timeout=-1):
+        """*return up to ``num_messages`` alerts that are due, waiting up to ``timeout`` seconds for the first of them*
+
+        **Key Arguments:**
+            - ``num_messages`` -- the most alerts to return. Default *1*
+            - ``timeout`` -- seconds to wait for the next alert to fall due (negative to wait as long as it takes). Default *-1*
+
+        **Return:**
+            - ``messages`` -- list of kafka-like messages (empty once the source is exhausted)
+        """
+        self.log.debug('starting the ``consume`` method')
+
+        if self.exhausted:
+            return []
+
+        now = time.monotonic()
+        if self._clock is None:
+            self._clock = (now, self.alerts[self._position][0])
+
+        # WAIT FOR THE NEXT ALERT TO FALL DUE (AT MOST `timeout` SECONDS)
+        wait = self._due(self._position) - now
+        if wait > 0:
+            if timeout is not None and timeout >= 0 and wait > timeout:
+                time.sleep(timeout)
+                return []
+            time.sleep(wait)
+            now = time.monotonic()
+
+        messages = []
+        while not self.exhausted and len(messages) < num_messages and self._due(self._position) <= now:
+            messages.append(self._message(self._position, self._due(self._position)))
+            self._position += 1
+
+        self.log.debug('completed the ``consume`` method')
+        return messages
+
+    def subscribe(
+            self,
+            topics,
+            **kwargs):
+        """*start replaying from the first alert*"""
+        self._seek(0)
+
+    def commit(
+            self,
+            *args,
+            **kwargs):
+        """*nothing to commit: a local replay always starts from the beginning*"""
+        return None
+
+    def close(
+            self):
+        return None
+
+    def list_topics(
+            self,
+            topic=None,
+            timeout=-1):
+        """*the topic metadata: a single partition (0) holding all the alerts*"""
+        from types import SimpleNamespace
+        return SimpleNamespace(topics={self.topic: SimpleNamespace(error=None, partitions={0: None})})
+
+    def offsets_for_times(
+            self,
+            partitions,
+            timeout=-1):
+        """*set the offset of each topic-partition to that of the first alert created at or after its offset (a timestamp in ms), or -1 if there is none*"""
+        import bisect
+        timestamps = [a[0] for a in self.alerts]
+        offsets = []
+        for tp in partitions:
+            offset = bisect.bisect_left(timestamps, tp.offset)
+            offsets.append(type(tp)(tp.topic, tp.partition, offset if offset < len(self.alerts) else -1))
+        return offsets
+
+    def get_watermark_offsets(
+            self,
+            partition,
+            timeout=-1,
+            cached=False):
+        """*the (low, high) offsets of the partition*"""
+        return 0, len(self.alerts)
+
+    def assign(
+            self,
+            partitions):
+        """*continue the replay from the offset of the (single) assigned partition*"""
+        for tp in partitions:
+            self._seek(max(tp.offset, 0))
+
+    def position(
+            self,
+            partitions):
+        """*set the offset of each topic-partition to the next alert to be consumed*"""
+        return [type(tp)(tp.topic, tp.partition, self._position) for tp in partitions]
+
+    def _seek(
+            self,
+            offset):
+        """*move to the given offset and restart the cadence clock from it*"""
+        self._position = offset
+        self._clock = None
+
+    def _due(
+            self,
+            offset):
+        """*the wall-clock (monotonic) time the alert at the offset falls due*"""
+        if not self.speed:
+            return self._clock[0]
+        start, timestamp = self._clock
+        return start + max(self.alerts[offset][0] - timestamp, 0) / 1000. / self.speed
+
+    def _message(
+            self,
+            offset,
+            released):
+        """*read the alert at the offset from disk*"""
+        timestamp, filepath, start, length = self.alerts[offset]
+        with open(filepath, "rb") as f:
+            f.seek(start)
+            record = f.read(length) if length is not None else f.read()
+        return _local_message(self.topic, offset, timestamp, record.strip(), released)
+
+    def _index(
+            self,
+            path):
+        """*list the (timestamp, file, start byte, length) of every alert, sorted by the time the alert was created*"""
+        self.log.debug('starting the ``_index`` method')
+
+        if not os.path.exists(path):
+            raise IOError(f"the alert source `{path}` does not exist")
+
+        alerts = []
+        if os.path.isdir(path):
+            for filename in sorted(os.listdir(path)):
+                filepath = os.path.join(path, filename)
+                if filename.endswith(".json") and os.path.isfile(filepath):
+                    with open(filepath, "rb") as f:
+                        alerts.append((self._timestamp(f.read()), filepath, 0, None))
+        elif path.endswith(".jsonl"):
+            with open(path, "rb") as f:
+                start = 0
+                for line in f:
+                    if line.strip():
+                        alerts.append((self._timestamp(line), path, start, len(line)))
+                    start += len(line)
+        else:
+            with open(path, "rb") as f:
+                alerts.append((self._timestamp(f.read()), path, 0, None))
+
+        # ALERTS WITHOUT A READABLE `time_created` KEEP THEIR PLACE IN THE LISTING (THEY FALL DUE WITH THE ALERT BEFORE THEM)
+        last = 0
+        for i, alert in enumerate(alerts):
+            if alert[0] is None:
+                alerts[i] = (last,) + alert[1:]
+            last = alerts[i][0]
+        alerts.sort(key=lambda a: a[0])
+
+        self.log.debug('completed the ``_index`` method')
+        return alerts
+
+    def _timestamp(
+            self,
+            record):
+        """*the `time_created` of an alert record in ms since the epoch (None if it can't be read)*"""
+        from datetime import datetime, timezone
+        from gocart.parsers.lvk import peek_alert_envelope
+        envelope = peek_alert_envelope(record)
+        if not envelope:
+            self.log.warning(f'could not read the `time_created` of an alert in `{self.path}`')
+            return None
+        created = datetime.fromisoformat(envelope["time_created"].replace("Z", "+00:00"))
+        if created.tzinfo is None:
+            created = created.replace(tzinfo=timezone.utc)
+        return int(created.timestamp() * 1000)
+
+    # use the tab-trigger below for new method
+    # xt-class-method
+
+
+class _local_message(object):
+    """*a recorded alert, presented as a kafka message*"""
+
+    def __init__(self, topic, offset, timestamp, record, released):
+        self._topic = topic
+        self._offset = offset
+        self._timestamp = timestamp
+        self.record = record
+        # THE (MONOTONIC) TIME THE ALERT FELL DUE (ITS REPLAYED ARRIVAL), TO MEASURE ITS LATENCY FROM
+        self.released = released
+
+    def value(self):
+        return self.record
+
+    def error(self):
+        return None
+
+    def topic(self):
+        return self._topic
+
+    def partition(self):
+        return 0
+
+    def offset(self):
+        return self._offset
+
+    def timestamp(self):
+        # (TIMESTAMP_CREATE_TIME, MS SINCE THE EPOCH)
+        return (1, self._timestamp)
+
+
+def throughput_report(
+        count,
+        seconds,
+        latencies):
+    """*a table of the throughput and latency of a local replay*
+
+    **Key Arguments:**
+        - ``count`` -- the number of alerts parsed
+        - ``seconds`` -- the wall-clock duration of the replay
+        - ``latencies`` -- the seconds from the release of each alert to the end of its parsing
+
+    **Return:**
+        - ``report`` -- the table as a string
+
+    ```python
+    from gocart.parsers.local_alert_source import throughput_report
+    print(throughput_report(count=count, seconds=seconds, latencies=pool.latencies))
+    ```
+    """
+    import numpy as np
+    from tabulate import tabulate
+    rows = [["alerts parsed", count], ["wall time (s)", f"{seconds:.2f}"], ["throughput (alerts/s)", f"{count / seconds:.2f}" if seconds else "-"]]
+    if len(latencies):
+        p50, p90, p99 = np.percentile(list(latencies), [50, 90, 99])
+        rows += [["latency p50 (s)", f"{p50:.2f}"], ["latency p90 (s)", f"{p90:.2f}"], ["latency p99 (s)", f"{p99:.2f}"], ["latency max (s)", f"{max(latencies):.2f}"]]
+    return tabulate(rows, tablefmt='psql')
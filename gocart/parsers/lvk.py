@@ -9,14 +9,40 @@
 :Date Created:
     March 19, 2023
 """
-from gocart.commonutils import generate_skymap_stats
-from gocart.convert import ascii
+from gocart.commonutils import generate_skymap_stats, multiorder_skymap
+from gocart.parsers.lvk_filters import compile_lvk_filters
+from gocart.convert import ascii, galaxies
 from fundamentals import tools
 from builtins import object
+import threading
+import re
 import sys
 import os
 os.environ['TERM'] = 'vt100'
 
+# USE THE FASTER ORJSON DECODER WHEN INSTALLED
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+# THE ENVELOPE KEYS WE CAN PEEK AT WITHOUT DECODING THE WHOLE RECORD (BASE64 SKYMAPS NEVER CONTAIN A QUOTE)
+_envelopeKeys = ["superevent_id", "alert_type", "time_created"]
+_envelopeRegex = {
+    str: {k: re.compile(r'"%s"\s*:\s*"([^"\\]*)"' % k) for k in _envelopeKeys},
+    bytes: {k: re.compile(rb'"%s"\s*:\s*"([^"\\]*)"' % k.encode()) for k in _envelopeKeys}
+}
+
+# PROCESS-WIDE CACHE OF THE ADVANCED SETTINGS FILE AND THE SETTINGS MERGED WITH IT
+_advancedSettingsLock = threading.Lock()
+_advancedSettingsCache = {
+    "located": False,
+    "path": None,
+    "mtime": None,
+    "settings": {},
+    "merged": None
+}
+
 
 class lvk(object):
     """
@@ -54,36 +80,24 @@ class lvk(object):
             plugins=False
 
     ):
-        import json
-
         self.log = log
         log.debug("instansiating a new 'lvk' object")
         self.settings = settings
-        self.record = json.loads(record)
         self.plugins = plugins
 
-        import inspect
-        import yaml
-        # COLLECT ADVANCED SETTINGS IF AVAILABLE
-        parentDirectory = os.path.dirname(__file__)
-        advs = parentDirectory + "/advanced_settings.yaml"
-        level = 0
-        exists = False
-        count = 1
-        while not exists and len(advs) and count < 10:
-            count += 1
-            level -= 1
-            exists = os.path.exists(advs)
-            if not exists:
-                advs = "/".join(parentDirectory.split("/")
-                                [:level]) + "/advanced_settings.yaml"
-        if not exists:
-            advs = {}
+        # MERGE ADVANCED SETTINGS AND USER SETTINGS (USER SETTINGS OVERRIDE) - CACHED PER PROCESS
+        self.settings = merge_advanced_settings(log=log, settings=self.settings)
+        # FILTERS ARE VALIDATED AND COMPILED ONCE PER PROCESS
+        self.filters = compile_lvk_filters(log=log, filters=self.settings["lvk"].get("filters"))
+
+        # PEEK AT THE ALERT ENVELOPE SO ALERTS WE IGNORE NEVER PAY FOR DECODING THE SKYMAP STRING
+        self.envelopeOnly = False
+        self.skymap = None
+        envelope = peek_alert_envelope(record)
+        if envelope:
+            self.record = envelope
         else:
-            with open(advs, 'r') as stream:
-                advs = yaml.safe_load(stream)
-        # MERGE ADVANCED SETTINGS AND USER SETTINGS (USER SETTINGS OVERRIDE)
-        self.settings = {**advs, **self.settings}
+            self.record = json_loads(record)
 
         # WHICH EVENTS ARE WE TO PARSE?
         parse_mock_events = self.settings["lvk"]["parse_mock_events"]
@@ -114,6 +128,13 @@ class lvk(object):
             if not os.path.exists(self.eventDir):
                 os.makedirs(self.eventDir)
 
+        # ONLY DECODE THE FULL RECORD IF THE ALERT TYPE CAN PASS ONE OR MORE FILTERS
+        if envelope:
+            if self._alert_type_rejected(envelope["alert_type"]):
+                self.envelopeOnly = True
+            else:
+                self.record = json_loads(record)
+
         return None
 
     def parse(self):
@@ -123,10 +144,6 @@ class lvk(object):
         self.log.debug('starting the ``parse`` method')
 
         from base64 import b64decode
-        from io import BytesIO
-        from astropy.table import Table
-        import astropy_healpix as ah
-        import numpy as np
         from astropy.time import Time
         from datetime import datetime
         import yaml
@@ -140,6 +157,16 @@ class lvk(object):
         if self.record['superevent_id'][0] != 'M' and not parse_real_events:
             return
 
+        # ALERT TYPE FAILS EVERY FILTER - THE FULL RECORD WAS NEVER DECODED
+        if self.envelopeOnly:
+            print("\n----------------------------------------")
+            print(f'EVENT: {self.record["superevent_id"]}')
+            print(f'ALERT: {self.record["alert_type"].replace("_"," ")} reported at {self.record["time_created"].replace("Z","")} UTC')
+            for f in self.filters:
+                print(f"The alert fails the {f.name} filter. {f.invalidMessage or 'Alert type is ' + self.record['alert_type'].lower()}.")
+            print("----------------------------------------\n\n")
+            return
+
         print("\n----------------------------------------")
         if "event" in self.record and self.record["event"]:
             timeDelta = (Time(self.record["time_created"], scale='utc') - Time(self.record["event"]["time"], scale='utc')).to_value(unit='min')
@@ -176,23 +203,21 @@ class lvk(object):
         # PARSE SKY MAP
         header, extras, fitsPath = {}, {}, None
         localisation = False
+        self.skymap = None
         if self.record.get('event', {}):
             skymap_str = self.record.get('event', {}).pop('skymap')
 
             if skymap_str:
-                # Decode, parse skymap, and print most probable sky location
+                # DECODE AND PARSE THE SKYMAP ONCE - THE SAME OBJECT IS SHARED BY ALL DOWNSTREAM STAGES
                 skymap_bytes = b64decode(skymap_str)
-                skymap = Table.read(BytesIO(skymap_bytes))
+                skymap = multiorder_skymap(log=self.log, skymapBytes=skymap_bytes)
                 localisation = skymap.meta["CREATOR"].lower()
                 if localisation == "ligo-skymap-from-samples":
                     skymap.meta["CREATOR"] = "bilby"
                     localisation = "bilby"
                 header = {k: v for k, v in skymap.meta.items() if k != "HISTORY"}
-                # GENERATE SOME EXTRA STATS
-                extras = generate_skymap_stats(
-                    log=self.log,
-                    skymap=skymap,
-                )
+                # THE EXTRA STATS ARE ONLY GENERATED ONCE A FILTER OR OUTPUT NEEDS THEM
+                self.skymap = skymap
 
         # MERGE HEADER AND ALERT INTO ONE FILE
         try:
@@ -202,11 +227,10 @@ class lvk(object):
         meta = {"HEADER": header, "ALERT": self.record, "EXTRA": extras}
 
         # DOES ALERT PASS THE FILTERS?
-        if 'filters' in self.settings["lvk"]:
-            if self.settings["lvk"]["filters"]:
-                if not self.filter_alert(meta):
-                    print("----------------------------------------\n\n")
-                    return
+        if self.filters:
+            if not self.filter_alert(meta):
+                print("----------------------------------------\n\n")
+                return
         print("----------------------------------------\n\n")
 
         # DON'T WRITE RETRACTION ALERT IF NO OTHER ALERT EXISTS ON FILE
@@ -218,6 +242,9 @@ class lvk(object):
             if not os.path.exists(eventDir):
                 return
 
+        # THE ALERT IS BEING WRITTEN - META.YAML EXTRA AND THE AITOFF LEGEND NEED THE SKYMAP STATS
+        self._add_skymap_stats(meta)
+
         # ADD EVENT FILTERING HERE
         # ONCE WE HAVE DECIDED TO SAVE THE EVENT/ALERT
         # RECURSIVELY CREATE MISSING DIRECTORIES
@@ -242,6 +269,7 @@ class lvk(object):
             fitsPath = f"{alertDir}/{localisation}.multiorder.fits"
             with open(fitsPath, "wb") as f:
                 f.write(skymap_bytes)
+            skymap.mapPath = fitsPath
 
         # WRITE META
         with open(alertDir + "/meta.yaml", 'w') as stream:
@@ -251,17 +279,21 @@ class lvk(object):
             if self.settings["lvk"]["ascii_map"]["convert"]:
                 c = ascii(
                     log=self.log,
-                    mapPath=fitsPath,
+                    mapPath=skymap,
                     nside=self.settings["lvk"]["ascii_map"]["nside"],
-                    settings=self.settings
+                    settings=self.settings,
+                    float32=self.settings["lvk"]["ascii_map"].get("float32", False)
                 )
-                asciiContent = c.convert(outputFilepath=alertDir + "/skymap.csv")
+                c.convert(
+                    outputFilepath=alertDir + "/skymap.csv",
+                    formats=self.settings["lvk"]["ascii_map"].get("format", "csv"),
+                    precision=self.settings["lvk"]["ascii_map"].get("precision", False))
 
             if self.settings["lvk"]["aitoff"]["convert"]:
                 from gocart.convert import aitoff
                 c = aitoff(
                     log=self.log,
-                    mapPath=fitsPath,
+                    mapPath=skymap,
                     outputFolder=alertDir,
                     settings=self.settings,
                     meta=meta
@@ -269,7 +301,16 @@ class lvk(object):
                 c.convert(
                     galacticPlane=self.settings["lvk"]["aitoff"]["galactic_plane"],
                     sunmoonContour=self.settings["lvk"]["aitoff"]["sun_moon_contour"],
-                    sunmoon=self.settings["lvk"]["aitoff"]["sun_moon"])
+                    sunmoon=self.settings["lvk"]["aitoff"]["sun_moon"],
+                    renderer=self.settings["lvk"]["aitoff"].get("renderer", "matplotlib"))
+
+            if (self.settings["lvk"].get("galaxies") or {}).get("crossmatch"):
+                c = galaxies(
+                    log=self.log,
+                    mapPath=skymap,
+                    settings=self.settings
+                )
+                c.convert(outputFilepath=alertDir + "/galaxies.csv")
 
         if self.plugins:
             from os.path import expanduser
@@ -294,100 +335,78 @@ class lvk(object):
         self.log.debug('completed the ``parse`` method')
         return lvk
 
+    def _add_skymap_stats(
+            self,
+            meta):
+        """*generate the extra skymap stats and add them to the meta dictionary (only done once, and only if there is a skymap)*
+
+        **Key Arguments:**
+            - ``meta`` -- the alert meta dictionary
+        """
+        if self.skymap is None or meta["EXTRA"]:
+            return
+        # THE 10, 50 AND 90% AREAS ARE ALWAYS NEEDED BY THE AITOFF LEGEND AND THE area90 FILTER
+        credibleLevels = sorted(set([10, 50, 90] + list(self.settings["lvk"].get("credible_levels") or [])))
+        meta["EXTRA"].update(generate_skymap_stats(
+            log=self.log,
+            skymap=self.skymap,
+            credibleLevels=credibleLevels
+        ))
+
+    def _alert_type_rejected(
+            self,
+            alertType):
+        """*return True if the alert type alone means the alert cannot pass any of the filters*
+
+        **Key Arguments:**
+            - ``alertType`` -- the alert type from the alert envelope
+        """
+        if not self.filters:
+            return False
+        for f in self.filters:
+            if f.accepts_alert_type(alertType):
+                return False
+        return True
+
     def filter_alert(
             self,
-            alert):
+            alert,
+            explain=False):
         """*filter the alert record with filtering criteria in the settings file and return true (pass) or false (fail)*
 
+        Filters are evaluated in order and evaluation stops at the first passing filter. Within a filter, evaluation stops at the first failing criterion (skymap-derived criteria are evaluated last).
+
         **Key Arguments:**
             - ``alert`` -- the alert record
+            - ``explain`` -- evaluate every criterion of every filter and report all the reasons each filter fails. Default *False*
 
         **Return:**
             - ``passing`` -- True or False. True is alert passes one or more filter
         """
         self.log.debug('starting the ``filter_alert`` method')
 
-        filterResults = []
-        for f in self.settings["lvk"]["filters"]:
-
-            # SOME SETUP
-            try:
-                f['alert_types'][:] = [g.lower() for g in f['alert_types']]
-            except:
-                pass
-
-            passing = True
-            message = []
-
-            matchingCriteria = [
-                'alert_types',
-                "ns_lower",
-                "far_upper",
-                "dist_upper",
-                "area90_upper",
-                "hasns_lower",
-                "hasremnant_lower",
-                "event_dir_exists",
-                "burst",
-                "significant"
-            ]
-
-            # BURST EVENTS
-            if 'event' in alert['ALERT'] and alert['ALERT']['event'] and 'group' in alert['ALERT']['event'] and alert['ALERT']['event']['group'] and alert['ALERT']['event']['group']:
-                if "burst" in f and f["burst"]:
-                    if alert['ALERT']['event']['group'].lower() != "burst":
-                        passing = False
-                        message.append(f"This is a {alert['ALERT']['event']['group']} event")
-                elif alert['ALERT']['event']['group'].lower() == "burst":
-                    passing = False
-                    message.append(f"This is a {alert['ALERT']['event']['group']} event")
-
-            if 'alert_types' in f and not alert['ALERT']['alert_type'].lower() in f['alert_types']:
-                passing = False
-                message.append(f"Alert type is {alert['ALERT']['alert_type'].lower()}")
-            if "ns_lower" in f and 'event' in alert['ALERT'] and alert['ALERT']['event'] and 'classification' in alert['ALERT']['event'] and len(alert['ALERT']['event']['classification']) and not alert['ALERT']['event']['classification']['BNS'] + alert['ALERT']['event']['classification']['NSBH'] >= f["ns_lower"]:
-                passing = False
-                message.append(f"BNS+NSBH = {alert['ALERT']['event']['classification']['BNS'] + alert['ALERT']['event']['classification']['NSBH']} (< {f['ns_lower']})")
-            if "far_upper" in f and 'event' in alert['ALERT'] and alert['ALERT']['event'] and not alert['ALERT']['event']['far'] < f["far_upper"]:
-                passing = False
-                message.append(f"FAR = {alert['ALERT']['event']['far']} (> {f['far_upper']})")
-            if "dist_upper" in f and 'DISTMEAN' in alert['HEADER'] and alert['HEADER']['DISTMEAN'] and not alert['HEADER']['DISTMEAN'] < f["dist_upper"]:
-                passing = False
-                message.append(f"DISTMEAN = {alert['HEADER']['DISTMEAN']} (> {f['dist_upper']})")
-            if "area90_upper" in f and 'EXTRA' in alert and 'area90' in alert['EXTRA'] and not alert['EXTRA']['area90'] < f["area90_upper"]:
-                passing = False
-                message.append(f"area90 = {alert['EXTRA']['area90']} (> {f['area90_upper']})")
-            if "hasns_lower" in f and 'event' in alert['ALERT'] and alert['ALERT']['event'] and 'properties' in alert['ALERT']['event'] and len(alert['ALERT']['event']['properties']) and not alert['ALERT']['event']['properties']['HasNS'] >= f["hasns_lower"]:
-                passing = False
-                message.append(f"HasNS = {alert['ALERT']['event']['properties']['HasNS']} (< {f['hasns_lower']})")
-            if "hasremnant_lower" in f and 'event' in alert['ALERT'] and alert['ALERT']['event'] and 'properties' in alert['ALERT']['event'] and len(alert['ALERT']['event']['properties']) and not alert['ALERT']['event']['properties']['HasRemnant'] >= f["hasremnant_lower"]:
-                passing = False
-                message.append(f"HasRemnant = {alert['ALERT']['event']['properties']['HasRemnant']} (< {f['hasremnant_lower']})")
-            if "significant" in f and 'event' in alert['ALERT'] and alert['ALERT']['event'] and 'significant' in alert['ALERT']['event'] and f['significant'] != alert['ALERT']['event']['significant']:
-                passing = False
-                message.append(f"Significant = {alert['ALERT']['event']['significant']}")
-
-            if "event_dir_exists" in f:
-                if self.record["superevent_id"][0] == 'M':
-                    eventDir = self.mockDir + self.record["superevent_id"]
-                else:
-                    eventDir = self.eventDir + self.record["superevent_id"]
-                if not os.path.exists(eventDir):
-                    passing = False
-                    message.append(f"The event has not previously passed the filtering criteria")
-
-            for k, v in f.items():
-                if k not in matchingCriteria and k != "name":
-                    passing = False
-                    message.append(f"Unrecognised filtering criterion '{k}'")
+        if self.record["superevent_id"][0] == 'M':
+            eventDir = self.mockDir + self.record["superevent_id"]
+        else:
+            eventDir = self.eventDir + self.record["superevent_id"]
 
+        filterResults = []
+        for f in self.filters:
+            passing, message = f.evaluate(
+                alert=alert,
+                eventDir=eventDir,
+                addSkymapStats=self._add_skymap_stats,
+                explain=explain
+            )
             filterResults.append(passing)
 
             if passing:
-                print(f"The alert passes the {f['name']} filter")
+                print(f"The alert passes the {f.name} filter")
+                if not explain:
+                    break
             else:
                 message = (" and ").join(message)
-                print(f"The alert fails the {f['name']} filter. {message}.")
+                print(f"The alert fails the {f.name} filter. {message}.")
 
         self.log.debug('completed the ``filter_alert`` method')
         if True in filterResults:
@@ -397,3 +416,129 @@ class lvk(object):
 
         # use the tab-trigger below for new method
         # xt-class-method
+
+
+def _locate_advanced_settings():
+    """*walk up from this module to find the `advanced_settings.yaml` file (returns None if not found)*"""
+    parentDirectory = os.path.dirname(__file__)
+    advs = parentDirectory + "/advanced_settings.yaml"
+    level = 0
+    exists = False
+    count = 1
+    while not exists and len(advs) and count < 10:
+        count += 1
+        level -= 1
+        exists = os.path.exists(advs)
+        if not exists:
+            advs = "/".join(parentDirectory.split("/")
+                            [:level]) + "/advanced_settings.yaml"
+    if not exists:
+        return None
+    return advs
+
+
+def advanced_settings(
+        log):
+    """*return the parsed `advanced_settings.yaml` settings*
+
+    The file is located and parsed only once per process. Its modification time is checked on each call so edits to the file still take effect without restarting a listener.
+
+    **Key Arguments:**
+        - ``log`` -- logger
+
+    **Return:**
+        - ``advs`` -- the advanced settings dictionary (empty if no file is found)
+    """
+    log.debug('starting the ``advanced_settings`` function')
+
+    import yaml
+
+    cache = _advancedSettingsCache
+    with _advancedSettingsLock:
+        if not cache["located"]:
+            cache["path"] = _locate_advanced_settings()
+            cache["located"] = True
+
+        if cache["path"]:
+            try:
+                mtime = os.stat(cache["path"]).st_mtime_ns
+            except OSError:
+                mtime = None
+            if mtime != cache["mtime"]:
+                if mtime is None:
+                    cache["settings"] = {}
+                else:
+                    with open(cache["path"], 'r') as stream:
+                        cache["settings"] = yaml.safe_load(stream) or {}
+                cache["mtime"] = mtime
+                cache["merged"] = None
+        advs = cache["settings"]
+
+    log.debug('completed the ``advanced_settings`` function')
+    return advs
+
+
+def merge_advanced_settings(
+        log,
+        settings):
+    """*merge the advanced settings and the user settings (user settings override)*
+
+    The last merge is cached, so repeatedly passing the same settings object (e.g. once per kafka message) does no file or YAML work.
+
+    **Key Arguments:**
+        - ``log`` -- logger
+        - ``settings`` -- the user settings dictionary
+
+    **Return:**
+        - ``settings`` -- the merged settings dictionary
+
+    ```python
+    from gocart.parsers.lvk import merge_advanced_settings
+    settings = merge_advanced_settings(log=log, settings=settings)
+    ```
+    """
+    log.debug('starting the ``merge_advanced_settings`` function')
+
+    if not settings:
+        settings = {}
+    advs = advanced_settings(log=log)
+
+    with _advancedSettingsLock:
+        cached = _advancedSettingsCache["merged"]
+        # REUSE THE LAST MERGE IF HANDED THE SAME SETTINGS OBJECT WITH UNCHANGED TOP-LEVEL VALUES
+        if cached and cached[0] is settings and cached[2] == len(settings) and all(cached[1].get(k) is v for k, v in settings.items()):
+            mergedSettings = cached[1]
+        else:
+            mergedSettings = {**advs, **settings}
+            _advancedSettingsCache["merged"] = (settings, mergedSettings, len(settings))
+
+    log.debug('completed the ``merge_advanced_settings`` function')
+    return mergedSettings
+
+
+def peek_alert_envelope(
+        record):
+    """*read the `superevent_id`, `alert_type` and `time_created` of a kafka record without decoding the JSON (and its multi-MB skymap string)*
+
+    **Key Arguments:**
+        - ``record`` -- the raw kafka record (str or bytes)
+
+    **Return:**
+        - ``envelope`` -- dictionary of the envelope values, or None if they could not all be read (fall back to a full decode)
+
+    ```python
+    from gocart.parsers.lvk import peek_alert_envelope
+    envelope = peek_alert_envelope(message.value())
+    ```
+    """
+    regexes = _envelopeRegex.get(type(record))
+    if not regexes:
+        return None
+    envelope = {}
+    for k, regex in regexes.items():
+        match = regex.search(record)
+        if not match:
+            return None
+        value = match.group(1)
+        envelope[k] = value if isinstance(value, str) else value.decode("utf-8")
+    return envelope
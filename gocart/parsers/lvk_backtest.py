@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+*Backtest LVK alert filters against the archive of previously collected alerts*
+
+:Author:
+    David Young
+
+:Date Created:
+    October 18, 2026
+"""
+from gocart.parsers.lvk_filters import numericCriteria, alert_table_row, lvk_filter
+from fundamentals import tools
+from builtins import object
+import sys
+import os
+os.environ['TERM'] = 'vt100'
+
+
+class lvk_backtest(object):
+    """
+    *Evaluate one or more candidate sets of LVK filters against every `meta.yaml` in the download directory in a single vectorised pass*
+
+    The alert archive is flattened into a columnar table that is cached to `~/.config/gocart/cache`; subsequent runs only read `meta.yaml` files that are new or have changed.
+
+    Note only alerts that were written to file are in the archive, so if you ran gocart with filters the archive only contains alerts that passed those filters.
+
+    **Key Arguments:**
+        - ``log`` -- logger
+        - ``settings`` -- the settings dictionary
+        - ``cacheDir`` -- where to cache the alert table. Default *~/.config/gocart/cache*
+
+    **Usage:**
+
+    ```python
+    from gocart.parsers import lvk_backtest
+    bt = lvk_backtest(
+        log=log,
+        settings=settings
+    )
+    results = bt.run(filterSets={"current": settings["lvk"]["filters"]})
+    bt.report(results)
+    ```
+    """
+
+    def __init__(
+            self,
+            log,
+            settings,
+            cacheDir=False
+    ):
+        self.log = log
+        log.debug("instansiating a new 'lvk_backtest' object")
+        self.settings = settings
+
+        # WHERE ALERTS ARE DOWNLOADED TO
+        from os.path import expanduser
+        home = expanduser("~")
+        if "download_dir" in self.settings["lvk"] and self.settings["lvk"]["download_dir"]:
+            self.download_dir = self.settings["lvk"]["download_dir"]
+            # MAKE RELATIVE HOME PATH ABSOLUTE
+            if self.download_dir == "~":
+                self.download_dir = self.download_dir.replace("~", home)
+        else:
+            self.download_dir = "."
+
+        if not cacheDir:
+            cacheDir = home + "/.config/gocart/cache"
+        if not os.path.exists(cacheDir):
+            os.makedirs(cacheDir)
+        import hashlib
+        archiveId = hashlib.md5(os.path.abspath(self.download_dir).encode()).hexdigest()[:10]
+        self.cachePath = f"{cacheDir}/backtest_{archiveId}.pkl"
+
+        self.table = None
+
+        return None
+
+    def load_archive(
+            self):
+        """*read the alert archive into a columnar table (one row per alert), reusing the cached table for unchanged `meta.yaml` files*
+
+        **Return:**
+            - ``table`` -- pandas dataframe of the alert archive sorted by alert creation time
+        """
+        self.log.debug('starting the ``load_archive`` method')
+
+        import pandas as pd
+        import yaml
+        try:
+            from yaml import CSafeLoader as SafeLoader
+        except ImportError:
+            from yaml import SafeLoader
+
+        # FIND ALL META.YAML FILES AND THEIR MODIFICATION TIMES
+        found = {}
+        for d in ["superevents", "mockevents"]:
+            for root, dirs, files in os.walk(f"{self.download_dir}/{d}"):
+                if "meta.yaml" in files:
+                    p = os.path.join(root, "meta.yaml")
+                    found[p] = os.stat(p).st_mtime_ns
+
+        # REUSE CACHED ROWS FOR UNCHANGED FILES (INVALIDATED IF THE CRITERIA REGISTRY HAS GROWN)
+        cached = None
+        if os.path.exists(self.cachePath):
+            try:
+                cached = pd.read_pickle(self.cachePath)
+                if not all(k in cached.columns for k in numericCriteria):
+                    cached = None
+            except Exception as e:
+                self.log.warning(f"could not read the backtest cache {self.cachePath}: {e}")
+                cached = None
+
+        rows = []
+        keep = None
+        if cached is not None and len(cached):
+            keep = cached["path"].map(found).values == cached["mtime"].values
+            cached = cached.loc[keep]
+            known = set(cached["path"])
+        else:
+            known = set()
+
+        for p, mtime in found.items():
+            if p in known:
+                continue
+            try:
+                with open(p, 'r') as stream:
+                    meta = yaml.load(stream, Loader=SafeLoader)
+                row = alert_table_row(meta)
+            except Exception as e:
+                self.log.warning(f"could not read {p}: {e}")
+                continue
+            row["path"] = p
+            row["mtime"] = mtime
+            rows.append(row)
+
+        frames = [f for f in [cached, pd.DataFrame(rows)] if f is not None and len(f)]
+        if frames:
+            table = pd.concat(frames, ignore_index=True)
+        else:
+            table = pd.DataFrame(columns=["superevent_id", "alert_type", "time_created", "group", "significant"] + list(numericCriteria) + ["path", "mtime"])
+        table.sort_values(["time_created", "path"], inplace=True)
+        table.reset_index(drop=True, inplace=True)
+
+        if rows or keep is None or not keep.all():
+            table.to_pickle(self.cachePath)
+
+        self.table = table
+
+        self.log.debug('completed the ``load_archive`` method')
+        return table
+
+    def run(
+            self,
+            filterSets):
+        """*evaluate the candidate filter sets against the alert archive*
+
+        **Key Arguments:**
+            - ``filterSets`` -- dictionary of candidate filter sets, {name: list of filter dictionaries (as found in the settings file)}
+
+        **Return:**
+            - ``results`` -- dictionary {filter set name: pandas dataframe of pass counts, one row per filter (plus `ANY FILTER`), one column per alert type (plus `total`)}
+        """
+        self.log.debug('starting the ``run`` method')
+
+        import numpy as np
+        import pandas as pd
+
+        if self.table is None:
+            self.load_archive()
+        table = self.table
+
+        alertTypes = sorted(table["alert_type"].unique())
+        isRetraction = (table["alert_type"] == "retraction").values
+
+        results = {}
+        for setName, filters in filterSets.items():
+            compiled = [lvk_filter(log=self.log, filterSettings=f, index=i) for i, f in enumerate(filters or [])]
+
+            # THE EVENT DIRECTORY EXISTS IF AN EARLIER (NON-RETRACTION) ALERT OF THE SAME SUPEREVENT WAS WRITTEN. THE FIRST
+            # ALERT WRITTEN FOR A SUPEREVENT CAN ONLY HAVE PASSED A FILTER THAT DOESN'T NEED THE EVENT DIRECTORY.
+            written = np.zeros(len(table), dtype=bool)
+            for f in compiled:
+                if not f.eventDirExists:
+                    written |= f.evaluate_table(table)
+            written &= ~isRetraction
+            earlier = pd.Series(written.astype(int)).groupby(table["superevent_id"].values).cumsum().values - written
+            eventDirExists = earlier > 0
+
+            counts = {}
+            anyFilter = np.zeros(len(table), dtype=bool)
+            for f in compiled:
+                passing = f.evaluate_table(table, eventDirExists=eventDirExists)
+                anyFilter |= passing
+                counts[f.name] = passing
+            counts["ANY FILTER"] = anyFilter
+
+            rows = []
+            for name, passing in counts.items():
+                row = {"filter": name}
+                for t in alertTypes:
+                    row[t] = int(passing[table["alert_type"].values == t].sum())
+                row["total"] = int(passing.sum())
+                rows.append(row)
+            row = {"filter": "ALL ALERTS"}
+            for t in alertTypes:
+                row[t] = int((table["alert_type"].values == t).sum())
+            row["total"] = len(table)
+            rows.append(row)
+            results[setName] = pd.DataFrame(rows).set_index("filter")
+
+        self.log.debug('completed the ``run`` method')
+        return results
+
+    def report(
+            self,
+            results):
+        """*print the backtest results as tables*
+
+        **Key Arguments:**
+            - ``results`` -- the results returned by the `run` method
+        """
+        self.log.debug('starting the ``report`` method')
+
+        from tabulate import tabulate
+        for setName, df in results.items():
+            print(f"\nFILTER SET: {setName}")
+            print(tabulate(df, headers='keys', tablefmt='psql'))
+
+        self.log.debug('completed the ``report`` method')
+        return None
+
+    # use the tab-trigger below for new method
+    # xt-class-method
@@ -0,0 +1,333 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+*Compile the LVK alert filters found in the settings file into reusable predicates*
+
+:Author:
+    David Young
+
+:Date Created:
+    October 18, 2026
+"""
+from fundamentals import tools
+from builtins import object
+import threading
+import copy
+import sys
+import os
+os.environ['TERM'] = 'vt100'
+
+
+def _nested(alert, *keys):
+    """*return the value found at the nested keys of the alert meta dictionary, or None if missing*"""
+    value = alert
+    for k in keys:
+        try:
+            value = value[k]
+        except (KeyError, TypeError, IndexError):
+            return None
+    return value
+
+
+def _ns_value(alert):
+    """*BNS + NSBH from the event classification*"""
+    bns = _nested(alert, "ALERT", "event", "classification", "BNS")
+    nsbh = _nested(alert, "ALERT", "event", "classification", "NSBH")
+    if bns is None or nsbh is None:
+        return None
+    return bns + nsbh
+
+
+# NUMERIC CRITERIA ARE DECLARED HERE RATHER THAN IN AN IF-CHAIN. CRITERIA ENDING IN `_upper` PASS IF VALUE < LIMIT,
+# CRITERIA ENDING IN `_lower` PASS IF VALUE >= LIMIT. A CRITERION IS SKIPPED IF ITS VALUE IS MISSING FROM THE ALERT.
+# CRITERION: (LABEL, VALUE LOOKUP, NEEDS SKYMAP STATS)
+numericCriteria = {
+    "far_upper": ("FAR", lambda alert: _nested(alert, "ALERT", "event", "far"), False),
+    "ns_lower": ("BNS+NSBH", _ns_value, False),
+    "hasns_lower": ("HasNS", lambda alert: _nested(alert, "ALERT", "event", "properties", "HasNS"), False),
+    "hasremnant_lower": ("HasRemnant", lambda alert: _nested(alert, "ALERT", "event", "properties", "HasRemnant"), False),
+    "dist_upper": ("DISTMEAN", lambda alert: _nested(alert, "HEADER", "DISTMEAN") or None, False),
+    "area90_upper": ("area90", lambda alert: _nested(alert, "EXTRA", "area90"), True),
+    "vol50_upper": ("vol50", lambda alert: _nested(alert, "EXTRA", "vol50"), True),
+    "vol90_upper": ("vol90", lambda alert: _nested(alert, "EXTRA", "vol90"), True),
+    "central_dist_upper": ("central distance", lambda alert: _nested(alert, "EXTRA", "central distance", "median"), True)
+}
+
+# NON-NUMERIC CRITERIA HANDLED BY `lvk_filter`
+otherCriteria = ["name", "alert_types", "burst", "significant", "event_dir_exists"]
+
+# PROCESS-WIDE CACHE OF THE LAST SET OF COMPILED FILTERS
+_compiledLock = threading.Lock()
+_compiledCache = {"filters": None, "compiled": None}
+
+
+class lvk_filter(object):
+    """
+    *A single LVK alert filter, validated and compiled into an ordered list of short-circuiting criteria (cheapest first, skymap-derived criteria last)*
+
+    **Key Arguments:**
+        - ``log`` -- logger
+        - ``filterSettings`` -- the filter dictionary from the `lvk: filters:` list of the settings file
+        - ``index`` -- the position of the filter in the list (used to name unnamed filters). Default *0*
+
+    **Usage:**
+
+    ```python
+    from gocart.parsers.lvk_filters import lvk_filter
+    f = lvk_filter(
+        log=log,
+        filterSettings={"name": "general", "alert_types": ["initial"], "far_upper": 1.6e-08}
+    )
+    passing, messages = f.evaluate(alert=meta)
+    ```
+    """
+
+    def __init__(
+            self,
+            log,
+            filterSettings,
+            index=0
+    ):
+        self.log = log
+        log.debug("instansiating a new 'lvk_filter' object")
+        self.name = filterSettings.get("name", f"filter {index + 1}")
+        self.criteria = []
+        self.alertTypes = None
+        self.valid = True
+        self.invalidMessage = None
+        self.limits = {}
+        self.eventDirExists = "event_dir_exists" in filterSettings
+
+        # UNRECOGNISED OR BADLY FORMED CRITERIA MEAN THE FILTER CAN NEVER PASS
+        invalid = []
+        for k, v in filterSettings.items():
+            if k in otherCriteria:
+                continue
+            if k not in numericCriteria:
+                invalid.append(f"Unrecognised filtering criterion '{k}'")
+            elif isinstance(v, bool) or not isinstance(v, (int, float)):
+                invalid.append(f"Filtering criterion '{k}' must be a number")
+        if invalid:
+            self.valid = False
+            self.invalidMessage = (" and ").join(invalid)
+            for m in invalid:
+                log.warning(f"{m} in the {self.name} filter")
+            self.criteria.append((False, lambda alert, ctx: self.invalidMessage))
+
+        if "alert_types" in filterSettings:
+            self.alertTypes = set(g.lower() for g in filterSettings["alert_types"])
+            self.criteria.append((False, self._alert_types))
+
+        # BURST EVENTS ONLY PASS IF THE FILTER ASKS FOR THEM
+        self.burst = bool(filterSettings.get("burst"))
+        self.criteria.append((False, self._burst))
+
+        if "significant" in filterSettings:
+            self.significant = filterSettings["significant"]
+            self.criteria.append((False, self._significant))
+
+        skymapCriteria = []
+        for k, (label, lookup, needsStats) in numericCriteria.items():
+            if k not in filterSettings or not self.valid:
+                continue
+            self.limits[k] = filterSettings[k]
+            test = self._numeric(k, label, lookup, filterSettings[k])
+            if needsStats:
+                skymapCriteria.append((True, test))
+            else:
+                self.criteria.append((False, test))
+
+        if "event_dir_exists" in filterSettings:
+            self.criteria.append((False, self._event_dir_exists))
+
+        self.criteria += skymapCriteria
+
+        return None
+
+    def accepts_alert_type(
+            self,
+            alertType):
+        """*return False if the alert type alone means this filter cannot pass*
+
+        **Key Arguments:**
+            - ``alertType`` -- the alert type (e.g. `preliminary`)
+        """
+        if not self.valid:
+            return False
+        return self.alertTypes is None or alertType.lower() in self.alertTypes
+
+    def evaluate(
+            self,
+            alert,
+            eventDir=None,
+            addSkymapStats=None,
+            explain=False):
+        """*evaluate the filter against an alert*
+
+        **Key Arguments:**
+            - ``alert`` -- the alert meta dictionary (with `HEADER`, `ALERT` and `EXTRA` keys)
+            - ``eventDir`` -- path to the event directory (needed for the `event_dir_exists` criterion). Default *None*
+            - ``addSkymapStats`` -- callable that adds the skymap stats to `alert['EXTRA']` (only called if a skymap-derived criterion is reached). Default *None*
+            - ``explain`` -- evaluate every criterion and return all failure messages, rather than stopping at the first failure. Default *False*
+
+        **Return:**
+            - ``passing`` -- True or False
+            - ``messages`` -- list of the reasons the filter failed
+        """
+        ctx = {"eventDir": eventDir}
+        messages = []
+        for needsStats, test in self.criteria:
+            # SKYMAP-DERIVED CRITERIA ARE ONLY REACHED IF EVERYTHING CHEAPER HAS PASSED
+            if needsStats:
+                if messages:
+                    break
+                if addSkymapStats:
+                    addSkymapStats(alert)
+            message = test(alert, ctx)
+            if message:
+                messages.append(message)
+                if not explain:
+                    break
+        return not messages, messages
+
+    def evaluate_table(
+            self,
+            table,
+            eventDirExists=None):
+        """*vectorised evaluation of the filter against a table of many alerts (same semantics as `evaluate`)*
+
+        **Key Arguments:**
+            - ``table`` -- a pandas dataframe with one row per alert, see `alert_table_row` for the columns
+            - ``eventDirExists`` -- boolean array, True where the event directory existed when the alert arrived. Default *None* (never existed)
+
+        **Return:**
+            - ``passing`` -- boolean numpy array, True where the alert passes the filter
+        """
+        import numpy as np
+
+        passing = np.full(len(table), self.valid)
+        if not self.valid:
+            return passing
+
+        if self.alertTypes is not None:
+            passing &= table["alert_type"].isin(self.alertTypes).values
+
+        group = table["group"].values
+        hasGroup = table["group"].notna().values
+        passing &= ~hasGroup | ((group == "burst") == self.burst)
+
+        if "significant" in table and hasattr(self, "significant"):
+            significant = table["significant"].values
+            passing &= np.isnan(significant) | (significant == float(self.significant))
+
+        for k, limit in self.limits.items():
+            values = table[k].values
+            if k.endswith("_upper"):
+                passing &= np.isnan(values) | (values < limit)
+            else:
+                passing &= np.isnan(values) | (values >= limit)
+
+        if self.eventDirExists:
+            if eventDirExists is None:
+                passing[:] = False
+            else:
+                passing &= eventDirExists
+
+        return passing
+
+    def _alert_types(self, alert, ctx):
+        alertType = alert['ALERT']['alert_type'].lower()
+        if alertType not in self.alertTypes:
+            return f"Alert type is {alertType}"
+
+    def _burst(self, alert, ctx):
+        group = _nested(alert, "ALERT", "event", "group")
+        if not group:
+            return None
+        if (group.lower() == "burst") != self.burst:
+            return f"This is a {group} event"
+
+    def _significant(self, alert, ctx):
+        event = _nested(alert, "ALERT", "event")
+        if event and 'significant' in event and self.significant != event['significant']:
+            return f"Significant = {event['significant']}"
+
+    def _event_dir_exists(self, alert, ctx):
+        if not ctx["eventDir"] or not os.path.exists(ctx["eventDir"]):
+            return f"The event has not previously passed the filtering criteria"
+
+    def _numeric(self, criterion, label, lookup, limit):
+        upper = criterion.endswith("_upper")
+
+        def test(alert, ctx):
+            value = lookup(alert)
+            if value is None or isinstance(value, str):
+                return None
+            if upper and not value < limit:
+                return f"{label} = {value} (> {limit})"
+            if not upper and not value >= limit:
+                return f"{label} = {value} (< {limit})"
+            return None
+        return test
+
+
+def alert_table_row(
+        alert):
+    """*flatten an alert meta dictionary into the columns used by `lvk_filter.evaluate_table`*
+
+    **Key Arguments:**
+        - ``alert`` -- the alert meta dictionary (e.g. read from an alert's `meta.yaml`)
+
+    **Return:**
+        - ``row`` -- dictionary with `superevent_id`, `alert_type`, `time_created`, `group` and `significant` values plus one value per numeric criterion (NaN if missing)
+    """
+    nan = float("nan")
+    group = _nested(alert, "ALERT", "event", "group")
+    significant = _nested(alert, "ALERT", "event", "significant")
+    row = {
+        "superevent_id": alert["ALERT"]["superevent_id"],
+        "alert_type": alert["ALERT"]["alert_type"].lower(),
+        "time_created": alert["ALERT"]["time_created"],
+        "group": group.lower() if group else None,
+        "significant": nan if significant is None else float(significant)
+    }
+    for k, (label, lookup, needsStats) in numericCriteria.items():
+        value = lookup(alert)
+        row[k] = nan if value is None or isinstance(value, str) else float(value)
+    return row
+
+
+def compile_lvk_filters(
+        log,
+        filters):
+    """*validate and compile the `lvk: filters:` list from the settings file into `lvk_filter` objects*
+
+    The compiled filters are cached per process and only recompiled if the filter settings change.
+
+    **Key Arguments:**
+        - ``log`` -- logger
+        - ``filters`` -- the list of filter dictionaries from the settings file
+
+    **Return:**
+        - ``compiled`` -- list of `lvk_filter` objects (empty if there are no filters)
+
+    ```python
+    from gocart.parsers.lvk_filters import compile_lvk_filters
+    compiled = compile_lvk_filters(log=log, filters=settings["lvk"].get("filters"))
+    ```
+    """
+    log.debug('starting the ``compile_lvk_filters`` function')
+
+    if not filters:
+        return []
+
+    with _compiledLock:
+        if _compiledCache["compiled"] is not None and _compiledCache["filters"] == filters:
+            compiled = _compiledCache["compiled"]
+        else:
+            compiled = [lvk_filter(log=log, filterSettings=f, index=i) for i, f in enumerate(filters)]
+            _compiledCache["filters"] = copy.deepcopy(filters)
+            _compiledCache["compiled"] = compiled
+
+    log.debug('completed the ``compile_lvk_filters`` function')
+    return compiled
@@ -0,0 +1,373 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+*Parse LVK alerts in a pool of worker processes, keeping the alerts of each superevent in order*
+
+:Author:
+    David Young
+
+:Date Created:
+    October 18, 2026
+"""
+from fundamentals import tools
+from builtins import object
+from collections import deque
+import threading
+import queue
+import time
+import sys
+import os
+os.environ['TERM'] = 'vt100'
+
+# THE LOGGER, SETTINGS AND PLUGINS FLAG OF A WORKER PROCESS (SET ONCE BY `_init_worker`)
+_worker = {}
+
+
+class lvk_pool(object):
+    """
+    *Parse LVK kafka alerts in a pool of worker processes*
+
+    Alerts of different superevents are parsed concurrently. The alerts of any one superevent are parsed one at a time in the order they were submitted, so an `update` never overtakes its `preliminary`.
+
+    The seconds each of the most recent alerts spent in the pool (from `submit`, or from its release by a `local_alert_source`, until it was parsed) are kept in the ``latencies`` attribute.
+
+    The worker processes are started when the pool is created. Create it before the kafka consumer, so the workers are not forked from a process already running the consumer's threads. If a worker process dies, the workers are replaced (by `completed`) and the alerts they were parsing are sent again.
+
+    **Key Arguments:**
+        - ``log`` -- logger
+        - ``settings`` -- the settings dictionary
+        - ``workers`` -- number of worker processes. Default *2*
+        - ``plugins`` -- run the plugin scripts found in `~/.config/gocart/plugins` for every alert. Default *False*
+        - ``maxPending`` -- the most alerts held (waiting or being parsed) at once. Default *4 x workers*
+        - ``retries`` -- how many times an alert lost with a dead worker process (out of memory, segfault, killed) is sent again before it is reported as failed. Default *1*
+
+    **Usage:**
+
+    ```python
+    from gocart.parsers import lvk_pool
+    pool = lvk_pool(
+        log=log,
+        settings=settings,
+        workers=4
+    )
+    try:
+        while True:
+            if not pool.full():
+                for message in consumer.consume(timeout=1):
+                    committer.fetched(message)
+                    pool.submit(message)
+            for message in pool.completed(timeout=1 if pool.full() else 0):
+                committer.processed(message)
+            committer.commit_if_due()
+    finally:
+        pool.close()
+    ```
+    """
+
+    def __init__(
+            self,
+            log,
+            settings,
+            workers=2,
+            plugins=False,
+            maxPending=False,
+            retries=1
+    ):
+        self.log = log
+        log.debug("instansiating a new 'lvk_pool' object")
+        self.settings = settings
+        self.workers = max(int(workers), 1)
+        self.plugins = plugins
+        self.maxPending = maxPending or 4 * self.workers
+        self.retries = retries
+
+        # EACH SUPEREVENT WITH AN ALERT BEING PARSED HAS A LANE OF ITS ALERTS WAITING BEHIND IT
+        self._lanes = {}
+        self._lanesLock = threading.RLock()
+        # (MESSAGE, ERROR, TIME FINISHED, LANE KEY, RETRY) OF EACH FINISHED ALERT, FILLED FROM THE EXECUTOR'S MANAGER THREAD
+        self._done = queue.Queue()
+        self._pending = 0
+        # WHEN EACH PENDING MESSAGE WAS SUBMITTED (OR RELEASED, FOR A LOCAL ALERT SOURCE), AND THE LATENCIES OF THE MOST RECENT PARSED ALERTS (SECONDS)
+        self._submitted = {}
+        self.latencies = deque(maxlen=10000)
+        # THE NUMBER OF TIMES EACH PENDING MESSAGE HAS BEEN LOST WITH A DEAD WORKER
+        self._attempts = {}
+        # THE EXECUTOR (AND ITS GENERATION) THE ALERTS ARE SENT TO, AND THE LAST GENERATION FOUND BROKEN
+        self._generation = 0
+        self._broken = None
+        self._executor = self._new_executor()
+
+        return None
+
+    def __len__(self):
+        return self._pending
+
+    def full(
+            self):
+        """*True if the pool holds ``maxPending`` alerts (stop fetching until some have completed)*"""
+        return self._pending >= self.maxPending
+
+    def submit(
+            self,
+            message):
+        """*queue a kafka message for parsing*
+
+        **Key Arguments:**
+            - ``message`` -- the kafka message (or any object with a `value()` method returning the alert record)
+        """
+        self.log.debug('starting the ``submit`` method')
+
+        from gocart.parsers.lvk import peek_alert_envelope
+
+        envelope = peek_alert_envelope(message.value())
+        # ALERTS WHOSE ENVELOPE CAN'T BE READ SHARE ONE LANE
+        key = envelope["superevent_id"] if envelope else None
+        self._pending += 1
+        self._submitted[id(message)] = getattr(message, "released", None) or time.monotonic()
+        with self._lanesLock:
+            if key in self._lanes:
+                # AN EARLIER ALERT OF THIS SUPEREVENT IS STILL BEING PARSED
+                self._lanes[key].append(message)
+            else:
+                self._lanes[key] = deque()
+                self._start(key, message)
+
+        self.log.debug('completed the ``submit`` method')
+        return None
+
+    def completed(
+            self,
+            timeout=0):
+        """*return the messages whose alerts have been parsed (or failed to parse) since the last call*
+
+        If a worker process has died, the worker processes are replaced here and the alerts lost with them are sent again.
+
+        **Key Arguments:**
+            - ``timeout`` -- seconds to wait for the first completed alert if none are ready. Default *0*
+
+        **Return:**
+            - ``messages`` -- list of kafka messages
+        """
+        messages = []
+        retries = []
+        while True:
+            try:
+                if messages or retries or not timeout:
+                    message, error, finished, key, retry = self._done.get_nowait()
+                else:
+                    message, error, finished, key, retry = self._done.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if retry:
+                retries.append((key, message))
+                continue
+            if error is not None:
+                self.log.error(f'could not parse alert! Failed with error: {error}')
+            self._pending -= 1
+            self._attempts.pop(id(message), None)
+            self.latencies.append(finished - self._submitted.pop(id(message)))
+            messages.append(message)
+
+        if retries:
+            with self._lanesLock:
+                if self._broken == self._generation:
+                    self._restart()
+                for key, message in retries:
+                    self._start(key, message)
+        return messages
+
+    def close(
+            self,
+            wait=True):
+        """*shut down the worker processes*
+
+        **Key Arguments:**
+            - ``wait`` -- wait for the pending alerts to be parsed first (collect the messages you need with `completed` beforehand). Default *True*. If False, alerts still being parsed are abandoned (they were never marked as processed, so kafka delivers them again)
+        """
+        self.log.debug('starting the ``close`` method')
+
+        if wait:
+            # RETRIES OF ALERTS LOST WITH A DEAD WORKER ARE ONLY SENT FROM `completed`
+            while len(self):
+                self.completed(timeout=1)
+            self._executor.shutdown(wait=True)
+        else:
+            processes = list((getattr(self._executor, "_processes", None) or {}).values())
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            for process in processes:
+                process.terminate()
+
+        self.log.debug('completed the ``close`` method')
+        return None
+
+    def _new_executor(
+            self):
+        """*start a set of worker processes*"""
+        from concurrent.futures import ProcessPoolExecutor
+        import multiprocessing
+        executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("fork"), initializer=_init_worker, initargs=(self.log, self.settings, self.plugins))
+        # THE FIRST TASK FORKS EVERY WORKER, SO DO IT NOW (BEFORE ANY KAFKA CONSUMER THREADS EXIST)
+        executor.submit(int).result()
+        return executor
+
+    def _restart(
+            self):
+        """*replace a broken set of worker processes (the caller holds the lanes lock)*"""
+        self.log.warning('a gocart worker process died: restarting the worker processes')
+        self._executor.shutdown(wait=False)
+        self._executor = self._new_executor()
+        self._generation += 1
+
+    def _start(
+            self,
+            key,
+            message):
+        """*send the alert to a worker process (the caller holds the lanes lock)*"""
+        from concurrent.futures.process import BrokenProcessPool
+        generation = self._generation
+        try:
+            future = self._executor.submit(_parse_alert, message.value())
+        except BrokenProcessPool:
+            # SEND IT AGAIN ONCE THE WORKERS HAVE BEEN REPLACED
+            self._broken = self._generation
+            self._done.put((message, None, None, key, True))
+            return
+        future.add_done_callback(lambda f: self._finished(key, message, f, generation))
+
+    def _finished(
+            self,
+            key,
+            message,
+            future,
+            generation):
+        """*start the next alert of the superevent (if any) and report the finished message. Runs in the executor's manager thread*
+
+        An alert lost with a dead worker is sent again (holding its lane) up to ``retries`` times before it is reported as failed: a worker that dies takes every alert being parsed with it, not just the one that killed it.
+        """
+        from concurrent.futures.process import BrokenProcessPool
+        error = future.exception()
+        with self._lanesLock:
+            if isinstance(error, BrokenProcessPool):
+                if generation == self._generation:
+                    self._broken = generation
+                attempts = self._attempts.get(id(message), 0) + 1
+                self._attempts[id(message)] = attempts
+                if attempts <= self.retries:
+                    self._done.put((message, None, None, key, True))
+                    return
+                error = f"a worker process died while parsing the alert ({error})"
+            lane = self._lanes[key]
+            if lane:
+                self._start(key, lane.popleft())
+            else:
+                del self._lanes[key]
+        self._done.put((message, error, time.monotonic(), key, False))
+
+    # use the tab-trigger below for new method
+    # xt-class-method
+
+
+def _init_worker(
+        log,
+        settings,
+        plugins):
+    """*set up a worker process: keep the logger, settings and plugins flag for the alerts it parses (the settings are only sent to each worker once)*"""
+    import signal
+    # DON'T RUN THE PARENT'S (E.G. THE DAEMON'S) SIGTERM HANDLER WHEN THE POOL IS TERMINATED
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    _worker["log"] = log
+    _worker["settings"] = settings
+    _worker["plugins"] = plugins
+
+
+def _parse_alert(
+        record):
+    """*parse an alert record in a worker process*"""
+    from gocart.parsers import lvk
+    lvk(
+        log=_worker["log"],
+        record=record,
+        settings=_worker["settings"],
+        plugins=_worker["plugins"]
+    ).parse()
+    return None
+
+
+def replay_alerts(
+        log,
+        consumer,
+        pool,
+        topic,
+        since,
+        batchSize=500,
+        timeout=10):
+    """*replay (echo) the alerts published to every partition of a topic since the given time through the worker pool, stopping at the end of each partition as it was when the replay started*
+
+    **Key Arguments:**
+        - ``log`` -- logger
+        - ``consumer`` -- a kafka consumer (not subscribed to the topic; its partitions are assigned here)
+        - ``pool`` -- the `lvk_pool` to parse the alerts with
+        - ``topic`` -- the kafka topic
+        - ``since`` -- replay the alerts published from this datetime
+        - ``batchSize`` -- the most messages to fetch at once. Default *500*
+        - ``timeout`` -- the broker request timeout (seconds). Default *10*
+
+    **Return:**
+        - ``count`` -- the number of alerts replayed
+
+    ```python
+    from gocart.parsers.lvk_pool import replay_alerts
+    count = replay_alerts(
+        log=log,
+        consumer=consumer,
+        pool=pool,
+        topic="igwn.gwalert",
+        since=datetime.datetime.now() - datetime.timedelta(days=30)
+    )
+    ```
+    """
+    log.debug('starting the ``replay_alerts`` function')
+
+    from confluent_kafka import TopicPartition
+
+    metadata = consumer.list_topics(topic, timeout=timeout).topics[topic]
+    if metadata.error is not None:
+        raise IOError(f"could not read the partitions of the `{topic}` topic: {metadata.error}")
+    timestamp = int(since.timestamp() * 1000)
+    starts = consumer.offsets_for_times([TopicPartition(topic, p, timestamp) for p in sorted(metadata.partitions)], timeout=timeout)
+
+    # THE END OF EACH PARTITION NOW: ALERTS PUBLISHED DURING THE REPLAY ARE LEFT FOR `listen`
+    ends = {}
+    assignment = []
+    for start in starts:
+        low, high = consumer.get_watermark_offsets(TopicPartition(topic, start.partition), timeout=timeout, cached=False)
+        # A NEGATIVE OFFSET MEANS NOTHING HAS BEEN PUBLISHED TO THE PARTITION SINCE THE TIME
+        if 0 <= start.offset < high:
+            ends[start.partition] = high
+            assignment.append(start)
+    consumer.assign(assignment)
+
+    count = 0
+    while ends:
+        if not pool.full():
+            messages = consumer.consume(num_messages=min(batchSize, pool.maxPending - len(pool)), timeout=1)
+            # SUBMIT IN PUBLICATION ORDER, SO THE ALERTS OF A SUPEREVENT SPREAD OVER PARTITIONS STAY IN ORDER
+            for message in sorted(messages, key=lambda m: m.timestamp()[1]):
+                if message.error():
+                    log.warning(f'could not read a message from the `{topic}` topic: {message.error()}')
+                    continue
+                if message.offset() < ends.get(message.partition(), -1):
+                    pool.submit(message)
+                    count += 1
+            # A PARTITION IS DONE ONCE THE CONSUMER'S POSITION REACHES ITS END OFFSET
+            for position in consumer.position([TopicPartition(topic, p) for p in ends]):
+                if position.offset >= ends[position.partition]:
+                    del ends[position.partition]
+        pool.completed(timeout=1 if pool.full() else 0)
+
+    # WAIT FOR THE LAST ALERTS TO BE PARSED
+    while len(pool):
+        pool.completed(timeout=1)
+
+    log.debug('completed the ``replay_alerts`` function')
+    return count